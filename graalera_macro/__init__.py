@@ -0,0 +1 @@
+"""Shared building blocks for the GraalEra mining macro front-ends."""
@@ -0,0 +1,5 @@
+import sys
+
+from graalera_macro.cli import main
+
+sys.exit(main())
@@ -0,0 +1,438 @@
+"""Session analytics persisted to SQLite.
+
+``SessionAnalytics`` listens to an engine and its input dispatcher and
+turns every mined rock into a record:
+
+* ``area``: detection area (1 or 2) the rock was mined in
+* ``time_to_find``: from the previous rock (or the session start) until the
+  engine started mining this one, including area switches and spider fights
+* ``clicks``: mining and speculative clicks spent on the rock
+* ``time_to_deplete``: from the start of mining until the depleted rock was seen
+* ``respawn_gap``: from the previous rock mined in the same area until this
+  one was found there
+* ``spider_interruptions``: spiders that showed up during the cycle
+
+Each session gets a summary row (duration, rocks, rocks/hour, clicks, spot
+and settings). ``AnalyticsStore`` owns the database on a background thread
+and commits whatever is queued in one transaction per batch, so the engine
+only ever does a ``put_nowait``.
+
+``report`` aggregates the sessions by spot, settings, day or session::
+
+    python -m graalera_macro analytics report --by settings
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_DB_PATH = os.path.join("analytics", "sessions.sqlite3")
+SCHEMA_VERSION = 1
+# Config fields that make up the "settings" a session is grouped by, with their short names
+SETTINGS_FIELDS = {
+    'detection_confidence': 'conf',
+    'depleted_confidence': 'depleted',
+    'sample_count': 'samples',
+    'area_switch_timeout': 'switch',
+    'mining_retry_timeout': 'retry',
+    'spider_detection_enabled': 'spiders',
+}
+REPORT_GROUPS = ('spot', 'settings', 'day', 'session')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    ended_at TEXT,
+    source TEXT,
+    spot TEXT,
+    settings TEXT,
+    config TEXT,
+    status TEXT,
+    duration REAL,
+    rocks INTEGER,
+    clicks INTEGER,
+    spider_interruptions INTEGER,
+    fires INTEGER,
+    errors INTEGER
+);
+CREATE TABLE IF NOT EXISTS rocks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL REFERENCES sessions(id),
+    mined_at TEXT NOT NULL,
+    area INTEGER,
+    time_to_find REAL,
+    clicks INTEGER,
+    time_to_deplete REAL,
+    respawn_gap REAL,
+    spider_interruptions INTEGER
+);
+CREATE INDEX IF NOT EXISTS rocks_session ON rocks(session_id);
+"""
+
+
+class AnalyticsError(Exception):
+    """Raised when the analytics database cannot be read."""
+
+
+def settings_key(config) -> str:
+    """Describe the settings of ``config`` that affect throughput, e.g. ``conf=0.5 samples=1 ...``."""
+    data = config.to_dict()
+    return " ".join(f"{short}={data.get(name)}" for name, short in SETTINGS_FIELDS.items())
+
+
+class AnalyticsStore:
+    """SQLite database written from a background thread in batched transactions.
+
+    Args:
+        path: Database file (created with its directory if missing)
+        queue_size: Maximum number of writes waiting for the writer
+        batch_size: Maximum writes per transaction
+        flush_interval: Seconds the writer waits for more writes before committing
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, queue_size: int = 4096, batch_size: int = 256,
+                 flush_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.transactions = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="AnalyticsStore", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Commit everything still queued and close the database."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("[ERROR] Analytics queue stuck, closing without flushing")
+        self._thread.join(timeout)
+        self._thread = None
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is committed.
+
+        Returns:
+            bool: False if the writer did not get there within ``timeout``
+        """
+        if not self.running:
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(('flush', done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def execute(self, sql: str, params: tuple = ()):
+        """Queue a write. Never blocks; drops (and counts) it when the queue is full."""
+        try:
+            self._queue.put_nowait((sql, params))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        try:
+            connection = sqlite3.connect(self.path)
+            connection.executescript(_SCHEMA)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        except sqlite3.Error as e:
+            print(f"[ERROR] Could not open analytics database {self.path}: {e}")
+            return
+        try:
+            stopping = False
+            while not stopping:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                # Collect more writes until the batch is full, the interval is over or a flush/stop arrives
+                while batch[-1] is not None and batch[-1][0] != 'flush' and len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                waiters = []
+                writes = []
+                for item in batch:
+                    if item is None:
+                        stopping = True
+                    elif item[0] == 'flush':
+                        waiters.append(item[1])
+                    else:
+                        writes.append(item)
+                if writes:
+                    try:
+                        with connection:
+                            for sql, params in writes:
+                                connection.execute(sql, params)
+                        self.written += len(writes)
+                        self.transactions += 1
+                    except sqlite3.Error as e:
+                        self.failed += len(writes)
+                        print(f"[ERROR] Analytics write failed: {e}")
+                for waiter in waiters:
+                    waiter.set()
+        finally:
+            connection.close()
+
+    def summary(self) -> str:
+        return (f"{self.written} analytics rows written to {self.path} in {self.transactions} transactions "
+                f"({self.dropped} dropped, {self.failed} failed)")
+
+
+class SessionAnalytics:
+    """Per-rock records and a session summary for one engine session.
+
+    Args:
+        store: Where the records go (started by ``attach`` if needed)
+        spot: Name of the spot (usually the profile name)
+        source: 'gui', 'run', 'replay' or 'simulate'
+    """
+
+    def __init__(self, store: AnalyticsStore, spot: Optional[str] = None, source: str = 'run'):
+        self.store = store
+        self.spot = spot
+        self.source = source
+        self.session_id = uuid.uuid4().hex
+        self.engine = None
+        self._lock = threading.Lock()
+        self._started_at: Optional[float] = None
+        self._cycle_start: Optional[float] = None
+        self._found_at: Optional[float] = None
+        self._last_mined: Dict[int, float] = {}
+        self._cycle_clicks = 0
+        self._cycle_spiders = 0
+        self.rocks = 0
+        self.clicks = 0
+        self.spider_interruptions = 0
+        self.fires = 0
+        self.errors = 0
+
+    def attach(self, engine):
+        """Record ``engine``'s session from now on."""
+        self.engine = engine
+        self._started_at = self._cycle_start = engine.pacer.now()
+        self.store.start()
+        self.store.execute(
+            "INSERT INTO sessions (id, started_at, source, spot, settings, config) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.session_id, datetime.now().isoformat(timespec='seconds'), self.source, self.spot,
+             settings_key(engine.config), json.dumps(engine.config.to_dict())))
+        engine.add_listener(self.on_event)
+        engine.input_dispatcher.add_listener(self.on_input)
+
+    def detach(self):
+        if self.engine is not None:
+            self.engine.remove_listener(self.on_event)
+            self.engine.input_dispatcher.remove_listener(self.on_input)
+
+    def on_input(self, command):
+        """Count the clicks at a detection area (spider attack clicks have no point or move first)."""
+        if command.kind == 'click' and command.point is not None and command.finished_at is not None \
+                and command.error is None:
+            with self._lock:
+                self._cycle_clicks += 1
+                self.clicks += 1
+
+    def on_event(self, event: dict):
+        kind = event['kind']
+        if kind == 'state' and event.get('phase') == 'mining' and event.get('previous_phase') == 'search':
+            self._found_at = event['t']
+        elif kind == 'spider_detected' and not event.get('during_attack'):
+            self._cycle_spiders += 1
+            self.spider_interruptions += 1
+        elif kind == 'fire_detected':
+            self.fires += 1
+        elif kind == 'error':
+            self.errors += 1
+        elif kind == 'rock_mined':
+            self._on_rock_mined(event)
+
+    def _on_rock_mined(self, event: dict):
+        t, area = event['t'], event.get('area')
+        found_at = self._found_at if self._found_at is not None else self._cycle_start
+        previous = self._last_mined.get(area)
+        with self._lock:
+            clicks = self._cycle_clicks
+            self._cycle_clicks = 0
+        self.store.execute(
+            "INSERT INTO rocks (session_id, mined_at, area, time_to_find, clicks, time_to_deplete, respawn_gap, "
+            "spider_interruptions) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.session_id, datetime.now().isoformat(timespec='milliseconds'), area,
+             found_at - self._cycle_start, clicks, t - found_at,
+             found_at - previous if previous is not None else None, self._cycle_spiders))
+        self.rocks += 1
+        self._last_mined[area] = t
+        self._cycle_start = t
+        self._found_at = None
+        self._cycle_spiders = 0
+
+    def duration(self) -> float:
+        if self.engine is None:
+            return 0.0
+        return self.engine.pacer.now() - self._started_at
+
+    def finish(self, status: Optional[str] = None):
+        """Detach and write the session summary.
+
+        Args:
+            status: How the session ended (default: 'fire' after a fire stop, else 'stopped')
+        """
+        self.detach()
+        if self.engine is None:
+            return
+        if status is None:
+            status = 'fire' if self.fires else 'stopped'
+        self.store.execute(
+            "UPDATE sessions SET ended_at = ?, status = ?, duration = ?, rocks = ?, clicks = ?, "
+            "spider_interruptions = ?, fires = ?, errors = ? WHERE id = ?",
+            (datetime.now().isoformat(timespec='seconds'), status, self.duration(), self.rocks, self.clicks,
+             self.spider_interruptions, self.fires, self.errors, self.session_id))
+
+    def summary(self) -> str:
+        duration = self.duration()
+        rate = self.rocks / duration * 3600 if duration > 0 else 0.0
+        return f"session {self.session_id[:8]}: {self.rocks} rocks in {duration:.0f}s ({rate:.1f} rocks/hour)"
+
+
+# --- Reports ---
+
+_GROUP_COLUMNS = {
+    'spot': "COALESCE(s.spot, '-')",
+    'settings': "COALESCE(s.spot, '-') || ': ' || COALESCE(s.settings, '')",
+    'day': "substr(s.started_at, 1, 10)",
+    'session': "s.started_at || ' ' || substr(s.id, 1, 8)",
+}
+
+
+def report(path: str = DEFAULT_DB_PATH, by: str = 'spot', since: Optional[str] = None,
+           source: Optional[str] = None) -> List[dict]:
+    """Aggregate finished sessions into throughput rows.
+
+    Args:
+        path: Analytics database
+        by: 'spot', 'settings' (spot and settings), 'day' or 'session'
+        since: Only sessions started on or after this ISO date
+        source: Only sessions of this source ('gui', 'run', 'replay', 'simulate')
+
+    Returns:
+        list: One dict per group with sessions, hours, rocks, rocks/hour, the
+            average per-rock times and the rocks/hour trend between the first
+            and the second half of the group's sessions, best groups first
+    """
+    if by not in _GROUP_COLUMNS:
+        raise ValueError(f"Unknown grouping '{by}', expected one of {', '.join(REPORT_GROUPS)}")
+    if not os.path.exists(path):
+        raise AnalyticsError(f"No analytics database at {path}")
+    where = ["s.duration IS NOT NULL AND s.duration > 0"]
+    params: list = []
+    if since:
+        where.append("s.started_at >= ?")
+        params.append(since)
+    if source:
+        where.append("s.source = ?")
+        params.append(source)
+
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = connection.execute(f"""
+            SELECT {_GROUP_COLUMNS[by]} AS grp, s.id, s.started_at, s.duration, s.rocks, s.clicks,
+                   s.spider_interruptions, AVG(r.time_to_find), AVG(r.time_to_deplete), AVG(r.respawn_gap)
+            FROM sessions s LEFT JOIN rocks r ON r.session_id = s.id
+            WHERE {' AND '.join(where)}
+            GROUP BY s.id
+            ORDER BY s.started_at
+        """, params).fetchall()
+    except sqlite3.Error as e:
+        raise AnalyticsError(f"Cannot read {path}: {e}")
+    finally:
+        connection.close()
+
+    groups: Dict[str, List[tuple]] = {}
+    for row in rows:
+        groups.setdefault(row[0], []).append(row)
+
+    results = []
+    for group, sessions in groups.items():
+        duration = sum(row[3] for row in sessions)
+        rocks = sum(row[4] or 0 for row in sessions)
+        clicks = sum(row[5] or 0 for row in sessions)
+        results.append({
+            'group': group,
+            'sessions': len(sessions),
+            'hours': duration / 3600,
+            'rocks': rocks,
+            'rocks_per_hour': rocks / duration * 3600,
+            'clicks_per_rock': clicks / rocks if rocks else None,
+            'spiders_per_hour': sum(row[6] or 0 for row in sessions) / duration * 3600,
+            'time_to_find': _weighted(sessions, 7),
+            'time_to_deplete': _weighted(sessions, 8),
+            'respawn_gap': _weighted(sessions, 9),
+            'trend': _trend(sessions),
+        })
+    results.sort(key=lambda result: result['rocks_per_hour'], reverse=True)
+    return results
+
+
+def _weighted(sessions: List[tuple], column: int) -> Optional[float]:
+    """Average of a per-session average, weighted by the session's rocks."""
+    total = count = 0
+    for row in sessions:
+        if row[column] is not None and row[4]:
+            total += row[column] * row[4]
+            count += row[4]
+    return total / count if count else None
+
+
+def _trend(sessions: List[tuple]) -> Optional[float]:
+    """Rocks/hour of the later half of the sessions minus that of the earlier half."""
+    if len(sessions) < 2:
+        return None
+    half = len(sessions) // 2
+
+    def rate(rows):
+        duration = sum(row[3] for row in rows)
+        return sum(row[4] or 0 for row in rows) / duration * 3600
+
+    return rate(sessions[half:]) - rate(sessions[:half])
+
+
+def format_report(results: List[dict]) -> str:
+    width = max([len('group')] + [len(result['group']) for result in results])
+    lines = [f"{'group':<{width}} {'sessions':>8} {'hours':>6} {'rocks':>6} {'rocks/h':>8} {'trend':>7} "
+             f"{'clicks/rock':>11} {'find s':>7} {'deplete s':>9} {'respawn s':>9} {'spiders/h':>9}"]
+    for result in results:
+        lines.append(f"{result['group']:<{width}} {result['sessions']:8d} {result['hours']:6.2f} {result['rocks']:6d} "
+                     f"{result['rocks_per_hour']:8.1f} {_fmt(result['trend'], '+7.1f'):>7} "
+                     f"{_fmt(result['clicks_per_rock'], '.1f'):>11} {_fmt(result['time_to_find'], '.1f'):>7} "
+                     f"{_fmt(result['time_to_deplete'], '.1f'):>9} {_fmt(result['respawn_gap'], '.1f'):>9} "
+                     f"{result['spiders_per_hour']:9.1f}")
+    return "\n".join(lines)
+
+
+def _fmt(value: Optional[float], spec: str) -> str:
+    return "-" if value is None else format(value, spec)
@@ -0,0 +1,202 @@
+"""Precompiled template pack.
+
+``build_pack`` decodes every template PNG once at build time and writes the
+pixels, plus derived data (grayscale, a grayscale pyramid, the alpha mask and
+per-template statistics), into a single versioned file. ``AssetPack`` maps
+that file into memory and hands out read-only numpy views into it, so loading
+templates at runtime involves no PNG decode and processes that open the same
+pack share its pages.
+
+File layout::
+
+    MAGIC (8 bytes) | version (u32) | header length (u32) | JSON header | raw buffers
+
+Every buffer starts at a 64-byte aligned offset recorded in the header.
+"""
+import hashlib
+import json
+import os
+import struct
+from typing import Dict, Iterable, List, Optional
+
+import cv2
+import numpy as np
+
+MAGIC = b'GEAPACK\0'
+PACK_VERSION = 1
+DEFAULT_PACK_NAME = 'templates.pack'
+ALIGNMENT = 64
+PYRAMID_MIN_SIZE = 8
+
+_PREAMBLE = struct.Struct('<8sII')
+
+
+class AssetPackError(Exception):
+    """Raised when a pack file is missing, corrupt or of an unsupported version."""
+
+
+def _derived_arrays(path: str) -> Dict[str, np.ndarray]:
+    """Decode ``path`` and compute the arrays stored for one template."""
+    unchanged = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if unchanged is None:
+        raise AssetPackError(f"Could not decode {path}")
+
+    # Same pixels cv2.imread(path) returns, so matching results do not change
+    bgr = cv2.imread(path)
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    arrays = {'bgr': bgr, 'gray': gray}
+
+    level = gray
+    for i in range(1, 4):
+        if min(level.shape[:2]) < PYRAMID_MIN_SIZE * 2:
+            break
+        level = cv2.pyrDown(level)
+        arrays[f'gray_pyr{i}'] = level
+
+    if unchanged.ndim == 3 and unchanged.shape[2] == 4:
+        arrays['mask'] = np.where(unchanged[:, :, 3] > 0, 255, 0).astype(np.uint8)
+    return arrays
+
+
+def _stats(arrays: Dict[str, np.ndarray]) -> dict:
+    bgr = arrays['bgr']
+    stats = {
+        'mean_bgr': [round(float(v), 3) for v in bgr.reshape(-1, 3).mean(axis=0)],
+        'std_gray': round(float(arrays['gray'].std()), 3),
+    }
+    if 'mask' in arrays:
+        stats['opaque_fraction'] = round(float(np.count_nonzero(arrays['mask'])) / arrays['mask'].size, 4)
+    return stats
+
+
+def build_pack(asset_dir: str, output: str, templates: Optional[Iterable[str]] = None) -> dict:
+    """Compile the templates in ``asset_dir`` into a pack file at ``output``.
+
+    Args:
+        asset_dir: Directory holding the template PNGs
+        output: Path of the pack to write
+        templates: File names to include (default: every ``*.png`` in ``asset_dir``)
+
+    Returns:
+        dict: The header written to the pack
+    """
+    if templates is None:
+        templates = sorted(f for f in os.listdir(asset_dir) if f.lower().endswith('.png'))
+
+    entries = {}
+    buffers: List[bytes] = []
+    offset = 0
+    for template_file in templates:
+        path = os.path.join(asset_dir, template_file)
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        st = os.stat(path)
+        arrays = _derived_arrays(path)
+        entry = {'sha1': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'stats': _stats(arrays),
+                 'arrays': {}}
+        for kind, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            entry['arrays'][kind] = {'offset': offset, 'shape': list(array.shape), 'dtype': array.dtype.str}
+            data = array.tobytes()
+            padding = -len(data) % ALIGNMENT
+            buffers.append(data + b'\0' * padding)
+            offset += len(data) + padding
+        entries[template_file] = entry
+
+    header = {'version': PACK_VERSION, 'templates': entries}
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * (-(_PREAMBLE.size + len(header_bytes)) % ALIGNMENT)
+
+    tmp_path = output + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, PACK_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for data in buffers:
+            f.write(data)
+    os.replace(tmp_path, output)
+    return header
+
+
+class AssetPack:
+    """Read-only, memory-mapped view of a pack written by ``build_pack``.
+
+    Args:
+        path: Pack file to open
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, 'rb') as f:
+                magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+                header_bytes = f.read(header_length)
+        except (OSError, struct.error) as e:
+            raise AssetPackError(f"Could not read asset pack {path}: {e}")
+        if magic != MAGIC:
+            raise AssetPackError(f"{path} is not an asset pack")
+        if version != PACK_VERSION:
+            raise AssetPackError(f"Asset pack {path} has version {version}, expected {PACK_VERSION}")
+
+        try:
+            self.header = json.loads(header_bytes.decode('utf-8'))
+        except ValueError as e:
+            raise AssetPackError(f"Asset pack {path} has a corrupt header: {e}")
+        self.templates: Dict[str, dict] = self.header['templates']
+        data_offset = _PREAMBLE.size + header_length
+        size = os.path.getsize(path) - data_offset
+        self._data = np.memmap(path, dtype=np.uint8, mode='r', offset=data_offset, shape=(size,)) if size else None
+
+    def names(self) -> List[str]:
+        return list(self.templates)
+
+    def __contains__(self, template_file: str) -> bool:
+        return template_file in self.templates
+
+    def kinds(self, template_file: str) -> List[str]:
+        """Return the array kinds stored for a template (bgr, gray, gray_pyr1, mask, ...)."""
+        return list(self.templates[template_file]['arrays'])
+
+    def get(self, template_file: str, kind: str = 'bgr') -> Optional[np.ndarray]:
+        """Return a read-only view of one stored array, or None if it is not in the pack."""
+        entry = self.templates.get(template_file)
+        if entry is None or kind not in entry['arrays'] or self._data is None:
+            return None
+        spec = entry['arrays'][kind]
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        start = spec['offset']
+        return self._data[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+
+    def stats(self, template_file: str) -> dict:
+        return self.templates[template_file]['stats']
+
+    def stale_templates(self, asset_dir: str) -> List[str]:
+        """Return the packed templates whose PNG in ``asset_dir`` changed since the build.
+
+        Only stats the PNGs; a file is hashed only when its size or mtime differ
+        from the build (e.g. after a checkout that rewrote it unchanged).
+        """
+        stale = []
+        for template_file, entry in self.templates.items():
+            path = os.path.join(asset_dir, template_file)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size == entry.get('size') and st.st_mtime_ns == entry.get('mtime_ns'):
+                continue
+            with open(path, 'rb') as f:
+                if hashlib.sha1(f.read()).hexdigest() != entry['sha1']:
+                    stale.append(template_file)
+        return stale
+
+
+def open_pack(path: str) -> Optional[AssetPack]:
+    """Open the pack at ``path``, or return None if there is none or it cannot be used."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return AssetPack(path)
+    except AssetPackError as e:
+        print(f"[ERROR] {e}; falling back to decoding PNGs")
+        return None
@@ -0,0 +1,353 @@
+"""Benchmarks for the detection and capture hot paths.
+
+Run with ``python -m graalera_macro bench``. Every benchmark reports
+p50/p95/p99 latency, throughput and the bytes allocated per call (measured
+with ``tracemalloc`` in a separate pass, so tracing does not inflate the
+timings). Results can be saved as JSON and compared with an earlier run::
+
+    python -m graalera_macro bench --json before.json
+    python -m graalera_macro bench --compare before.json
+"""
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from graalera_macro.config import FIRE_TEMPLATES, ROCK_TEMPLATES, SPIDER_TEMPLATES
+
+BENCH_VERSION = 1
+SUITES = ['detection', 'capture', 'color', 'cycle']
+
+# Template set -> kind of region frame it is matched against
+TEMPLATE_SETS = {
+    'rock': (ROCK_TEMPLATES, 'detection'),
+    'mined': (['rock_phase_4.png', 'rock_phase_4_2.png'], 'detection'),
+    'spider': (SPIDER_TEMPLATES, 'spider'),
+    'fire': (FIRE_TEMPLATES, 'fire'),
+}
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    rank = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[max(0, min(rank, len(ordered) - 1))]
+
+
+def measure(name: str, fn: Callable[[int], object], iterations: int = 200, warmup: int = 10,
+            group: str = '', **info) -> Dict[str, object]:
+    """Time ``fn(i)`` for ``iterations`` calls and measure its allocations.
+
+    Args:
+        name: Benchmark name
+        fn: Called with the iteration number
+        group: Suite the benchmark belongs to
+        info: Extra fields stored with the result (frame size, template count, ...)
+    """
+    for i in range(warmup):
+        fn(i)
+
+    samples = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+
+    # Allocations in a separate, shorter pass: tracing slows every allocation down
+    alloc_iterations = max(1, min(iterations, 50))
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        allocated = 0
+        for i in range(alloc_iterations):
+            snapshot_before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn(i)
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += peak - snapshot_before
+        _, overall_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    ordered = sorted(samples)
+    result = {
+        'name': name,
+        'group': group,
+        'iterations': iterations,
+        'p50_ms': _percentile(ordered, 50) * 1000,
+        'p95_ms': _percentile(ordered, 95) * 1000,
+        'p99_ms': _percentile(ordered, 99) * 1000,
+        'mean_ms': total / iterations * 1000,
+        'ops_per_s': iterations / total if total > 0 else 0.0,
+        'alloc_bytes_per_op': allocated / alloc_iterations,
+        'peak_bytes': overall_peak - before,
+    }
+    result.update(info)
+    return result
+
+
+def synthetic_frames(seed: int = 0) -> Dict[str, List[np.ndarray]]:
+    """Render region frames of realistic sizes with the game simulator.
+
+    Returns:
+        dict: 'detection', 'spider' and 'fire' frame lists covering every rock
+            phase, an empty spot, frames with and without a spider and with
+            and without fire
+    """
+    from graalera_macro.clock import VirtualClock
+    from graalera_macro.simulator import SPIDER_SPRITES, GameSimulator, SimSpider
+
+    config = GameSimulator.default_config()
+    simulator = GameSimulator(config, seed=seed, clock=VirtualClock())
+    simulator.update()
+    rock = simulator.rocks[0]
+    frames = {'detection': [], 'spider': [], 'fire': []}
+
+    for phase in (1, 2, 3, 4, 0):
+        rock.phase = phase
+        frames['detection'].append(simulator.grab(config.detection_region_1, 'detection'))
+
+    # The engine pads the spider region by 20 px on every side
+    x, y, w, h = config.spider_detection_region
+    spider_region = (x - 20, y - 20, w + 40, h + 40)
+    frames['spider'].append(simulator.grab(spider_region, 'spider'))
+    for i, sprite in enumerate(SPIDER_SPRITES):
+        simulator.spider = SimSpider((x + w * (i + 1) / 5, y + h / 2), (0.0, 0.0), 1, sprite)
+        frames['spider'].append(simulator.grab(spider_region, 'spider'))
+    simulator.spider = None
+
+    frames['fire'].append(simulator.grab(config.fire_detection_region, 'fire'))
+    simulator.fire = True
+    frames['fire'].append(simulator.grab(config.fire_detection_region, 'fire'))
+    return frames
+
+
+def recorded_frames(path: str, limit: int = 200) -> Dict[str, List[np.ndarray]]:
+    """Load up to ``limit`` frames per region kind from a recording or image directory.
+
+    Images from a directory (e.g. ``debug_screenshots/``) count as detection frames.
+    """
+    import os
+
+    frames: Dict[str, List[np.ndarray]] = {}
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if len(frames.get('detection', [])) >= limit:
+                break
+            image = cv2.imread(os.path.join(path, name))
+            if image is not None:
+                frames.setdefault('detection', []).append(image)
+        return frames
+
+    from graalera_macro.recording import SessionReader
+
+    for frame in SessionReader(path).frames():
+        kind = frame.tag or 'detection'
+        if len(frames.setdefault(kind, [])) < limit:
+            frames[kind].append(frame.image)
+    return frames
+
+
+def bench_detection(frame_sets: Dict[str, Dict[str, List[np.ndarray]]], iterations: int) -> List[dict]:
+    """Benchmark ``detect_any_template`` for every template set on every frame source."""
+    from graalera_macro.detection import TemplateMatcher
+
+    matcher = TemplateMatcher()
+    results = []
+    for source, frames in frame_sets.items():
+        for set_name, (templates, kind) in TEMPLATE_SETS.items():
+            kind_frames = frames.get(kind)
+            if not kind_frames:
+                continue
+            matcher.preload(templates)
+            height, width = kind_frames[0].shape[:2]
+            results.append(measure(
+                f"detect/{set_name}/{source}",
+                lambda i, f=kind_frames, t=templates: matcher.detect_any_template(f[i % len(f)], t, confidence=0.5),
+                iterations, group='detection', frame_size=[width, height], templates=len(templates),
+                frames=len(kind_frames),
+            ))
+    return results
+
+
+def bench_capture(iterations: int) -> List[dict]:
+    """Benchmark the screen capture backends that are available on this machine."""
+    from graalera_macro.clock import VirtualClock
+    from graalera_macro.simulator import GameSimulator
+
+    results = []
+    config = GameSimulator.default_config()
+    simulator = GameSimulator(config, seed=0, clock=VirtualClock())
+    for name, region in (('detection', config.detection_region_1), ('spider', config.spider_detection_region)):
+        results.append(measure(f"capture/simulator/{name}", lambda i, r=region: simulator.grab(r, 'detection'),
+                               iterations, group='capture', frame_size=list(region[2:])))
+
+    try:
+        from graalera_macro.capture import PyAutoGuiSource
+        source = PyAutoGuiSource()
+        source.grab(config.detection_region_1)
+    except Exception as e:
+        results.append({'name': 'capture/pyautogui', 'group': 'capture', 'skipped': str(e)})
+        return results
+    for name, region in (('detection', config.detection_region_1), ('spider', config.spider_detection_region)):
+        results.append(measure(f"capture/pyautogui/{name}", lambda i, r=region: source.grab(r),
+                               iterations, group='capture', frame_size=list(region[2:])))
+    return results
+
+
+def bench_color(iterations: int) -> List[dict]:
+    """Benchmark the PIL -> numpy -> BGR conversion done for every pyautogui capture."""
+    from PIL import Image
+
+    results = []
+    for width, height in ((100, 100), (540, 440), (1920, 1080)):
+        rgb = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+        pil_image = Image.fromarray(rgb)
+        size = [width, height]
+        results.append(measure(f"color/cvtColor/{width}x{height}",
+                               lambda i, a=rgb: cv2.cvtColor(a, cv2.COLOR_RGB2BGR),
+                               iterations, group='color', frame_size=size))
+        results.append(measure(f"color/pil_to_bgr/{width}x{height}",
+                               lambda i, p=pil_image: cv2.cvtColor(np.array(p), cv2.COLOR_RGB2BGR),
+                               iterations, group='color', frame_size=size))
+        results.append(measure(f"color/slice_reverse/{width}x{height}",
+                               lambda i, a=rgb: np.ascontiguousarray(a[:, :, ::-1]),
+                               iterations, group='color', frame_size=size))
+    return results
+
+
+def bench_cycle(simulated_seconds: float = 1800.0, seed: int = 0) -> List[dict]:
+    """Run the engine against the simulator on a virtual clock and time each mined rock.
+
+    The virtual clock removes every wait, so the wall time per rock is the
+    compute cost of a full mining cycle (captures, matching, state machine
+    and input), while the simulated time per rock is the cycle as the game
+    would see it.
+    """
+    import random
+
+    from graalera_macro.clock import VirtualClock
+    from graalera_macro.engine import MacroEngine
+    from graalera_macro.simulator import GameSimulator
+
+    random.seed(seed)
+    clock = VirtualClock()
+    simulator = GameSimulator(GameSimulator.default_config(), seed=seed, clock=clock)
+    engine = MacroEngine(simulator.config, simulator, simulator.input_dispatcher(), clock=clock)
+
+    wall_times: List[float] = []
+    sim_times: List[float] = []
+    last = {'count': 0, 'wall': time.perf_counter(), 'sim': clock.now()}
+
+    def on_frame(frame):
+        if simulator.rocks_mined != last['count']:
+            now = time.perf_counter()
+            wall_times.append(now - last['wall'])
+            sim_times.append(clock.now() - last['sim'])
+            last.update(count=simulator.rocks_mined, wall=now, sim=clock.now())
+
+    simulator.add_listener(on_frame)
+    start = time.perf_counter()
+    engine.start(background=False, duration=simulated_seconds)
+    wall_total = time.perf_counter() - start
+    engine.stop()
+
+    if not wall_times:
+        return [{'name': 'cycle/simulator', 'group': 'cycle', 'skipped': 'no rock was mined'}]
+    wall_sorted, sim_sorted = sorted(wall_times), sorted(sim_times)
+    return [{
+        'name': 'cycle/simulator',
+        'group': 'cycle',
+        'iterations': len(wall_times),
+        'p50_ms': _percentile(wall_sorted, 50) * 1000,
+        'p95_ms': _percentile(wall_sorted, 95) * 1000,
+        'p99_ms': _percentile(wall_sorted, 99) * 1000,
+        'mean_ms': sum(wall_times) / len(wall_times) * 1000,
+        'ops_per_s': len(wall_times) / wall_total if wall_total > 0 else 0.0,
+        'simulated_seconds': simulated_seconds,
+        'frames': simulator.frame_count,
+        'rocks_per_hour': simulator.rocks_mined / simulated_seconds * 3600,
+        'sim_cycle_p50_s': _percentile(sim_sorted, 50),
+        'sim_cycle_p95_s': _percentile(sim_sorted, 95),
+    }]
+
+
+def environment() -> Dict[str, object]:
+    """Describe the machine and code version the results were measured on."""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        'bench_version': BENCH_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+
+def run_suite(suites: Optional[List[str]] = None, iterations: int = 200, recording: Optional[str] = None,
+              cycle_seconds: float = 1800.0) -> Dict[str, object]:
+    """Run the selected suites and return the results with environment information."""
+    suites = suites or SUITES
+    results: List[dict] = []
+    if 'detection' in suites:
+        frame_sets = {'synthetic': synthetic_frames()}
+        if recording:
+            frame_sets['recorded'] = recorded_frames(recording)
+        results += bench_detection(frame_sets, iterations)
+    if 'capture' in suites:
+        results += bench_capture(iterations)
+    if 'color' in suites:
+        results += bench_color(iterations)
+    if 'cycle' in suites:
+        results += bench_cycle(cycle_seconds)
+    return {'environment': environment(), 'results': results}
+
+
+def format_results(report: Dict[str, object]) -> str:
+    lines = [f"{'benchmark':<36} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'alloc/op':>10}"]
+    for r in report['results']:
+        if 'skipped' in r:
+            lines.append(f"{r['name']:<36} skipped: {r['skipped']}")
+            continue
+        alloc = r.get('alloc_bytes_per_op')
+        alloc_text = f"{alloc / 1024:.1f}K" if alloc is not None else '-'
+        lines.append(f"{r['name']:<36} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} "
+                     f"{r['ops_per_s']:10.1f} {alloc_text:>10}")
+    return "\n".join(lines)
+
+
+def compare(old: Dict[str, object], new: Dict[str, object]) -> str:
+    """Return a table of p50/p95 changes between two saved reports."""
+    old_results = {r['name']: r for r in old['results'] if 'skipped' not in r}
+    lines = [f"{'benchmark':<36} {'p50 old':>9} {'p50 new':>9} {'change':>8} {'p95 change':>11}"]
+    for r in new['results']:
+        if 'skipped' in r or r['name'] not in old_results:
+            continue
+        o = old_results[r['name']]
+        p50_change = (r['p50_ms'] / o['p50_ms'] - 1) * 100 if o['p50_ms'] else 0.0
+        p95_change = (r['p95_ms'] / o['p95_ms'] - 1) * 100 if o['p95_ms'] else 0.0
+        lines.append(f"{r['name']:<36} {o['p50_ms']:9.3f} {r['p50_ms']:9.3f} {p50_change:+7.1f}% {p95_change:+10.1f}%")
+    return "\n".join(lines)
+
+
+def load_report(path: str) -> Dict[str, object]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_report(report: Dict[str, object], path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
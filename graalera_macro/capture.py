@@ -0,0 +1,99 @@
+"""Screen capture layer.
+
+Every screenshot the macro takes goes through a ``ScreenSource``. Besides
+returning the BGR frame for matching, the source keeps a reference to the
+latest frame per region tag so consumers such as the preview can pick it up
+without the macro thread doing any extra work. Listeners (e.g. the session
+recorder) are called with every captured frame.
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from graalera_macro.clock import SYSTEM_CLOCK
+
+class CapturedFrame(NamedTuple):
+    """A captured region frame."""
+    image: np.ndarray
+    region: Tuple[int, int, int, int]
+    tag: Optional[str]
+    timestamp: float
+    seq: int = 0
+
+
+class ScreenSource:
+    """Base class for anything that can provide BGR frames of screen regions.
+
+    Subclasses implement ``_grab``; ``grab`` adds bookkeeping of the latest
+    frames. Publishing a frame is a single reference assignment, so readers
+    on other threads never need a lock.
+
+    Args:
+        clock: Time source for frame timestamps (default: real time)
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or SYSTEM_CLOCK
+        self.latest: Optional[CapturedFrame] = None
+        self._latest_by_tag: Dict[str, CapturedFrame] = {}
+        self._listeners: List[Callable[[CapturedFrame], None]] = []
+        self.frame_count = 0
+
+    def add_listener(self, listener: Callable[[CapturedFrame], None]):
+        """Call ``listener`` on the capturing thread with every new frame. It must not block."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[CapturedFrame], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def grab(self, region: Tuple[int, int, int, int], tag: Optional[str] = None) -> np.ndarray:
+        """Capture ``region`` (x, y, w, h) and return it as a BGR array.
+
+        Args:
+            region: Screen region to capture
+            tag: What the region is used for ('detection', 'spider', 'fire', ...)
+        """
+        image = self._grab(tuple(region))
+        self.frame_count += 1
+        frame = CapturedFrame(image, tuple(region), tag, self.clock.now(), self.frame_count)
+        self.latest = frame
+        if tag is not None:
+            self._latest_by_tag[tag] = frame
+        for listener in self._listeners:
+            try:
+                listener(frame)
+            except Exception as e:
+                print(f"[ERROR] Capture listener failed: {e}")
+        return image
+
+    def latest_frame(self, tag: Optional[str] = None) -> Optional[CapturedFrame]:
+        """Return the most recent frame, optionally only of regions tagged ``tag``."""
+        if tag is None:
+            return self.latest
+        return self._latest_by_tag.get(tag)
+
+    def screen_size(self) -> Tuple[int, int]:
+        """Return the (width, height) of the screen."""
+        raise NotImplementedError
+
+    def _grab(self, region: Tuple[int, int, int, int]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class PyAutoGuiSource(ScreenSource):
+    """Capture the live screen with pyautogui."""
+
+    def __init__(self):
+        super().__init__()
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def screen_size(self) -> Tuple[int, int]:
+        size = self._pyautogui.size()
+        return size.width, size.height
+
+    def _grab(self, region):
+        screenshot = self._pyautogui.screenshot(region=region)
+        return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
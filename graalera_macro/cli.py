@@ -0,0 +1,780 @@
+"""Headless command line front-end.
+
+Usage:
+    python -m graalera_macro run --config spot.json [--duration SECONDS]
+    python -m graalera_macro run --profile NAME [--duration SECONDS] [--record [PATH]]
+    python -m graalera_macro profiles [--dir DIR]
+    python -m graalera_macro build-pack [--assets DIR] [--output PATH]
+    python -m graalera_macro replay SOURCE [--config spot.json | --profile NAME] [--max-speed]
+    python -m graalera_macro simulate [--duration SECONDS] [--virtual-time] [--spiders] [--json PATH]
+    python -m graalera_macro bench [--only SUITE ...] [--recording PATH] [--json PATH] [--compare OLD.json]
+    python -m graalera_macro corpus synthesize|import|check DIR ...
+    python -m graalera_macro tune CORPUS [--profile NAME [--write]] [--methods METHOD ...] [--workers N]
+    python -m graalera_macro analytics report [--db PATH] [--by spot|settings|day|session] [--since DATE]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+
+from graalera_macro.asset_pack import DEFAULT_PACK_NAME
+from graalera_macro.profiles import DEFAULT_PROFILE_DIR, ProfileError, ProfileStore, load_profile_file
+
+
+class ConsoleReporter:
+    """Print status changes published by the engine."""
+
+    def __init__(self):
+        self.last_status = None
+
+    def publish(self, **fields):
+        status = fields.get('status')
+        if status is not None and status != self.last_status:
+            self.last_status = status
+            print(f"[STATUS] {status}")
+
+
+def run_engine(engine, duration: Optional[float] = None) -> float:
+    """Run ``engine`` in the background until it stops, ``duration`` passes or Ctrl+C.
+
+    ``duration`` and the returned time are measured on the engine's clock,
+    so with a virtual clock they are simulated seconds.
+
+    Returns:
+        float: Seconds the engine ran
+    """
+    start = engine.clock.now()
+    engine.start(duration=duration)
+    try:
+        while engine.running:
+            time.sleep(0.05 if engine.clock.virtual else 0.2)
+    except KeyboardInterrupt:
+        print("\n[INFO] Interrupted, stopping...")
+    engine.stop(timeout=5.0)
+    return engine.clock.now() - start
+
+
+def print_summary(engine, elapsed: float):
+    """Print rocks mined, throughput and timing statistics of a run."""
+    rocks_per_hour = engine.rock_counter / elapsed * 3600 if elapsed > 0 else 0.0
+    print(f"[SUMMARY] Rocks mined: {engine.rock_counter} in {elapsed:.1f}s ({rocks_per_hour:.1f} rocks/hour)")
+    print(f"[TIMING] {engine.pacer.summary()}")
+    print(f"[TIMING] Time breakdown: {engine.time_breakdown.summary()}")
+    print(f"[INPUT] {engine.input_dispatcher.stats()}")
+    print_errors(engine)
+    print_watchdog(engine)
+
+
+def export_stage_timing(engine, path: Optional[str]):
+    """Print and export the engine's stage histograms if stage timing was requested."""
+    if path is None:
+        return
+    print(f"[TIMING] Stages: {engine.stage_timer.summary()}")
+    try:
+        print(f"[TIMING] Stage timings written to {engine.stage_timer.export(path or None)}")
+    except OSError as e:
+        print(f"[ERROR] Failed to export stage timings: {e}")
+
+
+def start_trace(engine, path: Optional[str]):
+    """Attach a ``TraceRecorder`` to ``engine`` if a trace was requested."""
+    if path is None:
+        return None
+    from graalera_macro.tracing import TraceRecorder
+
+    tracer = TraceRecorder(path or None, clock=engine.clock)
+    tracer.attach(engine)
+    return tracer
+
+
+def stop_trace(engine, tracer):
+    if tracer is None:
+        return
+    tracer.detach(engine)
+    try:
+        tracer.stop()
+        print(f"[TRACE] {tracer.summary()}")
+    except OSError as e:
+        print(f"[ERROR] Failed to write trace: {e}")
+
+
+def start_metrics(engine, port: Optional[int]):
+    """Serve ``engine``'s metrics on ``port`` if requested."""
+    if port is None:
+        return None
+    from graalera_macro.metrics import MetricsCollector, MetricsServer
+
+    collector = MetricsCollector()
+    collector.attach(engine)
+    server = MetricsServer(collector, port)
+    try:
+        server.start()
+    except OSError as e:
+        print(f"[ERROR] Could not serve metrics on port {port}: {e}")
+        collector.detach()
+        return None
+    print(f"[METRICS] Serving {server.url}")
+    return server
+
+
+def stop_metrics(server):
+    if server is not None:
+        server.collector.detach()
+        server.stop()
+
+
+def start_event_log(engine, path: Optional[str], limit_args: List[str]):
+    """Attach an ``EventLog`` to ``engine`` if one was requested."""
+    if path is None:
+        return None
+    from graalera_macro.eventlog import DEFAULT_LIMITS, EventLog
+
+    limits = dict(DEFAULT_LIMITS)
+    for limit in limit_args:
+        kind, _, rate = limit.partition('=')
+        try:
+            limits[kind] = float(rate)
+        except ValueError:
+            print(f"[WARN] Ignoring event limit '{limit}', expected KIND=RATE")
+    event_log = EventLog(path, limits=limits) if path else EventLog.in_directory(limits=limits)
+    event_log.start()
+    event_log.attach(engine)
+    print(f"[INFO] Logging events to {event_log.path}")
+    return event_log
+
+
+def stop_event_log(event_log):
+    if event_log is not None:
+        event_log.stop()
+        print(f"[INFO] {event_log.summary()}")
+
+
+def make_debug_frames(count: int):
+    """Return a ``DebugFrameRing`` keeping ``count`` frames per detector, or None for 0."""
+    if count <= 0:
+        return None
+    from graalera_macro.debug_frames import DebugFrameRing
+
+    return DebugFrameRing(capacity=count)
+
+
+def stop_debug_frames(engine):
+    """Finish writing debug frames and screenshots queued during the run."""
+    engine.matcher.close()
+    if engine.debug_frames is not None:
+        engine.debug_frames.stop()
+        if engine.debug_frames.dumps:
+            print(f"[DEBUG] {engine.debug_frames.summary()}")
+
+
+def start_analytics(engine, path: Optional[str], spot: Optional[str], source: str):
+    """Record per-rock and session analytics of ``engine`` into the database at ``path``."""
+    if path is None:
+        return None
+    from graalera_macro.analytics import DEFAULT_DB_PATH, AnalyticsStore, SessionAnalytics
+
+    analytics = SessionAnalytics(AnalyticsStore(path or DEFAULT_DB_PATH), spot=spot, source=source)
+    analytics.attach(engine)
+    return analytics
+
+
+def stop_analytics(analytics):
+    if analytics is not None:
+        analytics.finish()
+        analytics.store.stop()
+        print(f"[INFO] Analytics {analytics.summary()} saved to {analytics.store.path}")
+
+
+def make_watchdog(enabled: bool, deadline_args: List[str]):
+    """Return a ``StallWatchdog`` with the deadlines given as SIGNAL=SECONDS, or None."""
+    if not enabled:
+        return None
+    from graalera_macro.watchdog import DEFAULT_DEADLINES, StallWatchdog
+
+    deadlines = {}
+    for deadline in deadline_args:
+        signal, _, seconds = deadline.partition('=')
+        if signal not in DEFAULT_DEADLINES:
+            print(f"[WARN] Ignoring watchdog deadline '{deadline}', signals are {', '.join(DEFAULT_DEADLINES)}")
+            continue
+        try:
+            deadlines[signal] = float(seconds)
+        except ValueError:
+            print(f"[WARN] Ignoring watchdog deadline '{deadline}', expected SIGNAL=SECONDS")
+    return StallWatchdog(deadlines, alert=lambda message: print(f"\a[ALERT] {message}"))
+
+
+def print_errors(engine):
+    if any(counts['errors'] for counts in engine.errors.stats().values()):
+        print(f"[ERROR] Errors by class: {engine.errors.summary()}")
+
+
+def print_watchdog(engine):
+    if engine.watchdog is not None and any(engine.watchdog.actions.values()):
+        print(f"[WATCHDOG] {engine.watchdog.summary()}")
+
+
+def cmd_run(args) -> int:
+    from graalera_macro.capture import PyAutoGuiSource
+    from graalera_macro.detection import TemplateMatcher
+    from graalera_macro.engine import MacroEngine
+    from graalera_macro.input import InputDispatcher
+
+    try:
+        if args.profile:
+            profile = ProfileStore(args.profile_dir).load(args.profile)
+        else:
+            profile = load_profile_file(args.config)
+    except ProfileError as e:
+        print(f"[ERROR] {e}")
+        return 2
+
+    config = profile.config
+    if args.sample_count is not None:
+        config.sample_count = args.sample_count
+    screen_source = PyAutoGuiSource()
+    problems = profile.validate(screen_source.screen_size())
+    if problems:
+        print(f"[ERROR] Profile '{profile.name}' cannot be used on this screen:")
+        for problem in problems:
+            print(f"[ERROR]   {problem}")
+        return 2
+
+    input_dispatcher = InputDispatcher.with_default_backends()
+    recorder = None
+    if args.record is not None:
+        from graalera_macro.recording import SessionRecorder
+
+        metadata = {'profile': profile.name, 'config': config.to_dict(),
+                    'screen_size': list(screen_source.screen_size())}
+        if args.record:
+            recorder = SessionRecorder(args.record, metadata=metadata)
+        else:
+            recorder = SessionRecorder.in_directory(metadata=metadata)
+        recorder.attach(screen_source, input_dispatcher)
+        recorder.start()
+        print(f"[RECORD] Recording session to {recorder.path}")
+
+    engine = MacroEngine(
+        config, screen_source, input_dispatcher,
+        matcher=TemplateMatcher(debug=args.debug),
+        ui=ConsoleReporter() if args.verbose else None,
+        on_stop=lambda status: print(f"[INFO] {status}"),
+        recorder=recorder,
+        debug_frames=make_debug_frames(args.debug_frames),
+        watchdog=make_watchdog(args.watchdog, args.watchdog_deadline),
+    )
+    engine.latency_calibrator.calibrating = args.calibrate_latency
+    engine.stage_timer.enabled = args.stage_timing is not None
+    tracer = start_trace(engine, args.trace)
+    metrics = start_metrics(engine, args.metrics_port)
+    event_log = start_event_log(engine, args.event_log, args.event_limit)
+    analytics = start_analytics(engine, args.analytics, profile.name, 'run')
+    elapsed = run_engine(engine, args.duration)
+    stop_analytics(analytics)
+    stop_debug_frames(engine)
+    stop_event_log(event_log)
+    stop_metrics(metrics)
+    stop_trace(engine, tracer)
+    if recorder is not None:
+        recorder.stop()
+        print(f"[RECORD] {recorder.summary()}")
+    print_summary(engine, elapsed)
+    export_stage_timing(engine, args.stage_timing)
+    return 0
+
+
+def cmd_replay(args) -> int:
+    from graalera_macro.clock import VirtualClock
+    from graalera_macro.config import MacroConfig
+    from graalera_macro.detection import TemplateMatcher
+    from graalera_macro.engine import MacroEngine
+    from graalera_macro.input import CapturingBackend, InputDispatcher
+    from graalera_macro.replay import RecordingSource, open_replay
+
+    # At max speed the recorded timing is kept, but on a virtual clock every wait is instant
+    clock = VirtualClock() if args.max_speed else None
+    source = open_replay(args.source, speed=args.speed, loop=args.loop, clock=clock)
+    try:
+        if args.profile:
+            config = ProfileStore(args.profile_dir).load(args.profile).config
+        elif args.config:
+            config = load_profile_file(args.config).config
+        elif isinstance(source, RecordingSource) and source.metadata.get('config'):
+            config = MacroConfig.from_dict(source.metadata['config'])
+        else:
+            print("[ERROR] --config or --profile is required unless replaying a recording")
+            return 2
+    except ProfileError as e:
+        print(f"[ERROR] {e}")
+        return 2
+    missing = config.missing_fields()
+    if missing:
+        print(f"[ERROR] Config is missing: {', '.join(missing)}")
+        return 2
+
+    backend = CapturingBackend(clock=clock)
+    engine = MacroEngine(
+        config, source, InputDispatcher.capturing(backend, clock=clock, synchronous=clock is not None),
+        matcher=TemplateMatcher(debug=args.debug),
+        ui=ConsoleReporter() if args.verbose else None,
+        on_stop=lambda status: print(f"[INFO] {status}"),
+        clock=clock,
+        debug_frames=make_debug_frames(args.debug_frames),
+        watchdog=make_watchdog(args.watchdog, args.watchdog_deadline),
+    )
+    engine.stage_timer.enabled = args.stage_timing is not None
+    tracer = start_trace(engine, args.trace)
+    metrics = start_metrics(engine, args.metrics_port)
+    event_log = start_event_log(engine, args.event_log, args.event_limit)
+    analytics = start_analytics(engine, args.analytics, args.profile or os.path.basename(args.source), 'replay')
+    start = engine.clock.now()
+    engine.start(duration=args.duration)
+    try:
+        while engine.running and not source.finished:
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        print("\n[INFO] Interrupted, stopping...")
+    engine.stop(timeout=5.0)
+    elapsed = engine.clock.now() - start
+    stop_analytics(analytics)
+    stop_debug_frames(engine)
+    stop_event_log(event_log)
+    stop_metrics(metrics)
+    stop_trace(engine, tracer)
+
+    print(f"[REPLAY] {source.frame_count} frames grabbed, {len(backend.clicks())} clicks captured (not executed)")
+    print_summary(engine, elapsed)
+    export_stage_timing(engine, args.stage_timing)
+    return 0
+
+
+def cmd_simulate(args) -> int:
+    import random
+
+    from graalera_macro.clock import VirtualClock
+    from graalera_macro.engine import MacroEngine
+    from graalera_macro.simulator import GameSimulator
+
+    config = load_profile_file(args.config).config if args.config else GameSimulator.default_config()
+    if args.sample_count is not None:
+        config.sample_count = args.sample_count
+    config.spider_detection_enabled = args.spiders
+    if args.seed is not None:
+        # The humanized click delays draw from the global generator
+        random.seed(args.seed)
+    clock = VirtualClock() if args.virtual_time else None
+    simulator = GameSimulator(
+        config, hits_per_phase=args.hits_per_phase, respawn_delay=(args.respawn_min, args.respawn_max),
+        click_latency=args.click_latency, spider_rate=args.spider_rate if args.spiders else 0.0,
+        fire_rate=args.fire_rate, seed=args.seed, clock=clock,
+    )
+    engine = MacroEngine(
+        config, simulator, simulator.input_dispatcher(),
+        ui=ConsoleReporter() if args.verbose else None,
+        on_stop=lambda status: print(f"[INFO] {status}"),
+        recorder=simulator.scorer,
+        clock=clock,
+        debug_frames=make_debug_frames(args.debug_frames),
+        watchdog=make_watchdog(args.watchdog, args.watchdog_deadline),
+    )
+    engine.latency_calibrator.calibrating = args.calibrate_latency
+    engine.stage_timer.enabled = args.stage_timing is not None
+    tracer = start_trace(engine, args.trace)
+    metrics = start_metrics(engine, args.metrics_port)
+    event_log = start_event_log(engine, args.event_log, args.event_limit)
+    analytics = start_analytics(engine, args.analytics, 'simulator', 'simulate')
+    wall_start = time.perf_counter()
+    elapsed = run_engine(engine, args.duration)
+    wall_elapsed = time.perf_counter() - wall_start
+    stop_analytics(analytics)
+    stop_debug_frames(engine)
+    stop_event_log(event_log)
+    stop_metrics(metrics)
+    stop_trace(engine, tracer)
+
+    report = simulator.report()
+    report['wall_time'] = wall_elapsed
+    report['engine'] = {
+        'rocks_counted': engine.rock_counter,
+        'pacer': engine.pacer.stats(),
+        'input': engine.input_dispatcher.stats(),
+        'click_latency': engine.latency_calibrator.metrics(),
+        'stages': engine.stage_timer.stats(),
+        'time_breakdown': engine.time_breakdown.totals(),
+        'errors': engine.errors.stats(),
+    }
+    print(f"[SIM] Rocks mined: {report['rocks_mined']} (engine counted {engine.rock_counter}) in {elapsed:.1f}s "
+          f"({report['rocks_per_hour']:.1f} rocks/hour), clicks: {report['clicks']} "
+          f"({report['wasted_clicks']} wasted)")
+    if clock is not None:
+        print(f"[SIM] Simulated {elapsed:.0f}s in {wall_elapsed:.1f}s of wall time")
+    for kind, scores in sorted(report['detection'].items()):
+        print(f"[SIM] {kind:<7} accuracy {scores['accuracy']:.3f}  precision {scores['precision']:.3f}  "
+              f"recall {scores['recall']:.3f}  (tp {scores['tp']} fp {scores['fp']} tn {scores['tn']} fn {scores['fn']})")
+    print(f"[TIMING] {engine.pacer.summary()}")
+    print(f"[TIMING] Time breakdown: {engine.time_breakdown.summary()}")
+    print_errors(engine)
+    print_watchdog(engine)
+    export_stage_timing(engine, args.stage_timing)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"[INFO] Report written to {args.json}")
+    return 0
+
+
+def cmd_profiles(args) -> int:
+    store = ProfileStore(args.dir)
+    names = store.list()
+    if not names:
+        print(f"No profiles in {store.directory}")
+        return 0
+    for name in names:
+        try:
+            profile = store.load(name)
+        except ProfileError as e:
+            print(f"{name:<20} unreadable: {e}")
+            continue
+        size = f"{profile.screen_size[0]}x{profile.screen_size[1]}" if profile.screen_size else "unknown screen"
+        print(f"{name:<20} {size:<12} saved {profile.saved_at or 'unknown'}")
+    return 0
+
+
+def cmd_build_pack(args) -> int:
+    from graalera_macro.asset_pack import AssetPack, build_pack
+
+    output = args.output or os.path.join(args.assets, DEFAULT_PACK_NAME)
+    start = time.perf_counter()
+    header = build_pack(args.assets, output)
+    elapsed = time.perf_counter() - start
+    pack = AssetPack(output)
+    for name in pack.names():
+        print(f"{name:<24} {', '.join(pack.kinds(name))}")
+    print(f"[INFO] Packed {len(header['templates'])} templates into {output} "
+          f"({os.path.getsize(output) / 1024:.1f} KiB, {elapsed * 1000:.0f} ms)")
+    return 0
+
+
+def cmd_bench(args) -> int:
+    from graalera_macro import bench
+
+    report = bench.run_suite(args.only, iterations=args.iterations, recording=args.recording,
+                             cycle_seconds=args.cycle_seconds)
+    print(bench.format_results(report))
+    if args.json:
+        bench.save_report(report, args.json)
+        print(f"[INFO] Results written to {args.json}")
+    if args.compare:
+        print()
+        print(bench.compare(bench.load_report(args.compare), report))
+    return 0
+
+
+def cmd_corpus(args) -> int:
+    from graalera_macro.config import MacroConfig
+    from graalera_macro.corpus import Corpus, CorpusError, check_budgets, evaluate, format_results, import_images, synthesize
+
+    try:
+        corpus = Corpus(args.directory)
+    except CorpusError as e:
+        print(f"[ERROR] {e}")
+        return 2
+
+    if args.action == 'synthesize':
+        try:
+            added = synthesize(corpus, count=args.count, noise=args.noise, seed=args.seed)
+        except CorpusError as e:
+            print(f"[ERROR] {e}")
+            return 2
+        corpus.save()
+        print(f"[INFO] Added {added} simulator frames to {args.directory} ({len(corpus.frames)} total)")
+        return 0
+    if args.action == 'import':
+        added = import_images(corpus, args.source, kind=args.kind)
+        corpus.save()
+        print(f"[INFO] Added {added} unlabelled frames to {args.directory}; label them in {corpus.manifest_path}")
+        return 0
+
+    try:
+        if args.profile:
+            config = ProfileStore(args.profile_dir).load(args.profile).config
+        elif args.config:
+            config = load_profile_file(args.config).config
+        else:
+            config = MacroConfig()
+        results = evaluate(corpus, config)
+    except (ProfileError, CorpusError) as e:
+        print(f"[ERROR] {e}")
+        return 2
+    if not results:
+        print(f"[ERROR] {args.directory} has no labelled frames")
+        return 2
+    print(format_results(results))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Results written to {args.json}")
+
+    failures = check_budgets(results, corpus.budgets)
+    for failure in failures:
+        print(f"[FAIL] {failure}")
+    if failures:
+        return 1
+    print("[INFO] All detectors within budget")
+    return 0
+
+
+def cmd_tune(args) -> int:
+    from graalera_macro.corpus import Corpus, CorpusError
+    from graalera_macro.tuner import apply_recommendations, format_results, tune
+
+    if args.write and not args.profile:
+        print("[ERROR] --write needs --profile")
+        return 2
+    try:
+        corpus = Corpus(args.corpus)
+        profile = None
+        if args.profile:
+            store = ProfileStore(args.profile_dir)
+            profile = store.load(args.profile)
+            config = profile.config
+        elif args.config:
+            config = load_profile_file(args.config).config
+        else:
+            from graalera_macro.config import MacroConfig
+            config = MacroConfig()
+    except (ProfileError, CorpusError) as e:
+        print(f"[ERROR] {e}")
+        return 2
+
+    start = time.perf_counter()
+    results = tune(corpus, config, methods=args.methods, workers=args.workers)
+    if not results:
+        print(f"[ERROR] {args.corpus} has no labelled frames")
+        return 2
+    print(format_results(results))
+    print(f"[INFO] Tuned {len(results)} detectors in {time.perf_counter() - start:.1f}s")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Results written to {args.json}")
+
+    if args.write:
+        changed = apply_recommendations(profile.config, results)
+        path = store.save(profile)
+        print(f"[INFO] Wrote {', '.join(f'{k}={v:.2f}' for k, v in changed.items())} to {path}")
+    return 0
+
+
+def cmd_analytics(args) -> int:
+    from graalera_macro.analytics import AnalyticsError, format_report, report
+
+    try:
+        results = report(args.db, by=args.by, since=args.since, source=args.source)
+    except AnalyticsError as e:
+        print(f"[ERROR] {e}")
+        return 2
+    if not results:
+        print(f"[INFO] No finished sessions in {args.db}")
+        return 0
+    print(format_report(results))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Report written to {args.json}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="graalera_macro", description="GraalEra mining macro (headless)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help="Run the mining engine without the GUI")
+    source = run.add_mutually_exclusive_group(required=True)
+    source.add_argument('--config', help="JSON config or profile file with regions, points, confidences and timeouts")
+    source.add_argument('--profile', help="Name of a profile saved from the GUI")
+    run.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help="Directory holding saved profiles")
+    run.add_argument('--duration', type=float, default=None, help="Stop after this many seconds")
+    run.add_argument('--sample-count', type=int, default=None, help="Override the number of samples per check")
+    run.add_argument('--calibrate-latency', action='store_true', help="Measure click-to-effect latency while running")
+    run.add_argument('--debug', action='store_true', help="Print template results and save debug screenshots")
+    run.add_argument('--record', nargs='?', const='', default=None, metavar='PATH',
+                     help="Record every captured frame (default file: recordings/session_<time>.gerec)")
+    run.add_argument('--stage-timing', nargs='?', const='', default=None, metavar='PATH',
+                     help="Time engine stages and write the histograms (default file: timings/stages_<time>.json)")
+    run.add_argument('--trace', nargs='?', const='', default=None, metavar='PATH',
+                     help="Write a Chrome trace of stages, waits and input (default file: traces/trace_<time>.json)")
+    run.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                     help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    run.add_argument('--event-log', nargs='?', const='', default=None, metavar='PATH',
+                     help="Write engine events as JSON lines (default file: logs/events_<time>.jsonl)")
+    run.add_argument('--event-limit', action='append', default=[], metavar='KIND=RATE',
+                     help="Limit an event type to RATE events/s in the event log (0 turns it off)")
+    run.add_argument('--analytics', nargs='?', const='', default='', metavar='PATH',
+                     help="Database for per-rock and session analytics (default: analytics/sessions.sqlite3)")
+    run.add_argument('--no-analytics', dest='analytics', action='store_const', const=None,
+                     help="Do not record analytics")
+    run.add_argument('--no-watchdog', dest='watchdog', action='store_false',
+                     help="Do not detect stalls and run recovery actions")
+    run.add_argument('--watchdog-deadline', action='append', default=[], metavar='SIGNAL=SECONDS',
+                     help="Seconds without rock, phase, detection, frame or loop progress before a stall "
+                          "(0 turns it off)")
+    run.add_argument('--debug-frames', type=int, default=10, metavar='N',
+                     help="Keep the last N frames per detector and save them after anomalies (0 turns it off)")
+    run.add_argument('-v', '--verbose', action='store_true', help="Print every status change")
+    run.set_defaults(func=cmd_run)
+
+    replay = subparsers.add_parser('replay', help="Run the engine against a recording, image directory or video")
+    replay.add_argument('source', help="Recording (.gerec), directory of images or video file")
+    replay_config = replay.add_mutually_exclusive_group()
+    replay_config.add_argument('--config', help="JSON config or profile file (default: the config stored in the recording)")
+    replay_config.add_argument('--profile', help="Name of a saved profile")
+    replay.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help="Directory holding saved profiles")
+    replay.add_argument('--speed', type=float, default=1.0, help="Playback speed relative to the original timing")
+    replay.add_argument('--max-speed', action='store_true',
+                        help="Replay on a virtual clock: the recorded timing is kept but waits take no time")
+    replay.add_argument('--loop', action='store_true', help="Start over at the end of the source")
+    replay.add_argument('--duration', type=float, default=None, help="Stop after this many seconds")
+    replay.add_argument('--debug', action='store_true', help="Print template results and save debug screenshots")
+    replay.add_argument('--stage-timing', nargs='?', const='', default=None, metavar='PATH',
+                        help="Time engine stages and write the histograms (default file: timings/stages_<time>.json)")
+    replay.add_argument('--trace', nargs='?', const='', default=None, metavar='PATH',
+                        help="Write a Chrome trace of stages, waits and input (default file: traces/trace_<time>.json)")
+    replay.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    replay.add_argument('--event-log', nargs='?', const='', default=None, metavar='PATH',
+                        help="Write engine events as JSON lines (default file: logs/events_<time>.jsonl)")
+    replay.add_argument('--event-limit', action='append', default=[], metavar='KIND=RATE',
+                        help="Limit an event type to RATE events/s in the event log (0 turns it off)")
+    replay.add_argument('--analytics', nargs='?', const='', default=None, metavar='PATH',
+                        help="Record per-rock and session analytics (default file: analytics/sessions.sqlite3)")
+    replay.add_argument('--watchdog', action='store_true',
+                        help="Detect stalls and run escalating recovery actions")
+    replay.add_argument('--watchdog-deadline', action='append', default=[], metavar='SIGNAL=SECONDS',
+                        help="Seconds without rock, phase, detection, frame or loop progress before a stall "
+                             "(0 turns it off)")
+    replay.add_argument('--debug-frames', type=int, default=10, metavar='N',
+                        help="Keep the last N frames per detector and save them after anomalies (0 turns it off)")
+    replay.add_argument('-v', '--verbose', action='store_true', help="Print every status change")
+    replay.set_defaults(func=cmd_replay)
+
+    simulate = subparsers.add_parser('simulate', help="Run the engine against the local game simulator")
+    simulate.add_argument('--config', help="JSON config or profile file (default: built-in layout)")
+    simulate.add_argument('--duration', type=float, default=60.0, help="Seconds to run (simulated with --virtual-time)")
+    simulate.add_argument('--virtual-time', action='store_true',
+                          help="Run on a virtual clock: waits take no real time and runs are deterministic")
+    simulate.add_argument('--sample-count', type=int, default=None, help="Override the number of samples per check")
+    simulate.add_argument('--hits-per-phase', type=int, nargs=3, default=[2, 2, 2], metavar='N',
+                          help="Clicks needed in rock phases 1, 2 and 3")
+    simulate.add_argument('--respawn-min', type=float, default=3.0, help="Minimum rock respawn delay")
+    simulate.add_argument('--respawn-max', type=float, default=8.0, help="Maximum rock respawn delay")
+    simulate.add_argument('--click-latency', type=float, default=0.15, help="Seconds before a click shows on screen")
+    simulate.add_argument('--spiders', action='store_true', help="Enable spiders and spider detection")
+    simulate.add_argument('--spider-rate', type=float, default=1.0, help="Spiders per minute")
+    simulate.add_argument('--fire-rate', type=float, default=0.0, help="Fires per hour")
+    simulate.add_argument('--seed', type=int, default=None, help="Random seed")
+    simulate.add_argument('--calibrate-latency', action='store_true', help="Measure click-to-effect latency")
+    simulate.add_argument('--json', default=None, metavar='PATH', help="Write the report as JSON")
+    simulate.add_argument('--stage-timing', nargs='?', const='', default=None, metavar='PATH',
+                          help="Time engine stages and write the histograms (default file: timings/stages_<time>.json)")
+    simulate.add_argument('--trace', nargs='?', const='', default=None, metavar='PATH',
+                          help="Write a Chrome trace of stages, waits and input (default file: traces/trace_<time>.json)")
+    simulate.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                          help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    simulate.add_argument('--event-log', nargs='?', const='', default=None, metavar='PATH',
+                          help="Write engine events as JSON lines (default file: logs/events_<time>.jsonl)")
+    simulate.add_argument('--event-limit', action='append', default=[], metavar='KIND=RATE',
+                          help="Limit an event type to RATE events/s in the event log (0 turns it off)")
+    simulate.add_argument('--analytics', nargs='?', const='', default=None, metavar='PATH',
+                          help="Record per-rock and session analytics (default file: analytics/sessions.sqlite3)")
+    simulate.add_argument('--watchdog', action='store_true',
+                          help="Detect stalls and run escalating recovery actions")
+    simulate.add_argument('--watchdog-deadline', action='append', default=[], metavar='SIGNAL=SECONDS',
+                          help="Seconds without rock, phase, detection, frame or loop progress before a stall "
+                               "(0 turns it off)")
+    simulate.add_argument('--debug-frames', type=int, default=0, metavar='N',
+                          help="Keep the last N frames per detector and save them after anomalies (default: off)")
+    simulate.add_argument('-v', '--verbose', action='store_true', help="Print every status change")
+    simulate.set_defaults(func=cmd_simulate)
+
+    bench_parser = subparsers.add_parser('bench', help="Benchmark detection, capture and the mining cycle")
+    bench_parser.add_argument('--only', nargs='+', choices=['detection', 'capture', 'color', 'cycle'], default=None,
+                              help="Suites to run (default: all)")
+    bench_parser.add_argument('--iterations', type=int, default=200, help="Timed calls per benchmark")
+    bench_parser.add_argument('--recording', default=None,
+                              help="Recording (.gerec) or image directory to benchmark detection on as well")
+    bench_parser.add_argument('--cycle-seconds', type=float, default=1800.0,
+                              help="Simulated seconds of mining for the cycle benchmark")
+    bench_parser.add_argument('--json', default=None, metavar='PATH', help="Write the results as JSON")
+    bench_parser.add_argument('--compare', default=None, metavar='OLD', help="Compare with results saved by --json")
+    bench_parser.set_defaults(func=cmd_bench)
+
+    corpus = subparsers.add_parser('corpus', help="Build a labelled frame corpus and check detection against it")
+    corpus_actions = corpus.add_subparsers(dest='action', required=True)
+    synth = corpus_actions.add_parser('synthesize', help="Add labelled frames rendered by the game simulator")
+    synth.add_argument('directory', help="Corpus directory")
+    synth.add_argument('--count', type=int, default=200, help="Frames per region kind")
+    synth.add_argument('--noise', type=float, default=6.0, help="Standard deviation of the added pixel noise")
+    synth.add_argument('--seed', type=int, default=0, help="Random seed")
+    corpus_import = corpus_actions.add_parser('import', help="Add the images of a directory (e.g. debug_screenshots) unlabelled")
+    corpus_import.add_argument('directory', help="Corpus directory")
+    corpus_import.add_argument('source', help="Directory of images")
+    corpus_import.add_argument('--kind', choices=['detection', 'spider', 'fire'], default='detection',
+                               help="Region the images were captured from")
+    check = corpus_actions.add_parser('check', help="Score every detector and fail if a budget is missed")
+    check.add_argument('directory', help="Corpus directory")
+    check_config = check.add_mutually_exclusive_group()
+    check_config.add_argument('--config', help="JSON config or profile file with the thresholds to check (default: built-in)")
+    check_config.add_argument('--profile', help="Name of a saved profile")
+    check.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help="Directory holding saved profiles")
+    check.add_argument('--json', default=None, metavar='PATH', help="Write the results as JSON")
+    corpus.set_defaults(func=cmd_corpus)
+
+    tune_parser = subparsers.add_parser('tune', help="Recommend detection thresholds from a labelled corpus")
+    tune_parser.add_argument('corpus', help="Corpus directory (see 'corpus')")
+    tune_config = tune_parser.add_mutually_exclusive_group()
+    tune_config.add_argument('--config', help="JSON config or profile file with the templates and current thresholds")
+    tune_config.add_argument('--profile', help="Name of a saved profile")
+    tune_parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help="Directory holding saved profiles")
+    tune_parser.add_argument('--write', action='store_true', help="Save the recommended thresholds into --profile")
+    tune_parser.add_argument('--methods', nargs='+', choices=['ccoeff_normed', 'ccorr_normed', 'sqdiff_normed'],
+                             default=None, help="Also compare these matching methods with the engine's")
+    tune_parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    tune_parser.add_argument('--json', default=None, metavar='PATH', help="Write the results as JSON")
+    tune_parser.set_defaults(func=cmd_tune)
+
+    analytics = subparsers.add_parser('analytics', help="Report throughput from the session analytics database")
+    analytics_actions = analytics.add_subparsers(dest='action', required=True)
+    analytics_report = analytics_actions.add_parser('report', help="Rocks/hour and per-rock times per group, best first")
+    analytics_report.add_argument('--db', default=os.path.join('analytics', 'sessions.sqlite3'),
+                                  help="Analytics database")
+    analytics_report.add_argument('--by', choices=['spot', 'settings', 'day', 'session'], default='spot',
+                                  help="Group sessions by spot, spot and settings, day or session")
+    analytics_report.add_argument('--since', default=None, metavar='DATE', help="Only sessions started on or after DATE")
+    analytics_report.add_argument('--source', choices=['gui', 'run', 'replay', 'simulate'], default=None,
+                                  help="Only sessions started from this front-end")
+    analytics_report.add_argument('--json', default=None, metavar='PATH', help="Write the report as JSON")
+    analytics.set_defaults(func=cmd_analytics)
+
+    profiles = subparsers.add_parser('profiles', help="List saved spot profiles")
+    profiles.add_argument('--dir', default=DEFAULT_PROFILE_DIR, help="Directory holding saved profiles")
+    profiles.set_defaults(func=cmd_profiles)
+
+    pack = subparsers.add_parser('build-pack', help="Compile the template PNGs into a memory-mapped asset pack")
+    pack.add_argument('--assets', default='assets', help="Directory holding the template PNGs")
+    pack.add_argument('--output', default=None, help=f"Pack file to write (default: ASSETS/{DEFAULT_PACK_NAME})")
+    pack.set_defaults(func=cmd_build_pack)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""Clocks for pacing, timestamps and simulated time.
+
+Everything that waits or timestamps (the pacer, the input dispatcher, the
+latency calibrator, screen sources and the simulator) takes a clock instead
+of calling ``time.perf_counter``/``time.sleep`` directly. ``SystemClock`` is
+real time. ``VirtualClock`` only advances when a thread sleeps on it, so a
+simulated hour of waits finishes as fast as the frames can be rendered and
+matched, and runs with the same seed are reproducible.
+"""
+import threading
+import time
+
+
+class SystemClock:
+    """Real monotonic time."""
+
+    virtual = False
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock:
+    """Simulated time that advances instantly when slept on.
+
+    Meant to be driven by one thread (the engine). Other components should
+    run synchronously on that thread, e.g. a synchronous ``InputDispatcher``,
+    so every step happens at a well-defined simulated time.
+
+    Args:
+        start: Initial time in seconds
+    """
+
+    virtual = True
+
+    def __init__(self, start: float = 0.0):
+        self._now = start
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            self.advance(seconds)
+
+    def advance(self, seconds: float):
+        """Move time forward by ``seconds``."""
+        with self._lock:
+            self._now += seconds
+
+
+SYSTEM_CLOCK = SystemClock()
@@ -0,0 +1,86 @@
+"""Macro configuration shared by the GUI and headless front-ends."""
+import json
+from dataclasses import asdict, dataclass, field, fields
+from typing import List, Optional, Tuple
+
+Region = Tuple[int, int, int, int]
+Point = Tuple[int, int]
+
+ROCK_TEMPLATES = ['rock_phase_1.png', 'rock_phase_2.png', 'rock_phase_3.png']
+SPIDER_TEMPLATES = [
+    'spider1.png', 'spider2.png', 'spider3.png', 'spider4.png',
+    'spider1_legs_1.png', 'spider1_legs_2.png',
+    'spider4_legs_1.png', 'spider4_legs_2.png'
+]
+FIRE_TEMPLATES = ['fire.png']
+
+
+@dataclass
+class MacroConfig:
+    """Everything the engine needs to mine one spot.
+
+    Regions are (x, y, w, h) and points (x, y) in screen coordinates.
+    """
+    detection_region_1: Optional[Region] = None
+    detection_region_2: Optional[Region] = None
+    click_point_1: Optional[Point] = None
+    click_point_2: Optional[Point] = None
+    spider_detection_region: Optional[Region] = None
+    spider_attack_point_1: Optional[Point] = None
+    spider_attack_point_2: Optional[Point] = None
+    character_point: Optional[Point] = None
+    fire_detection_region: Optional[Region] = None
+
+    detection_confidence: float = 0.5
+    depleted_confidence: Optional[float] = None  # Falls back to detection_confidence
+    spider_confidence: float = 0.7
+    fire_confidence: float = 0.8
+
+    area_switch_timeout: float = 5.0
+    mining_retry_timeout: float = 2.0
+
+    rock_templates: List[str] = field(default_factory=lambda: list(ROCK_TEMPLATES))
+    mined_rock_templates: List[str] = field(default_factory=lambda: ['rock_phase_4.png'])
+    spider_templates: List[str] = field(default_factory=lambda: list(SPIDER_TEMPLATES))
+    fire_templates: List[str] = field(default_factory=lambda: list(FIRE_TEMPLATES))
+
+    # Screenshots per rock / depletion check; more than one makes the checks
+    # conservative (minimum for rocks, average for depletion)
+    sample_count: int = 1
+    spider_detection_enabled: bool = False
+
+    @property
+    def effective_depleted_confidence(self) -> float:
+        if self.depleted_confidence is None:
+            return self.detection_confidence
+        return self.depleted_confidence
+
+    def missing_fields(self) -> List[str]:
+        """Return the names of the regions/points the mining loop cannot run without."""
+        required = ['detection_region_1', 'detection_region_2', 'click_point_1', 'click_point_2', 'character_point']
+        return [name for name in required if not getattr(self, name)]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MacroConfig":
+        """Build a config from a dict, ignoring unknown keys and restoring tuples."""
+        known = {f.name for f in fields(cls)}
+        values = {}
+        for key, value in data.items():
+            if key not in known:
+                continue
+            if key.endswith(('_region', '_region_1', '_region_2', '_point', '_point_1', '_point_2')) and value is not None:
+                value = tuple(int(v) for v in value)
+            values[key] = value
+        return cls(**values)
+
+    @classmethod
+    def load(cls, path: str) -> "MacroConfig":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
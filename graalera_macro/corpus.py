@@ -0,0 +1,382 @@
+"""Labelled frame corpus and the detection regression harness.
+
+A corpus is a directory with a ``corpus.json`` manifest and the frames it
+lists::
+
+    corpus/
+        corpus.json
+        frames/000001.png
+        ...
+
+Each manifest entry names a frame, the kind of region it was captured from
+('detection', 'spider' or 'fire') and its ground-truth labels::
+
+    {"file": "frames/000001.png", "kind": "detection",
+     "labels": {"rock_phase": 3, "depleted": false}}
+    {"file": "frames/000002.png", "kind": "spider", "labels": {"spider": [212, 140]}}
+    {"file": "frames/000003.png", "kind": "fire", "labels": {"fire": true}}
+
+``rock_phase`` is 1-3 for a minable rock and 0 for none, ``depleted`` marks
+the mined rock sprite, ``spider`` is the spider centre in frame pixels (or
+null when there is none) and ``fire`` whether fire is visible. A detector is
+only scored on frames that carry its label, so imported frames stay out of
+the results until someone has labelled them.
+
+``evaluate`` runs every detector over the corpus, sweeps the confidence
+threshold and times every call; ``check_budgets`` compares the result with
+the accuracy and latency budgets stored in the manifest.
+"""
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from graalera_macro.config import MacroConfig
+
+CORPUS_VERSION = 1
+MANIFEST_NAME = "corpus.json"
+DEFAULT_THRESHOLDS = [round(0.30 + 0.05 * i, 2) for i in range(14)]  # 0.30 .. 0.95
+SPIDER_TOLERANCE = 20
+
+# Detector -> (frame kind, label, config template list, config confidence attribute)
+DETECTORS = {
+    'rock': ('detection', 'rock_phase', 'rock_templates', 'detection_confidence'),
+    'depleted': ('detection', 'depleted', 'mined_rock_templates', 'effective_depleted_confidence'),
+    'spider': ('spider', 'spider', 'spider_templates', 'spider_confidence'),
+    'fire': ('fire', 'fire', 'fire_templates', 'fire_confidence'),
+}
+
+DEFAULT_BUDGETS = {
+    'rock': {'min_precision': 0.95, 'min_recall': 0.90, 'max_p95_ms': 15.0},
+    'depleted': {'min_precision': 0.95, 'min_recall': 0.90, 'max_p95_ms': 10.0},
+    'spider': {'min_precision': 0.90, 'min_recall': 0.85, 'max_p95_ms': 500.0},
+    'fire': {'min_precision': 0.95, 'min_recall': 0.90, 'max_p95_ms': 10.0},
+}
+
+# Debug screenshot names, e.g. template_rock_phase_3_20251112_113255_674115_conf_0.63.png
+_DEBUG_NAME = re.compile(r'^(?P<prefix>.+?)_\d{8}_\d{6}_\d{6}_conf_(?P<confidence>[\d.]+)\.png$')
+
+
+class CorpusError(Exception):
+    """Raised for a missing or malformed corpus."""
+
+
+def is_positive(detector: str, label) -> bool:
+    """Return whether ``label`` means the detector's target is in the frame."""
+    if detector == 'rock':
+        return label in (1, 2, 3)
+    if detector == 'spider':
+        return label is not None
+    return bool(label)
+
+
+class Corpus:
+    """A labelled frame corpus on disk.
+
+    Args:
+        directory: Corpus directory holding ``corpus.json``
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.frames: List[dict] = []
+        self.budgets: Dict[str, dict] = {name: dict(values) for name, values in DEFAULT_BUDGETS.items()}
+        self.description = ""
+        if os.path.exists(self.manifest_path):
+            self._load()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CorpusError(f"Could not read {self.manifest_path}: {e}")
+        if data.get('version', 0) > CORPUS_VERSION:
+            raise CorpusError(f"{self.manifest_path} was written by a newer version")
+        self.description = data.get('description', "")
+        self.frames = data.get('frames', [])
+        for name, values in data.get('budgets', {}).items():
+            self.budgets.setdefault(name, {}).update(values)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        data = {
+            'version': CORPUS_VERSION,
+            'description': self.description,
+            'budgets': self.budgets,
+            'frames': self.frames,
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def add(self, image: np.ndarray, kind: str, labels: Optional[dict] = None, **info) -> dict:
+        """Write ``image`` into the corpus and append its entry (call ``save`` afterwards)."""
+        frames_dir = os.path.join(self.directory, "frames")
+        os.makedirs(frames_dir, exist_ok=True)
+        number = len(self.frames) + 1
+        while os.path.exists(os.path.join(frames_dir, f"{number:06d}.png")):
+            number += 1
+        name = f"frames/{number:06d}.png"
+        cv2.imwrite(os.path.join(self.directory, name), image)
+        entry = {'file': name, 'kind': kind, 'labels': dict(labels or {})}
+        entry.update(info)
+        self.frames.append(entry)
+        return entry
+
+    def image(self, entry: dict) -> np.ndarray:
+        image = cv2.imread(os.path.join(self.directory, entry['file']))
+        if image is None:
+            raise CorpusError(f"Could not read {entry['file']}")
+        return image
+
+    def labelled(self, detector: str) -> List[dict]:
+        """Return the entries the detector is scored on."""
+        kind, label, _, _ = DETECTORS[detector]
+        return [entry for entry in self.frames if entry['kind'] == kind and label in entry.get('labels', {})]
+
+    def counts(self) -> Dict[str, int]:
+        result = {name: len(self.labelled(name)) for name in DETECTORS}
+        result['unlabelled'] = sum(1 for entry in self.frames if not entry.get('labels'))
+        return result
+
+
+def import_images(corpus: Corpus, directory: str, kind: str = 'detection') -> int:
+    """Add every image in ``directory`` unlabelled, keeping what its name tells as a hint.
+
+    Debug screenshots are named after the template that was tried and its
+    score, which is not the ground truth (a ``rock_phase_3`` screenshot may
+    show any phase), so it is stored under ``hint`` for the labeller.
+
+    Returns:
+        int: Number of images added
+    """
+    added = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
+            continue
+        image = cv2.imread(os.path.join(directory, name))
+        if image is None:
+            continue
+        hint = {'source': name}
+        match = _DEBUG_NAME.match(name)
+        if match:
+            hint['template'] = match.group('prefix').replace('template_', '', 1)
+            hint['confidence'] = float(match.group('confidence'))
+        corpus.add(image, kind, hint=hint)
+        added += 1
+    return added
+
+
+def synthesize(corpus: Corpus, count: int = 200, noise: float = 6.0, seed: int = 0) -> int:
+    """Add ``count`` frames of each kind rendered by the game simulator, labelled from its ground truth.
+
+    Rocks are drawn with a small random offset and Gaussian noise of
+    standard deviation ``noise`` is added, so scores are not all 1.0.
+    Labels come from what the simulator actually drew in each frame; raises
+    ``CorpusError`` when it cannot load its sprites (e.g. run outside the repository).
+    """
+    from graalera_macro.clock import VirtualClock
+    from graalera_macro.simulator import SPIDER_SPRITES, GameSimulator, SimSpider
+
+    config = GameSimulator.default_config()
+    simulator = GameSimulator(config, seed=seed, clock=VirtualClock())
+    sprites = [f'rock_phase_{phase}.png' for phase in range(1, 5)] + SPIDER_SPRITES + ['fire.png']
+    missing = simulator.sprites.missing_templates(sprites)
+    if missing:
+        raise CorpusError(f"The simulator cannot load {', '.join(missing)}; run from the directory holding assets/")
+    simulator.update()
+    rng = np.random.default_rng(seed)
+    rock = simulator.rocks[0]
+    home = rock.center
+
+    def noisy(image):
+        if noise <= 0:
+            return image
+        return np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+
+    x, y, w, h = config.spider_detection_region
+    spider_region = (x - 20, y - 20, w + 40, h + 40)
+    for _ in range(count):
+        phase = int(rng.integers(0, 5))
+        rock.phase = phase
+        rock.center = (home[0] + int(rng.integers(-10, 11)), home[1] + int(rng.integers(-10, 11)))
+        image = simulator.grab(config.detection_region_1, 'detection')
+        truth = simulator.truth_for_frame(simulator.frame_count) or set()
+        labels = {'rock_phase': phase if 'rock' in truth else 0, 'depleted': 'mined' in truth}
+        corpus.add(noisy(image), 'detection', labels, source='simulator')
+
+        simulator.spider = None
+        if rng.random() < 0.5:
+            position = (x + float(rng.uniform(0, w)), y + float(rng.uniform(0, h)))
+            sprite = SPIDER_SPRITES[int(rng.integers(0, len(SPIDER_SPRITES)))]
+            simulator.spider = SimSpider(position, (0.0, 0.0), 1, sprite)
+        image = simulator.grab(spider_region, 'spider')
+        spider = None
+        if simulator.spider is not None and 'spider' in simulator.truth_for_frame(simulator.frame_count):
+            spider = [int(simulator.spider.position[0]) - spider_region[0],
+                      int(simulator.spider.position[1]) - spider_region[1]]
+        elif simulator.spider is not None:
+            # Partly outside the region: neither a clear positive nor a negative
+            simulator.spider = None
+            image = simulator.grab(spider_region, 'spider')
+        corpus.add(noisy(image), 'spider', {'spider': spider}, source='simulator')
+
+        simulator.fire = bool(rng.random() < 0.5)
+        image = simulator.grab(config.fire_detection_region, 'fire')
+        truth = simulator.truth_for_frame(simulator.frame_count) or set()
+        corpus.add(noisy(image), 'fire', {'fire': 'fire' in truth}, source='simulator')
+    rock.center = home
+    return count * 3
+
+
+def _score_detector(corpus: Corpus, matcher, detector: str, templates: List[str]) -> List[dict]:
+    """Run one detector over its labelled frames and return one record per frame."""
+    records = []
+    matcher.preload(templates)
+    for entry in corpus.labelled(detector):
+        image = corpus.image(entry)
+        start = time.perf_counter()
+        score, location, size = matcher.detect_any_template(image, templates, confidence=0.0)
+        latency = time.perf_counter() - start
+        center = None
+        if location is not None:
+            center = (location[0] + size[0] / 2, location[1] + size[1] / 2)
+        records.append({
+            'file': entry['file'],
+            'label': entry['labels'][DETECTORS[detector][1]],
+            'score': score,
+            'center': center,
+            'latency': latency,
+        })
+    return records
+
+
+def confusion(detector: str, records: List[dict], threshold: float, tolerance: float) -> Dict[str, int]:
+    """Count true/false positives and negatives of scored ``records`` at ``threshold``."""
+    counts = {'tp': 0, 'fp': 0, 'tn': 0, 'fn': 0}
+    for record in records:
+        positive = is_positive(detector, record['label'])
+        # Same comparison as detect_any_template
+        detected = record['score'] > threshold
+        if detected and positive and detector == 'spider':
+            # A spider found in the wrong place would make the macro attack nothing
+            lx, ly = record['label']
+            cx, cy = record['center']
+            if abs(cx - lx) > tolerance or abs(cy - ly) > tolerance:
+                counts['fp'] += 1
+                counts['fn'] += 1
+                continue
+        if detected:
+            counts['tp' if positive else 'fp'] += 1
+        else:
+            counts['fn' if positive else 'tn'] += 1
+    return counts
+
+
+def rates(counts: Dict[str, int]) -> Dict[str, Optional[float]]:
+    """Return precision and recall of a confusion count (None when undefined)."""
+    detected = counts['tp'] + counts['fp']
+    present = counts['tp'] + counts['fn']
+    return {
+        'precision': counts['tp'] / detected if detected else None,
+        'recall': counts['tp'] / present if present else None,
+    }
+
+
+def evaluate(corpus: Corpus, config: Optional[MacroConfig] = None, thresholds: Optional[List[float]] = None,
+             matcher=None, tolerance: float = SPIDER_TOLERANCE) -> Dict[str, dict]:
+    """Score every detector on the corpus.
+
+    Args:
+        corpus: Labelled corpus
+        config: Templates and operating thresholds to evaluate (default: ``MacroConfig()``)
+        thresholds: Confidence thresholds to sweep
+        matcher: ``TemplateMatcher`` to use (default: a new one)
+        tolerance: Pixels a spider detection may be away from the labelled centre
+
+    Returns:
+        dict: Per detector the frame count, latency percentiles, the
+            precision/recall sweep and the result at the config's threshold
+    """
+    from graalera_macro.detection import TemplateMatcher
+
+    config = config or MacroConfig()
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    matcher = matcher or TemplateMatcher()
+    results = {}
+    for detector, (_, _, templates_attr, confidence_attr) in DETECTORS.items():
+        records = _score_detector(corpus, matcher, detector, getattr(config, templates_attr))
+        if not records:
+            continue
+        operating = getattr(config, confidence_attr)
+        latencies = sorted(r['latency'] * 1000 for r in records)
+
+        def at(threshold):
+            counts = confusion(detector, records, threshold, tolerance)
+            row = {'threshold': threshold}
+            row.update(counts)
+            row.update(rates(counts))
+            return row
+
+        results[detector] = {
+            'frames': len(records),
+            'positives': sum(1 for r in records if is_positive(detector, r['label'])),
+            'latency_ms': {
+                'p50': latencies[len(latencies) // 2],
+                'p95': latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))],
+                'max': latencies[-1],
+            },
+            'operating': at(operating),
+            'sweep': [at(t) for t in thresholds],
+        }
+    return results
+
+
+def check_budgets(results: Dict[str, dict], budgets: Dict[str, dict]) -> List[str]:
+    """Return a message for every budget the results miss (empty when all pass)."""
+    failures = []
+    for detector, budget in budgets.items():
+        result = results.get(detector)
+        if result is None:
+            continue
+        operating = result['operating']
+        for metric in ('precision', 'recall'):
+            minimum = budget.get(f'min_{metric}')
+            value = operating[metric]
+            if minimum is not None and value is not None and value < minimum:
+                failures.append(f"{detector}: {metric} {value:.3f} < {minimum:.3f} at threshold "
+                                f"{operating['threshold']:.2f}")
+        max_p95 = budget.get('max_p95_ms')
+        if max_p95 is not None and result['latency_ms']['p95'] > max_p95:
+            failures.append(f"{detector}: p95 latency {result['latency_ms']['p95']:.2f} ms > {max_p95:.2f} ms")
+    return failures
+
+
+def format_results(results: Dict[str, dict]) -> str:
+    """Return the operating point, latency and threshold sweep of every detector as text."""
+    lines = []
+    for detector, result in results.items():
+        operating, latency = result['operating'], result['latency_ms']
+        lines.append(f"{detector}: {result['frames']} frames ({result['positives']} positive), "
+                     f"p50 {latency['p50']:.2f} ms, p95 {latency['p95']:.2f} ms, "
+                     f"precision {_fmt(operating['precision'])} recall {_fmt(operating['recall'])} "
+                     f"at {operating['threshold']:.2f}")
+        lines.append(f"  {'threshold':>9} {'precision':>9} {'recall':>7} {'tp':>5} {'fp':>5} {'fn':>5}")
+        for row in result['sweep']:
+            lines.append(f"  {row['threshold']:9.2f} {_fmt(row['precision']):>9} {_fmt(row['recall']):>7} "
+                         f"{row['tp']:5d} {row['fp']:5d} {row['fn']:5d}")
+    return "\n".join(lines)
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.3f}"
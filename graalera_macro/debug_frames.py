@@ -0,0 +1,240 @@
+"""Recent frames per detector, written to disk when something goes wrong.
+
+``DebugFrameRing`` keeps references to the last few frames every detector
+matched (no copies, the engine never modifies a captured frame) together
+with the best match found in them. When the engine runs into an anomaly
+(fire stop, repeated failed searches, an exception, a spider attack
+timeout) it calls ``dump`` and the frames are annotated with their match
+and written by ``DebugFrameWriter`` on a background thread::
+
+    debug_screenshots/<reason>_<time>/<detector>/template_<name>_<time>_conf_<c>.png
+    debug_screenshots/<reason>_<time>/dump.json
+
+The file names follow the old debug screenshots, so a dump directory can be
+replayed or imported into a corpus. The writer queue is bounded; when it is
+full, frames are dropped and counted instead of blocking the engine.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+DEFAULT_DEBUG_DIR = "debug_screenshots"
+DEFAULT_CAPACITY = 10
+# Minimum seconds between two dumps for the same reason
+DEFAULT_MIN_INTERVAL = 30.0
+# Consecutive searches without a rock (three rounds through both areas) before a dump
+DEFAULT_FAILED_SEARCH_LIMIT = 6
+
+MATCH_COLOR = (0, 255, 0)
+MISS_COLOR = (0, 0, 255)
+
+
+class DebugFrameWriter:
+    """Write images and JSON files on a background thread.
+
+    Args:
+        queue_size: Maximum number of files waiting to be written
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name="DebugFrameWriter", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Write everything still queued."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("[ERROR] Debug frame queue stuck, stopping without flushing")
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, path: str, image: np.ndarray, rect: Optional[Tuple[tuple, tuple]] = None,
+               color: Tuple[int, int, int] = MISS_COLOR) -> bool:
+        """Queue ``image`` to be written to ``path``, with ``rect`` ((x, y), (w, h)) drawn on a copy.
+
+        Returns:
+            bool: False if the queue was full and the image was dropped
+        """
+        return self._put(('image', path, image, rect, color))
+
+    def submit_json(self, path: str, data: dict) -> bool:
+        return self._put(('json', path, data, None, None))
+
+    def _put(self, job: tuple) -> bool:
+        self.start()
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            kind, path, payload, rect, color = job
+            try:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if kind == 'json':
+                    with open(path, 'w', encoding='utf-8') as f:
+                        json.dump(payload, f, indent=2, default=str)
+                else:
+                    if rect is not None:
+                        (x, y), (w, h) = rect
+                        payload = payload.copy()
+                        cv2.rectangle(payload, (x, y), (x + w, y + h), color, 2)
+                    if not cv2.imwrite(path, payload):
+                        raise OSError(f"cv2.imwrite could not write {path}")
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[ERROR] Failed to save debug frame: {e}")
+
+    def summary(self) -> str:
+        return f"{self.written} debug files written ({self.dropped} dropped, {self.failed} failed)"
+
+
+class _Entry(NamedTuple):
+    captured_at: datetime
+    image: np.ndarray
+    confidence: float
+    location: Optional[tuple]
+    size: Optional[tuple]
+    template: Optional[str]
+    threshold: float
+
+
+def debug_file_name(prefix: str, captured_at: datetime, confidence: float) -> str:
+    """Name a debug frame like the matcher always has: ``<prefix>_<time>_conf_<c>.png``."""
+    return f"{prefix}_{captured_at.strftime('%Y%m%d_%H%M%S_%f')}_conf_{confidence:.2f}.png"
+
+
+class DebugFrameRing:
+    """The last ``capacity`` matched frames of every detector.
+
+    Args:
+        capacity: Frames kept per detector
+        directory: Where dumps are written
+        min_interval: Minimum seconds between two dumps for the same reason
+        failed_search_limit: Consecutive failed searches after which the engine dumps
+        writer: Writer to use (a new one is created if omitted)
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, directory: str = DEFAULT_DEBUG_DIR,
+                 min_interval: float = DEFAULT_MIN_INTERVAL,
+                 failed_search_limit: int = DEFAULT_FAILED_SEARCH_LIMIT,
+                 writer: Optional[DebugFrameWriter] = None):
+        self.capacity = capacity
+        self.directory = directory
+        self.min_interval = min_interval
+        self.failed_search_limit = failed_search_limit
+        self.writer = writer or DebugFrameWriter()
+        self._rings: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._last_dump: Dict[str, float] = {}
+        self.dumps = 0
+        self.skipped = 0
+
+    def add(self, detector: str, image: np.ndarray, match: tuple, threshold: float):
+        """Remember a matched frame.
+
+        Args:
+            detector: 'rock', 'depleted', 'spider' or 'fire'
+            image: The frame (kept by reference)
+            match: ``TemplateMatcher.last_match``: (confidence, location, size, template)
+                of the best template, whether or not it passed the threshold
+            threshold: Confidence the detector needed
+        """
+        confidence, location, size, template = match
+        entry = _Entry(datetime.now(), image, confidence, location, size, template, threshold)
+        with self._lock:
+            ring = self._rings.get(detector)
+            if ring is None:
+                ring = self._rings[detector] = deque(maxlen=self.capacity)
+            ring.append(entry)
+
+    def clear(self):
+        with self._lock:
+            self._rings.clear()
+
+    def dump(self, reason: str, **info) -> Optional[str]:
+        """Queue every remembered frame for writing and return the dump directory.
+
+        Returns None without writing anything when there are no frames or
+        the same reason was dumped less than ``min_interval`` seconds ago.
+        """
+        now = time.monotonic()
+        last = self._last_dump.get(reason)
+        if last is not None and now - last < self.min_interval:
+            self.skipped += 1
+            return None
+        with self._lock:
+            rings = {detector: list(ring) for detector, ring in self._rings.items() if ring}
+        if not rings:
+            return None
+        self._last_dump[reason] = now
+
+        directory = os.path.join(self.directory, f"{reason}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}")
+        frames = []
+        for detector, entries in rings.items():
+            for entry in entries:
+                prefix = f"template_{entry.template.replace('.png', '')}" if entry.template else "no_match"
+                path = os.path.join(directory, detector, debug_file_name(prefix, entry.captured_at, entry.confidence))
+                matched = entry.confidence > entry.threshold
+                rect = (entry.location, entry.size) if entry.location is not None and entry.size else None
+                self.writer.submit(path, entry.image, rect, MATCH_COLOR if matched else MISS_COLOR)
+                frames.append({
+                    'detector': detector,
+                    'file': os.path.relpath(path, directory),
+                    'captured_at': entry.captured_at.isoformat(),
+                    'template': entry.template,
+                    'confidence': entry.confidence,
+                    'threshold': entry.threshold,
+                    'matched': matched,
+                    'location': entry.location,
+                })
+        self.writer.submit_json(os.path.join(directory, "dump.json"), {
+            'reason': reason,
+            'dumped_at': datetime.now().isoformat(timespec='seconds'),
+            'info': info,
+            'frames': frames,
+        })
+        self.dumps += 1
+        return directory
+
+    def stop(self, timeout: float = 10.0):
+        """Finish writing queued dumps."""
+        self.writer.stop(timeout)
+
+    def summary(self) -> str:
+        return f"{self.dumps} debug frame dumps ({self.skipped} rate-limited), {self.writer.summary()}"
@@ -0,0 +1,147 @@
+"""Template matching against the sprites in ``assets/``."""
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import cv2
+import numpy as np
+
+from graalera_macro.asset_pack import DEFAULT_PACK_NAME, open_pack
+from graalera_macro.debug_frames import DebugFrameWriter, debug_file_name
+from graalera_macro.resources import is_frozen, resource_path
+
+
+class TemplateMatcher:
+    """Load asset templates once and match them against captured frames.
+
+    Args:
+        asset_dir: Directory holding the template PNGs (relative to the resource root)
+        debug: Save annotated frames of failed matches to ``debug_screenshot_dir``
+            (written by a background ``DebugFrameWriter``, at most ``max_debug_screenshots``)
+        use_pack: Read templates from the precompiled pack in ``asset_dir`` when
+            there is one, decoding PNGs for templates it does not contain and for
+            those whose PNG changed since the pack was built
+    """
+
+    def __init__(self, asset_dir: str = 'assets', debug: bool = False,
+                 debug_screenshot_dir: str = "debug_screenshots", max_debug_screenshots: int = 100,
+                 use_pack: bool = True):
+        self.asset_dir = asset_dir
+        self._templates: Dict[str, Optional[np.ndarray]] = {}
+        self.pack = open_pack(resource_path(f'{asset_dir}/{DEFAULT_PACK_NAME}')) if use_pack else None
+        # A frozen build ships the PNGs next to the pack they were built into, so only check from source
+        self.stale_templates = set()
+        if self.pack is not None and not is_frozen():
+            self.stale_templates = set(self.pack.stale_templates(resource_path(asset_dir)))
+        if self.stale_templates:
+            print(f"[WARN] Asset pack is out of date for {', '.join(sorted(self.stale_templates))}; "
+                  f"decoding those PNGs instead (rebuild it with build-pack)")
+        self.ENABLE_DEBUG = debug
+        self.debug_screenshot_count = 0
+        self.max_debug_screenshots = max_debug_screenshots
+        self.debug_screenshot_dir = debug_screenshot_dir
+        self.debug_writer: Optional[DebugFrameWriter] = None
+        # (confidence, location, size, template) of the best template in the last
+        # detect_any_template call, whether or not it passed the threshold
+        self.last_match = (0.0, None, None, None)
+        if self.ENABLE_DEBUG:
+            self.setup_debug_dir()
+
+    def setup_debug_dir(self):
+        """Create debug directory if it doesn't exist."""
+        os.makedirs(self.debug_screenshot_dir, exist_ok=True)
+
+    def save_debug_screenshot(self, screenshot, prefix="debug", confidence=0.0, rect=None):
+        """Queue a screenshot with debug information for the background writer.
+
+        Args:
+            rect: ((x, y), (w, h)) of a match to outline on the saved copy
+        """
+        if not self.ENABLE_DEBUG or self.debug_screenshot_count >= self.max_debug_screenshots:
+            return
+
+        if self.debug_writer is None:
+            self.debug_writer = DebugFrameWriter()
+        filename = os.path.join(self.debug_screenshot_dir, debug_file_name(prefix, datetime.now(), confidence))
+        if self.debug_writer.submit(filename, screenshot, rect):
+            self.debug_screenshot_count += 1
+            print(f"[DEBUG] Saving debug screenshot: {filename}")
+
+    def close(self):
+        """Finish writing queued debug screenshots."""
+        if self.debug_writer is not None:
+            self.debug_writer.stop()
+
+    def template(self, template_file: str) -> Optional[np.ndarray]:
+        """Return the decoded BGR template, loading it on first use (None if unreadable)."""
+        if template_file not in self._templates:
+            template = None
+            if self.pack is not None and template_file not in self.stale_templates:
+                template = self.pack.get(template_file)
+            if template is None:
+                template = cv2.imread(resource_path(f'{self.asset_dir}/{template_file}'))
+            self._templates[template_file] = template
+        return self._templates[template_file]
+
+    def preload(self, templates: Iterable[str]):
+        """Decode ``templates`` now so the first detection does not pay for it."""
+        for template_file in templates:
+            self.template(template_file)
+
+    def missing_templates(self, templates: Iterable[str]) -> List[str]:
+        """Return the templates that cannot be loaded."""
+        missing = []
+        for template_file in templates:
+            try:
+                if self.template(template_file) is None:
+                    missing.append(template_file)
+                    print(f"ERROR: Could not load asset: {resource_path(f'{self.asset_dir}/{template_file}')}")
+            except Exception as e:
+                missing.append(template_file)
+                print(f"ERROR: Exception loading asset {template_file}: {e}")
+        return missing
+
+    def detect_any_template(self, screenshot, templates, confidence=0.7):
+        """Detect if any template matches in the screenshot.
+
+        Returns:
+            tuple: (confidence, (x, y) of the match, (w, h) of the template), or
+                (0.0, None, None) if no template matched above ``confidence``
+        """
+        best_match_val = 0.0
+        best_match_loc = None
+        best_match_template_size = None
+        best_template_name = None
+
+        for template_file in templates:
+            try:
+                template = self.template(template_file)
+                if template is None: continue
+                if template.shape[0] > screenshot.shape[0] or template.shape[1] > screenshot.shape[1]: continue
+
+                result = cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
+                _, max_val, _, max_loc = cv2.minMaxLoc(result)
+
+                if self.ENABLE_DEBUG and max_val < confidence and self.debug_screenshot_count < self.max_debug_screenshots:
+                    # The writer thread draws the outline on its own copy
+                    h, w = template.shape[:2]
+                    self.save_debug_screenshot(screenshot, f"template_{template_file.replace('.png', '')}", max_val,
+                                               rect=(max_loc, (w, h)))
+
+                if max_val > best_match_val:
+                    best_match_val = max_val
+                    best_match_loc = max_loc
+                    best_match_template_size = (template.shape[1], template.shape[0])
+                    best_template_name = template_file
+
+            except Exception as e:
+                print(f"[ERROR] Error processing template {template_file}: {e}")
+
+        self.last_match = (best_match_val, best_match_loc, best_match_template_size, best_template_name)
+        if self.ENABLE_DEBUG:
+            if best_match_val > 0: print(f"[DEBUG] Best match: {best_template_name} with confidence: {best_match_val:.2f}")
+            else:
+                print("[DEBUG] No template matched.")
+                if self.debug_screenshot_count < self.max_debug_screenshots: self.save_debug_screenshot(screenshot, "no_match", 0.0)
+
+        return (best_match_val, best_match_loc, best_match_template_size) if best_match_val > confidence else (0.0, None, None)
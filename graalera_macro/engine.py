@@ -0,0 +1,851 @@
+"""GUI-free mining engine.
+
+``MacroEngine`` owns the capture, detection, state machine and input logic
+described in flow.md. Front-ends (the Tk apps or the command line) build a
+``MacroConfig``, hand the engine a screen source and an input dispatcher,
+and optionally a publisher for UI state.
+
+Observers (metrics, event logs) register with ``add_listener`` and receive
+every engine event as a dict with ``kind`` and ``t`` (engine clock time):
+``state`` (phase or area changes), ``detection``, ``rock_mined``,
+``spider_detected``, ``spider_attack``, ``fire_detected``, ``error``
+(with its error class and the traceback), ``debug_frames`` (recent frames dumped after an
+anomaly), ``watchdog`` (a stall recovery action) and ``time_breakdown``
+(where the session's time went, sent when the loop ends). Listeners run on the engine thread and must return quickly.
+
+Errors are classified by ``errors.ErrorHandler``: each scope (the main
+loop, spider detection, fire detection) backs off per error class and
+stops retrying once the class's circuit breaker opens.
+"""
+import threading
+import traceback
+from typing import Callable, List, Optional
+
+from graalera_macro.capture import ScreenSource
+from graalera_macro.config import MacroConfig
+from graalera_macro.detection import TemplateMatcher
+from graalera_macro.errors import AssetError, CaptureError, ErrorHandler, InputBackendError, MacroError, RegionError
+from graalera_macro.input import COMMAND_TIMEOUT, InputDispatcher
+from graalera_macro.instrumentation import StageTimer, TimeBreakdown
+from graalera_macro.latency import LatencyCalibrator
+from graalera_macro.timing import Pacer
+
+# Returned by check_for_spiders when no check ran (detection off, backing off
+# after an error, or the check itself failed): unlike None it says nothing
+# about whether a spider is there
+SPIDER_CHECK_SKIPPED = object()
+
+
+class MacroEngine:
+    """Run the search/mining state machine against a screen source.
+
+    Args:
+        config: Regions, points, confidences and timeouts of the spot
+        screen_source: Where frames come from
+        input_dispatcher: Where clicks go
+        matcher: Template matcher (a new one is created if omitted)
+        pacer: Pacer for all waits (a new one is created if omitted)
+        latency_calibrator: Post-click wait calibration (a new one is created if omitted)
+        ui: Object with a ``publish(**fields)`` method receiving display state, or None
+        on_stop: Called with a status message when the engine stops by itself
+        recorder: SessionRecorder receiving the detection results, or None
+        clock: Time source for the default pacer and latency calibrator
+            (e.g. a ``VirtualClock`` for simulations; default: real time)
+        stage_timer: Per-stage timing histograms (a new, disabled one is created if omitted)
+        debug_frames: DebugFrameRing keeping recent frames to dump on anomalies, or None
+        watchdog: StallWatchdog checked once per loop iteration, or None
+        error_handler: Retry policies and circuit breakers per error class (a new one is created if omitted)
+    """
+
+    def __init__(self, config: MacroConfig, screen_source: ScreenSource, input_dispatcher: InputDispatcher,
+                 matcher: Optional[TemplateMatcher] = None, pacer: Optional[Pacer] = None,
+                 latency_calibrator: Optional[LatencyCalibrator] = None, ui=None,
+                 on_stop: Optional[Callable[[str], None]] = None, recorder=None, clock=None,
+                 stage_timer: Optional[StageTimer] = None, debug_frames=None, watchdog=None,
+                 error_handler: Optional[ErrorHandler] = None):
+        self.config = config
+        self.screen_source = screen_source
+        self.input_dispatcher = input_dispatcher
+        self.matcher = matcher or TemplateMatcher()
+        self.pacer = pacer or Pacer(clock=clock)
+        self.latency_calibrator = latency_calibrator or LatencyCalibrator(clock=clock)
+        self.clock = self.pacer.clock
+        self.stage_timer = stage_timer or StageTimer(clock=self.clock)
+        # Every second of the loop thread, charged to capture, match, input, waits, combat or errors
+        self.time_breakdown = TimeBreakdown(clock=self.clock)
+        self._stage_timing_published_at: Optional[float] = None
+        self._listeners: List[Callable[[dict], None]] = []
+        self.ui = ui
+        self.on_stop = on_stop
+        self.recorder = recorder
+        self.debug_frames = debug_frames
+        self.watchdog = watchdog
+        self.errors = error_handler or ErrorHandler(clock=self.clock)
+        # Set when a fault that makes mining unsafe stops the loop at its next iteration
+        self._fatal_status: Optional[str] = None
+
+        self.running: bool = False
+        self._stop_requested = False  # stop() was called; on_stop is only for stops the engine decides
+        self.stop_at: Optional[float] = None
+        self.thread: Optional[threading.Thread] = None
+        self.phase = 'search'  # Can be 'search' or 'mining'
+        self.current_strategy: int = 1
+        self.last_direction = None
+        self.direction_switches = 0
+        self.failed_searches = 0  # Consecutive searches that ended without a rock
+        self.rock_counter: int = 0
+        self.spider_detection_enabled = config.spider_detection_enabled
+        self.spider_attack_in_progress = False
+        self.last_spider_confidence = 0.0
+        self.last_fire_confidence = 0.0
+
+    @property
+    def phase(self) -> str:
+        """'search' or 'mining'."""
+        return self._phase
+
+    @phase.setter
+    def phase(self, value: str):
+        previous = getattr(self, '_phase', None)
+        self._phase = value
+        if value != previous:
+            self.emit('state', phase=value, previous_phase=previous, area=getattr(self, '_current_strategy', None))
+
+    @property
+    def current_strategy(self) -> int:
+        """Detection area being worked: 1 or 2."""
+        return self._current_strategy
+
+    @current_strategy.setter
+    def current_strategy(self, value: int):
+        previous = getattr(self, '_current_strategy', None)
+        self._current_strategy = value
+        if value != previous:
+            self.emit('state', area=value, previous_area=previous, phase=getattr(self, '_phase', None))
+
+    def _emit_error(self, stage: str, error: BaseException, error_class: str = 'unknown'):
+        """Send an ``error`` event with the traceback of the exception being handled."""
+        if self._listeners:
+            self.emit('error', stage=stage, error=str(error), error_type=type(error).__name__,
+                      error_class=error_class, traceback=traceback.format_exc())
+        self._dump_debug_frames('exception', stage=stage, error=str(error))
+
+    def _dump_debug_frames(self, reason: str, **info):
+        """Have the debug frame ring write its recent frames, if there is one."""
+        if self.debug_frames is None:
+            return
+        directory = self.debug_frames.dump(reason, **info)
+        if directory is not None:
+            print(f"[DEBUG] Saving recent frames to {directory} ({reason})")
+            self.emit('debug_frames', reason=reason, directory=directory)
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """Call ``listener(event)`` for every engine event."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[dict], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def emit(self, kind: str, **fields):
+        """Send an event to the listeners."""
+        if not self._listeners:
+            return
+        event = {'kind': kind, 't': self.pacer.now()}
+        event.update(fields)
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"[ERROR] Engine listener failed: {e}")
+
+    def detector_name(self, tag, templates) -> str:
+        """Name the detector a match belongs to: 'rock', 'depleted', 'spider' or 'fire'."""
+        if templates is self.config.mined_rock_templates:
+            return 'depleted'
+        return 'rock' if tag == 'detection' else tag
+
+    def publish(self, **fields):
+        """Forward display state to the front-end, if there is one."""
+        if self.ui is not None:
+            self.ui.publish(**fields)
+
+    def start(self, background: bool = True, duration: Optional[float] = None):
+        """Start the macro loop.
+
+        Args:
+            background: Run the loop on its own thread; otherwise block until it stops
+            duration: Stop after this many seconds of clock time
+        """
+        missing = self.config.missing_fields()
+        if missing:
+            raise ValueError(f"Macro config incomplete, missing: {', '.join(missing)}")
+        self.running = True
+        self._stop_requested = False
+        self.stop_at = self.pacer.deadline(duration) if duration is not None else None
+        # Initialize direction tracking
+        self.last_direction = self.current_strategy  # Set to current strategy at start
+        self.direction_switches = 0
+        self.input_dispatcher.start()
+        if not background:
+            self.run()
+            return
+        self.thread = threading.Thread(target=self.run, name="MacroEngine", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Ask the loop to stop and cancel queued input.
+
+        Args:
+            timeout: Wait this long for the loop thread to exit (None: don't wait)
+        """
+        self._stop_requested = True
+        self.running = False
+        self.input_dispatcher.stop()
+        if timeout is not None and self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        # Reset direction tracking when stopping
+        self.last_direction = None
+        self.direction_switches = 0
+
+    def _finish(self, status: str):
+        self.running = False
+        if self.watchdog is not None:
+            self.watchdog.detach(self)
+        self.time_breakdown.stop()
+        self.emit('time_breakdown', totals=self.time_breakdown.totals())
+        if self.on_stop is not None and not self._stop_requested:
+            self.on_stop(status)
+
+    def reset_state(self):
+        """Put the state machine back into search with clean counters and no pending input."""
+        self.input_dispatcher.cancel_pending()
+        self.phase = 'search'
+        self.last_direction = self.current_strategy
+        self.direction_switches = 0
+        self.failed_searches = 0
+        self.spider_attack_in_progress = False
+        self.spider_detection_enabled = self.config.spider_detection_enabled
+        self.errors.reset('spiders')
+        self.publish(status="State reset", direction_switches="Direction Switches: 0")
+
+    def pause(self, seconds: float, reason: str):
+        """Wait ``seconds`` in short steps, returning early when the engine is stopped."""
+        deadline = self.pacer.deadline(seconds)
+        while self.running and self.pacer.now() < deadline:
+            if self.watchdog is not None:
+                # A deliberate pause is not a hang
+                self.watchdog.beat()
+            self.pacer.sleep_until(min(deadline, self.pacer.deadline(1.0)), reason, precise=False)
+
+    def abort(self, status: str):
+        """Stop the engine from another thread (e.g. the watchdog's monitor) and report ``status``.
+
+        The loop thread may be stuck; it exits whenever it next checks ``running``.
+        """
+        self.stop()
+        if self.on_stop is not None:
+            self.on_stop(status)
+
+    def _publish_stage_timing(self):
+        """Publish the stage timing summary, at most once a second."""
+        if not self.stage_timer.enabled:
+            return
+        now = self.pacer.now()
+        if self._stage_timing_published_at is None or now - self._stage_timing_published_at >= 1.0:
+            self._stage_timing_published_at = now
+            self.publish(stage_timing=self.stage_timer.summary())
+
+    def _grab(self, region, tag):
+        """Capture ``region`` from the screen source.
+
+        Raises ``RegionError`` for a region without area and ``CaptureError``
+        when the screen source fails or returns an empty image.
+        """
+        if region is None or region[2] <= 0 or region[3] <= 0:
+            raise RegionError(f"Invalid {tag} region: {region}")
+        with self.stage_timer.span('capture'), self.time_breakdown.span('capture'):
+            try:
+                image = self.screen_source.grab(region, tag)
+            except MacroError:
+                raise
+            except Exception as e:
+                raise CaptureError(f"{tag} capture failed: {e}") from e
+        if image is None or image.size == 0:
+            raise CaptureError(f"{tag} capture of {region} returned an empty image")
+        return image
+
+    def _match(self, tag, image, templates, confidence):
+        """Run ``matcher.detect_any_template`` and hand the result to the recorder."""
+        with self.stage_timer.span('match'), self.time_breakdown.span('match'):
+            result = self.matcher.detect_any_template(image, templates, confidence=confidence)
+        if result[0] == 0 and all(self.matcher.template(name) is None for name in templates):
+            raise AssetError(f"No {tag} template could be loaded: {', '.join(templates)}")
+        if self.recorder is not None:
+            frame = self.screen_source.latest_frame(tag)
+            seq = frame.seq if frame is not None and frame.image is image else None
+            self.recorder.on_detection(seq, tag, templates, *result)
+        if self._listeners or self.debug_frames is not None:
+            detector = self.detector_name(tag, templates)
+            if self.debug_frames is not None:
+                self.debug_frames.add(detector, image, self.matcher.last_match, confidence)
+            self.emit('detection', detector=detector, confidence=result[0], threshold=confidence, location=result[1],
+                      size=result[2])
+        return result
+
+    def _wait_after_click(self, click_type, region, baseline, click_command):
+        """Wait for a click to take effect before checking the screen again.
+
+        In calibration mode the region is polled until it changes so the
+        click-to-effect latency can be recorded; otherwise the calibrated
+        (or default) post-click wait is slept.
+
+        Args:
+            click_type: 'mine' or 'speculative'
+            region: Detection region (x, y, w, h) that reacts to the click
+            baseline: BGR screenshot of the region taken before the click
+            click_command: InputCommand of the click, waits are measured from its completion
+        """
+        with self.time_breakdown.span('input'):
+            finished = click_command.wait(COMMAND_TIMEOUT)
+        if not finished:
+            click_command.cancel()
+            raise InputBackendError(f"{click_type} click did not finish within {COMMAND_TIMEOUT:.0f}s")
+        if click_command.error is not None:
+            raise InputBackendError(f"{click_type} click failed: {click_command.error}") from click_command.error
+        click_time = click_command.finished_at if click_command.finished_at is not None else self.pacer.now()
+        wait = self.latency_calibrator.post_click_wait(click_type)
+        if self.latency_calibrator.calibrating:
+            self.latency_calibrator.measure(click_type, lambda: self._grab(region, 'detection'),
+                                            baseline, click_time)
+            self.publish(click_latency=self.latency_calibrator.summary())
+
+        # Sleep whatever is left of the wait after the click (and any measuring)
+        self.pacer.sleep_until(click_time + wait, f"post_click_{click_type}")
+
+    def _sample_confidences(self, region, templates, confidence, first_frame=None, stop_on_miss=False):
+        """Match ``templates`` against ``config.sample_count`` captures of ``region``.
+
+        Args:
+            first_frame: Use this frame as the only sample when sample_count is 1
+            stop_on_miss: Stop sampling as soon as one sample does not match
+
+        Returns:
+            tuple: (list of confidences, last captured frame)
+        """
+        if self.config.sample_count <= 1:
+            frame = first_frame if first_frame is not None else self._grab(region, 'detection')
+            conf, _, _ = self._match('detection', frame, templates, confidence)
+            return [conf], frame
+
+        confidences = []
+        frame = first_frame
+        for _ in range(self.config.sample_count):
+            frame = self._grab(region, 'detection')
+            conf, _, _ = self._match('detection', frame, templates, confidence)
+            confidences.append(conf)
+            if stop_on_miss and conf == 0:  # If any check fails, immediately consider it gone
+                break
+            self.pacer.sleep(0.1, 'sample_gap')  # Small delay between samples
+        return confidences, frame
+
+    def detect_fire(self):
+        """Check the fire detection region for fire.png.
+
+        Returns:
+            tuple: (x, y) coordinates of the center of the detected fire, or None if not found
+        """
+        with self.stage_timer.span('detect_fire'):
+            if not self.config.fire_detection_region:
+                print("[WARNING] No fire detection region set")
+                return None
+
+            try:
+                # Take screenshot of the fire detection region
+                x, y, w, h = self.config.fire_detection_region
+                screenshot_cv = self._grab((x, y, w, h), 'fire')
+
+                fire_conf, fire_loc, fire_size = self._match(
+                    'fire',
+                    screenshot_cv,
+                    self.config.fire_templates,
+                    self.config.fire_confidence
+                )
+
+                # Update fire confidence display
+                self.last_fire_confidence = fire_conf
+                self.publish(fire_confidence=f"Confidence: {fire_conf:.2f}")
+
+                if fire_conf > 0:
+                    # Convert local coordinates to screen coordinates
+                    fire_x = x + fire_loc[0] + (fire_size[0] // 2) if fire_size else x + fire_loc[0]
+                    fire_y = y + fire_loc[1] + (fire_size[1] // 2) if fire_size else y + fire_loc[1]
+                    self.publish(fire_status="Fire: Detected!")
+                    self.emit('fire_detected', position=(fire_x, fire_y), confidence=fire_conf)
+                    return (fire_x, fire_y)
+
+                self.errors.success('fire')
+                self.publish(fire_status="Fire: Not Detected")
+                return None
+
+            except Exception as e:
+                decision = self.errors.handle(e, 'fire')
+                print(f"[ERROR] Error detecting fire ({decision.error_class}): {e}")
+                self._emit_error('detect_fire', e, decision.error_class)
+                if decision.action != 'retry':
+                    # Mining on without a working fire check is not safe
+                    self._fatal_status = f"Fire detection failed ({decision.error_class} error: {e}), stopping macro"
+                return None
+
+    def check_for_spiders(self):
+        """Check the spider detection region for spiders.
+
+        Returns:
+            tuple: (x, y) coordinates of the detected spider center, None if the check ran and
+            found no spider, or SPIDER_CHECK_SKIPPED if no check ran
+        """
+        if not self.spider_detection_enabled or not self.errors.allow('spiders'):
+            return SPIDER_CHECK_SKIPPED
+
+        if not self.config.spider_detection_region:
+            if self.matcher.ENABLE_DEBUG:
+                print("[DEBUG] No spider detection region set")
+            return SPIDER_CHECK_SKIPPED
+
+        with self.stage_timer.span('check_for_spiders'):
+            # Take a screenshot of the spider detection region
+            try:
+                # Add some padding to the region to avoid edge effects
+                padding = 20
+                x, y, w, h = self.config.spider_detection_region
+                x = max(0, x - padding)
+                y = max(0, y - padding)
+                screen_width, screen_height = self.screen_source.screen_size()
+                w = min(screen_width - x, w + 2 * padding)
+                h = min(screen_height - y, h + 2 * padding)
+
+                if w <= 0 or h <= 0:
+                    raise RegionError(f"Invalid spider detection region after padding: "
+                                      f"{self.config.spider_detection_region}")
+
+                screenshot_cv = self._grab((x, y, w, h), 'spider')
+
+                # Look for spiders in the detection region
+                spider_conf, spider_loc, spider_size = self._match(
+                    'spider',
+                    screenshot_cv,
+                    self.config.spider_templates,
+                    self.config.spider_confidence
+                )
+                self.errors.success('spiders')
+
+                if self.matcher.ENABLE_DEBUG:
+                    print(f"[DEBUG] Spider detection - Confidence: {spider_conf:.2f}, Location: {spider_loc}, Size: {spider_size}")
+
+                # Update confidence display whether spider is detected or not
+                self.last_spider_confidence = spider_conf
+                self.publish(spider_confidence=f"Confidence: {spider_conf:.2f}")
+
+                if spider_conf > 0 and spider_loc is not None and spider_size is not None:
+                    # Convert local coordinates to screen coordinates
+                    spider_x = x + spider_loc[0] + (spider_size[0] // 2)
+                    spider_y = y + spider_loc[1] + (spider_size[1] // 2)
+
+                    if self.matcher.ENABLE_DEBUG:
+                        print(f"[DEBUG] Spider detected at screen coordinates: ({spider_x}, {spider_y})")
+
+                    self.publish(spider_status=f"Spider Detected! (Confidence: {spider_conf:.2f})")
+                    self.emit('spider_detected', position=(spider_x, spider_y), confidence=spider_conf,
+                              during_attack=self.spider_attack_in_progress)
+                    return (spider_x, spider_y)
+                self.publish(spider_status="Spider: Not Detected")
+                return None
+
+            except Exception as e:
+                decision = self.errors.handle(e, 'spiders')
+                print(f"[ERROR] Error checking for spiders ({decision.error_class}): {e}")
+                self._emit_error('check_for_spiders', e, decision.error_class)
+                if decision.action == 'stop':
+                    # Retrying cannot fix a missing template or region: no spider checks this session
+                    self.spider_detection_enabled = False
+                    self.publish(status=f"Spider detection disabled ({decision.error_class} error)")
+                elif decision.action == 'cooldown':
+                    self.publish(status=f"Spider detection paused for {decision.delay:.0f}s after repeated errors")
+
+            return SPIDER_CHECK_SKIPPED
+
+    def _check_for_spiders_settled(self, max_wait: float = 1.0):
+        """``check_for_spiders``, retried through short error backoffs.
+
+        A capture blip should not read as "no spider", but a detector that
+        stays broken must not hold up mining either, so after ``max_wait``
+        seconds SPIDER_CHECK_SKIPPED is returned as is.
+        """
+        deadline = self.pacer.deadline(max_wait)
+        while True:
+            spider_pos = self.check_for_spiders()
+            if (spider_pos is not SPIDER_CHECK_SKIPPED or not self.spider_detection_enabled
+                    or not self.running or self.pacer.now() >= deadline):
+                return spider_pos
+            self.pacer.sleep(0.05, 'spider_retry')
+
+    def get_best_attack_point(self, spider_pos):
+        """Determine the best attack point based on spider position.
+
+        Args:
+            spider_pos: (x, y) coordinates of the spider
+
+        Returns:
+            tuple: (x, y) coordinates of the best attack point, or None if not available
+        """
+        config = self.config
+        if not all([config.character_point, config.spider_attack_point_1, config.spider_attack_point_2]):
+            return None
+
+        # Calculate vectors from character to spider and attack points
+        char_x, char_y = config.character_point
+        spider_x, spider_y = spider_pos
+
+        # Calculate vector from character to spider
+        dx = spider_x - char_x
+        dy = spider_y - char_y
+
+        # Get the attack point that's in the opposite direction from the spider
+        attack_point_1 = config.spider_attack_point_1
+        attack_point_2 = config.spider_attack_point_2
+
+        # Calculate dot products to find which attack point is more opposite to the spider
+        def dot_product(a, b):
+            return a[0]*b[0] + a[1]*b[1]
+
+        # Vectors from character to attack points
+        vec1 = (attack_point_1[0] - char_x, attack_point_1[1] - char_y)
+        vec2 = (attack_point_2[0] - char_x, attack_point_2[1] - char_y)
+        spider_vec = (dx, dy)
+
+        # The attack point with the most negative dot product is more opposite to the spider
+        dot1 = dot_product(spider_vec, vec1)
+        dot2 = dot_product(spider_vec, vec2)
+
+        return attack_point_1 if dot1 < dot2 else attack_point_2
+
+    def attack_spider(self, initial_spider_pos):
+        """Execute the spider attack sequence with continuous attacks.
+
+        Args:
+            initial_spider_pos: (x, y) coordinates of the spider when first detected
+
+        Returns:
+            bool: True if attack sequence was completed, False if aborted due to error
+        """
+        with self.stage_timer.span('attack_spider'), self.time_breakdown.span('spider_combat'):
+            print(f"[SPIDER] Starting attack sequence at {initial_spider_pos}")
+            self.spider_attack_in_progress = True
+            self.publish(spider_status="Spider: Attacking...")
+
+            # Get the best attack point based on spider position
+            attack_point = self.get_best_attack_point(initial_spider_pos)
+            if not attack_point:
+                print("[SPIDER] No valid attack point found")
+                self.publish(spider_status="Spider: No attack point")
+                self.spider_attack_in_progress = False
+                self.emit('spider_attack', result='no_attack_point')
+                return False
+
+            print(f"[SPIDER] Attacking from point {attack_point}")
+
+            try:
+                # Move to attack point and attack; spider checks continue while the input runs
+                self.input_dispatcher.move_click(attack_point, backend='pydirectinput', duration=0.1, settle=0.1)
+
+                # Keep attacking while spider is still in the detection region
+                max_attack_time = 10.0  # Maximum time to spend attacking a single spider
+                attack_deadline = self.pacer.deadline(max_attack_time)
+                next_attack_time = self.pacer.deadline(0.5)
+
+                while self.pacer.now() < attack_deadline:
+                    # Update status with time remaining
+                    time_left = max(0, attack_deadline - self.pacer.now())
+                    self.publish(spider_status=f"Spider: Attacking... ({time_left:.1f}s left)")
+
+                    # Check if spider is still there
+                    current_spider = self.check_for_spiders()
+                    if current_spider is SPIDER_CHECK_SKIPPED and not self.spider_detection_enabled:
+                        # Detection was switched off by a fatal error: there is no telling when the spider is gone
+                        print("[SPIDER] Spider detection lost, ending attack")
+                        self.input_dispatcher.cancel_pending()
+                        self.publish(spider_status="Spider: Detection Lost")
+                        self.spider_attack_in_progress = False
+                        self.emit('spider_attack', result='detection_lost')
+                        return False
+                    if current_spider is None:
+                        # Only a check that ran and found nothing ends the fight; skipped checks keep attacking
+                        print("[SPIDER] Spider no longer detected, attack complete")
+                        self.input_dispatcher.cancel_pending()
+                        self.publish(spider_status="Spider: Defeated!")
+                        self.pacer.sleep(0.5, 'spider_status')  # Small delay to show defeated status
+                        self.spider_attack_in_progress = False
+                        self.emit('spider_attack', result='defeated')
+                        return True
+
+                    # Continue attacking (about 2 attacks per second)
+                    if self.pacer.now() >= next_attack_time:  # Attack twice per second
+                        # Drop the click if it could not be sent before the next one is due
+                        self.input_dispatcher.click(backend='pydirectinput', max_age=0.5)
+                        # Keep a fixed cadence instead of drifting by the loop overhead
+                        next_attack_time = max(next_attack_time + 0.5, self.pacer.now())
+
+                    # Small sleep to prevent CPU overload; poll until the next attack at most
+                    self.pacer.sleep_until(min(self.pacer.deadline(0.05), next_attack_time), 'spider_poll', precise=False)
+
+                    # Check if we should abort
+                    if not self.running:
+                        print("[SPIDER] Attack sequence aborted")
+                        self.input_dispatcher.cancel_pending()
+                        self.publish(spider_status="Spider: Attack Aborted")
+                        self.spider_attack_in_progress = False
+                        self.emit('spider_attack', result='aborted')
+                        return False
+
+                print("[SPIDER] Max attack time reached")
+                self.publish(spider_status="Spider: Attack Timeout")
+                self._dump_debug_frames('attack_timeout', attack_point=attack_point)
+                self.pacer.sleep(0.5, 'spider_status')  # Small delay to show timeout status
+                self.spider_attack_in_progress = False
+                self.emit('spider_attack', result='timeout')
+
+                return True
+
+            except Exception as e:
+                # Spider checks back off on their own; the attack just ends
+                decision = self.errors.handle(e, 'spiders')
+                print(f"[ERROR] Error during spider attack ({decision.error_class}): {e}")
+                self.emit('spider_attack', result='error', error=str(e))
+                self._emit_error('attack_spider', e, decision.error_class)
+                try:
+                    # Try to return to character position even if there was an error
+                    self.input_dispatcher.cancel_pending()
+                    self.input_dispatcher.move(self.config.character_point, duration=0.2)
+                except:
+                    pass
+                return False
+
+    def run(self):
+        """Main macro loop based on the flow.md logic. Blocks until stopped."""
+        config = self.config
+        rock_phases = config.rock_templates
+        multi_sample = config.sample_count > 1
+
+        self.current_strategy = 1
+        self.phase = 'search'
+        self.time_breakdown.start()
+        self.pacer.breakdown = self.time_breakdown
+        self.errors.reset()
+        self._fatal_status = None
+        if self.watchdog is not None:
+            self.watchdog.attach(self)
+
+        failed = False  # The previous iteration ended in an exception
+        while self.running:
+            if self.stop_at is not None and self.pacer.now() >= self.stop_at:
+                break
+            if self._fatal_status is not None:
+                self._finish(self._fatal_status)
+                return
+            if not failed:
+                self.errors.success('loop')
+            failed = False
+            if self.watchdog is not None:
+                status = self.watchdog.check()
+                if status is not None:
+                    self._finish(status)
+                    return
+            self._publish_stage_timing()
+            with self.stage_timer.span('loop'):
+                try:
+                    # 1. Determine current strategy
+                    if self.current_strategy == 1:
+                        active_detection_region, active_click_point, strategy_name = \
+                            config.detection_region_1, config.click_point_1, "Area 1"
+                    else: # Strategy 2
+                        active_detection_region, active_click_point, strategy_name = \
+                            config.detection_region_2, config.click_point_2, "Area 2"
+
+                    # Take a screenshot of the active area
+                    screenshot_cv = self._grab(active_detection_region, 'detection')
+
+                    # === SEARCH PHASE (1st phase) ===
+                    if self.phase == 'search':
+                        self.publish(status=f"{strategy_name}: Searching for rock...")
+
+                        rock_found_conf, _, _ = self._match('detection', screenshot_cv, rock_phases, config.detection_confidence)
+
+                        if rock_found_conf > 0:
+                            # Rock found, switch to mining phase
+                            self.failed_searches = 0
+                            self.phase = 'mining'
+                            self.publish(status=f"{strategy_name}: Rock found. Starting to mine.",
+                                         confidence=f"Minable Rock Confidence: {rock_found_conf:.2f}")
+                            continue
+                        else:
+                            # No rock found, perform one click as per instructions
+                            self.publish(status=f"{strategy_name}: No rock. Performing speculative click.")
+                            click = self.input_dispatcher.click(active_click_point)
+                            # Randomized pause around the calibrated (default 0.5s ±0.15s) click latency
+                            self._wait_after_click('speculative', active_detection_region, screenshot_cv, click)
+
+                            # Search again
+                            screenshot_cv = self._grab(active_detection_region, 'detection')
+                            rock_found_conf, _, _ = self._match('detection', screenshot_cv, rock_phases, config.detection_confidence)
+
+                            if rock_found_conf > 0:
+                                # Rock appeared after the click, switch to mining
+                                self.failed_searches = 0
+                                self.phase = 'mining'
+                                self.publish(status=f"{strategy_name}: Rock appeared. Mining.")
+                                continue
+                            else:
+                                # Still no rock, switch to the next area
+                                self.publish(status=f"{strategy_name}: Still no rock. Switching area.")
+                                self.failed_searches += 1
+                                if self.debug_frames is not None and \
+                                        self.failed_searches % self.debug_frames.failed_search_limit == 0:
+                                    self._dump_debug_frames('failed_search', searches=self.failed_searches)
+
+                                # Calculate new direction (1 or 2)
+                                new_direction = 2 if self.current_strategy == 1 else 1
+
+                                print(f"Current: {self.current_strategy}, New: {new_direction}, Last: {self.last_direction}, Count: {self.direction_switches}")
+
+                                # Check if this is a direction switch (not the first time)
+                                if self.last_direction is not None and self.last_direction != new_direction:
+                                    print(f"Direction switch detected! Last: {self.last_direction}, New: {new_direction}")
+                                    self.direction_switches += 1
+
+                                    # Update the UI with the new count
+                                    self.publish(direction_switches=f"Direction Switches: {self.direction_switches}")
+
+                                    # If we've switched directions twice, wait for the mining delay
+                                    if self.direction_switches >= 2:
+                                        self.publish(status="Waiting mining delay before continuing...")
+                                        self.pacer.sleep(config.mining_retry_timeout, 'direction_switch')
+                                        self.direction_switches = 0  # Reset counter after delay
+                                        self.publish(direction_switches="Direction Switches: 0")
+
+                                        # After delay, keep the current direction instead of switching
+                                        print(f"After delay, keeping direction: {self.current_strategy}")
+                                        self.last_direction = self.current_strategy
+                                        self.phase = 'search'
+                                        continue
+
+                                # Update direction tracking for next iteration
+                                self.last_direction = new_direction  # Track the direction we're switching to
+                                self.current_strategy = new_direction
+                                self.phase = 'search' # Stay in search phase for the new area
+                                self.pacer.sleep(config.area_switch_timeout, 'area_switch')
+                                continue
+
+                    # === MINING PHASE (2nd phase) ===
+                    elif self.phase == 'mining':
+                        # Check for minable rocks first (safety check from flow.md); with several
+                        # samples use the minimum confidence (most conservative approach)
+                        rock_confidences, screenshot_cv = self._sample_confidences(
+                            active_detection_region, rock_phases, config.detection_confidence,
+                            first_frame=screenshot_cv, stop_on_miss=True)
+                        rock_found_conf = min(rock_confidences) if rock_confidences else 0
+                        checks = ', '.join(f'{c:.2f}' for c in rock_confidences)
+
+                        if rock_found_conf == 0:
+                            # Rock disappeared, go back to search phase
+                            if multi_sample:
+                                self.publish(status=f"{strategy_name}: Rock gone. Checks: {checks}")
+                            else:
+                                self.publish(status=f"{strategy_name}: Rock gone. Searching.")
+                            self.phase = 'search'
+                            continue
+
+                        if multi_sample:
+                            self.publish(confidence=f"Rock Checks: {checks} (min: {rock_found_conf:.2f})")
+                        else:
+                            self.publish(confidence=f"Minable Rock Confidence: {rock_found_conf:.2f}")
+
+                        # Perform mining action
+                        self.publish(status=f"Mining at {strategy_name}...")
+                        click = self.input_dispatcher.click(active_click_point)
+
+                        # Short pause to let game state update before checking for depletion
+                        self._wait_after_click('mine', active_detection_region, screenshot_cv, click)
+                        if not self.running: break
+
+                        # Check if rock is depleted; with several samples average the confidence values
+                        if multi_sample:
+                            self.publish(depletion_confidence="Depletion: Checking...")
+                        confidences, screenshot_cv = self._sample_confidences(
+                            active_detection_region, config.mined_rock_templates, config.effective_depleted_confidence)
+                        depleted_conf = sum(confidences) / len(confidences)
+
+                        if multi_sample:
+                            # Update debug info
+                            self.publish(status=f"Depletion checks: {', '.join(f'{c:.2f}' for c in confidences)} (avg: {depleted_conf:.2f})")
+
+                        self.publish(depletion_confidence=f"Depletion: {depleted_conf:.2f}")
+
+                        if depleted_conf > 0:
+                            # Rock is mined, increment counter
+                            self.rock_counter += 1
+                            self.publish(rock_counter=f"Rocks Mined: {self.rock_counter}")
+                            self.emit('rock_mined', count=self.rock_counter, area=self.current_strategy)
+
+                            # Check for spiders before switching areas
+                            self.publish(status=f"{strategy_name}: Area depleted. Checking for spiders...")
+
+                            # Check for spiders and attack if found
+                            spider_pos = self._check_for_spiders_settled()
+                            if spider_pos is SPIDER_CHECK_SKIPPED:
+                                if self.spider_detection_enabled:
+                                    print("[WARN] Spider check unavailable, switching areas without it")
+                            elif spider_pos and config.spider_attack_point_1 and config.spider_attack_point_2:
+                                self.attack_spider(spider_pos)
+                                # After handling spider, give a moment before continuing
+                                self.pacer.sleep(0.5, 'post_spider')
+
+                            # Check for fire
+                            fire_pos = self.detect_fire()
+                            if fire_pos is not None:
+                                print(f"[SAFETY] Fire detected with confidence {self.last_fire_confidence:.2f}, stopping macro")
+                                self._dump_debug_frames('fire_stop', confidence=self.last_fire_confidence)
+                                self._finish("Fire detected! Stopping macro for safety.")
+                                return
+
+                            # Now switch to next detection region
+                            self.publish(status=f"{strategy_name}: Switching to next area.")
+                            self.current_strategy = 2 if self.current_strategy == 1 else 1
+                            self.phase = 'search' # Go back to searching in the new area
+                            self.pacer.sleep(config.area_switch_timeout, 'area_switch')
+                            continue
+                        else:
+                            # Rock not depleted, wait and repeat mining phase
+                            self.publish(status=f"{strategy_name}: Not depleted. Waiting to mine again.")
+                            self.pacer.sleep(config.mining_retry_timeout, 'mining_retry')
+                            # The loop will continue, and since phase is still 'mining', it will re-run this block.
+                            continue
+
+                except Exception as e:
+                    with self.time_breakdown.span('error'):
+                        failed = True
+                        decision = self.errors.handle(e, 'loop')
+                        print(f"Error in macro ({decision.error_class}): {e}")
+                        self._emit_error('loop', e, decision.error_class)
+                        if decision.action == 'stop':
+                            self._finish(f"Stopped: {decision.error_class} error: {e}")
+                            return
+                        if decision.action == 'cooldown':
+                            print(f"[WARN] {decision.failures} {decision.error_class} errors in a row, "
+                                  f"retrying in {decision.delay:.0f}s")
+                            self.publish(status=f"Error: {e} (retrying in {decision.delay:.0f}s)")
+                            self.pause(decision.delay, 'error_cooldown')
+                        else:
+                            self.publish(status=f"Error: {e}")
+                            self.pacer.sleep(decision.delay, 'error_backoff')
+
+        self._finish("Stopped")
@@ -0,0 +1,237 @@
+"""Error classes and their retry policies.
+
+Every exception the engine handles is put into a class:
+
+* ``capture``: a screen capture failed or returned nothing (``CaptureError``)
+* ``asset``: no template of a detector could be loaded (``AssetError``)
+* ``region``: a region has an impossible geometry (``RegionError``)
+* ``input``: the input backend failed to execute a click (``InputBackendError``)
+* ``unknown``: anything else
+
+Each class has a ``RetryPolicy``: an exponential backoff between retries
+and a circuit breaker that opens after ``threshold`` consecutive failures.
+An open breaker either waits ``cooldown`` seconds and lets one attempt
+through (half-open), or, for faults that retrying cannot fix (missing
+assets, bad regions), is fatal. ``ErrorHandler`` keeps the breakers per
+scope (the main loop, spider detection, fire detection), so a broken
+optional detector does not hold up mining.
+"""
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from graalera_macro.clock import SYSTEM_CLOCK
+
+ERROR_CLASSES = ('capture', 'asset', 'region', 'input', 'unknown')
+
+
+class MacroError(Exception):
+    """Base class of the errors the engine classifies itself."""
+    error_class = 'unknown'
+
+
+class CaptureError(MacroError):
+    """A screen capture failed or returned an empty image."""
+    error_class = 'capture'
+
+
+class AssetError(MacroError):
+    """None of a detector's templates could be loaded."""
+    error_class = 'asset'
+
+
+class RegionError(MacroError, ValueError):
+    """A capture region is missing or has no area."""
+    error_class = 'region'
+
+
+class InputBackendError(MacroError):
+    """The input backend raised while executing a command."""
+    error_class = 'input'
+
+
+def classify(error: BaseException) -> str:
+    """Return the error class of ``error``."""
+    if isinstance(error, MacroError):
+        return error.error_class
+    if isinstance(error, FileNotFoundError):
+        return 'asset'
+    return 'unknown'
+
+
+class RetryPolicy(NamedTuple):
+    """How to retry one error class.
+
+    Attributes:
+        base_delay: Seconds before the first retry
+        factor: Backoff multiplier per consecutive failure
+        max_delay: Longest backoff
+        threshold: Consecutive failures that open the circuit breaker
+        cooldown: Seconds an open breaker waits before letting one attempt through
+        fatal: An open breaker stops the scope instead of cooling down
+    """
+    base_delay: float
+    factor: float
+    max_delay: float
+    threshold: int
+    cooldown: float
+    fatal: bool = False
+
+    def delay(self, failures: int) -> float:
+        return min(self.max_delay, self.base_delay * self.factor ** max(0, failures - 1))
+
+
+DEFAULT_POLICIES = {
+    # Blips of the capture backend usually clear on the next frame
+    'capture': RetryPolicy(base_delay=0.005, factor=2.0, max_delay=1.0, threshold=20, cooldown=10.0),
+    'asset': RetryPolicy(base_delay=0.0, factor=1.0, max_delay=0.0, threshold=1, cooldown=0.0, fatal=True),
+    'region': RetryPolicy(base_delay=0.0, factor=1.0, max_delay=0.0, threshold=1, cooldown=0.0, fatal=True),
+    'input': RetryPolicy(base_delay=0.05, factor=2.0, max_delay=2.0, threshold=5, cooldown=30.0),
+    'unknown': RetryPolicy(base_delay=0.25, factor=2.0, max_delay=10.0, threshold=10, cooldown=60.0),
+}
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker: closed, open, then half-open after the cooldown."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+
+    def failure(self, now: float) -> bool:
+        """Count a failure; returns True if it opened the breaker."""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.threshold):
+            self.state = self.OPEN
+            self.opened_at = now
+            self.trips += 1
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+
+    def allow(self, now: float) -> bool:
+        """Return whether an attempt may go through (moves an open breaker to half-open after the cooldown)."""
+        if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+        return self.state != self.OPEN
+
+
+class ErrorDecision(NamedTuple):
+    """What to do about one error.
+
+    Attributes:
+        error_class: Class from ``ERROR_CLASSES``
+        action: 'retry' (after ``delay``), 'cooldown' (breaker open, wait ``delay``) or 'stop'
+        delay: Seconds to wait before the scope tries again
+        failures: Consecutive failures of this class in the scope
+    """
+    error_class: str
+    action: str
+    delay: float
+    failures: int
+
+
+class ErrorHandler:
+    """Classify errors and keep a circuit breaker per (scope, error class).
+
+    Args:
+        policies: Retry policy per error class (missing classes use ``DEFAULT_POLICIES``)
+        clock: Time source, the same one the engine uses (default: real time)
+    """
+
+    def __init__(self, policies: Optional[Dict[str, RetryPolicy]] = None, clock=None):
+        self.policies = dict(DEFAULT_POLICIES)
+        self.policies.update(policies or {})
+        self.clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._failing = set()
+        self.counts: Dict[str, Dict[str, int]] = {
+            error_class: {'errors': 0, 'retries': 0, 'trips': 0, 'fatal': 0} for error_class in ERROR_CLASSES
+        }
+
+    def handle(self, error: BaseException, scope: str = 'loop') -> ErrorDecision:
+        """Record ``error`` in ``scope`` and decide how to go on."""
+        error_class = classify(error)
+        policy = self.policies[error_class]
+        now = self.clock.now()
+        with self._lock:
+            breaker = self._breakers.get((scope, error_class))
+            if breaker is None:
+                breaker = self._breakers[(scope, error_class)] = CircuitBreaker(policy.threshold, policy.cooldown)
+            opened = breaker.failure(now)
+            counts = self.counts[error_class]
+            counts['errors'] += 1
+            if opened:
+                counts['trips'] += 1
+            if breaker.state == CircuitBreaker.OPEN and policy.fatal:
+                counts['fatal'] += 1
+                decision = ErrorDecision(error_class, 'stop', 0.0, breaker.failures)
+            elif breaker.state == CircuitBreaker.OPEN:
+                decision = ErrorDecision(error_class, 'cooldown', policy.cooldown, breaker.failures)
+            else:
+                counts['retries'] += 1
+                decision = ErrorDecision(error_class, 'retry', policy.delay(breaker.failures), breaker.failures)
+            self._retry_at[scope] = now + decision.delay
+            self._failing.add(scope)
+        return decision
+
+    def success(self, scope: str = 'loop'):
+        """Close the breakers of ``scope`` after an attempt that went through without errors."""
+        if scope not in self._failing:
+            return
+        with self._lock:
+            for (breaker_scope, _), breaker in self._breakers.items():
+                if breaker_scope == scope:
+                    breaker.success()
+            self._failing.discard(scope)
+
+    def allow(self, scope: str) -> bool:
+        """Return whether ``scope`` may try again (its backoff is over and no breaker is open)."""
+        if scope not in self._failing:
+            return True
+        now = self.clock.now()
+        with self._lock:
+            if now < self._retry_at.get(scope, 0.0):
+                return False
+            return all(breaker.allow(now) for (breaker_scope, _), breaker in self._breakers.items()
+                       if breaker_scope == scope)
+
+    def reset(self, scope: Optional[str] = None):
+        """Close the breakers of ``scope`` (default: every scope) and forget its backoff."""
+        with self._lock:
+            for (breaker_scope, _), breaker in self._breakers.items():
+                if scope is None or breaker_scope == scope:
+                    breaker.success()
+            if scope is None:
+                self._retry_at.clear()
+                self._failing.clear()
+            else:
+                self._retry_at.pop(scope, None)
+                self._failing.discard(scope)
+
+    def breakers(self) -> Dict[Tuple[str, str], str]:
+        """Return the state of every breaker by (scope, error class)."""
+        with self._lock:
+            return {key: breaker.state for key, breaker in self._breakers.items()}
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return errors, retries, breaker trips and fatal stops per error class."""
+        with self._lock:
+            return {error_class: dict(counts) for error_class, counts in self.counts.items()}
+
+    def summary(self) -> str:
+        parts = [f"{error_class}: {counts['errors']} ({counts['trips']} trips)"
+                 for error_class, counts in self.stats().items() if counts['errors']]
+        return "; ".join(parts) if parts else "no errors"
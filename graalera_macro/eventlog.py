@@ -0,0 +1,225 @@
+"""Structured JSONL event log.
+
+``EventLog`` writes one JSON object per line for every engine event (state
+transitions, detections, mined rocks, spiders, fire, errors with their
+tracebacks) and every input command. Producers only do a ``put_nowait``
+into a bounded queue; a background thread serializes and writes, rotating
+the file when it grows past ``max_bytes``. When the queue is full events
+are dropped and counted instead of blocking the engine.
+
+Noisy event types can be limited per type with a token bucket (events per
+second), or switched off with a limit of 0::
+
+    EventLog("logs/events.jsonl", limits={'detection': 2.0, 'input': 0})
+"""
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+DEFAULT_LOG_DIR = "logs"
+# Detections happen several times per loop iteration; everything else is unlimited
+DEFAULT_LIMITS = {'detection': 5.0}
+
+
+class _TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate * 2)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return False
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class EventLog:
+    """Non-blocking JSONL event log with rotation.
+
+    Args:
+        path: Log file (rotated files get ``.1``, ``.2``, ... suffixes)
+        limits: Maximum events per second per event type; 0 disables a type
+        queue_size: Maximum number of events waiting for the writer
+        max_bytes: Rotate once the file is larger than this
+        backups: Rotated files to keep
+    """
+
+    def __init__(self, path: str, limits: Optional[Dict[str, float]] = None, queue_size: int = 4096,
+                 max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.path = path
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._buckets = {kind: _TokenBucket(rate) for kind, rate in self.limits.items()}
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._engine = None
+        self.written = 0
+        self.dropped = 0
+        self.suppressed: Dict[str, int] = {}
+        self.rotations = 0
+
+    @classmethod
+    def in_directory(cls, directory: str = DEFAULT_LOG_DIR, **kwargs) -> "EventLog":
+        """Create a log writing a timestamped file in ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        name = datetime.now().strftime("events_%Y%m%d_%H%M%S.jsonl")
+        return cls(os.path.join(directory, name), **kwargs)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_limit(self, kind: str, rate: Optional[float]):
+        """Limit ``kind`` to ``rate`` events per second (None: unlimited, 0: off). Safe at runtime."""
+        if rate is None:
+            self.limits.pop(kind, None)
+            self._buckets.pop(kind, None)
+        else:
+            self.limits[kind] = rate
+            self._buckets[kind] = _TokenBucket(rate)
+
+    def start(self):
+        if self.running:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="EventLog", daemon=True)
+        self._thread.start()
+        self.log('log_started', limits=self.limits)
+
+    def stop(self, timeout: float = 5.0):
+        """Write everything still queued and close the file."""
+        self.detach()
+        if self._thread is None:
+            return
+        self.log('log_stopped', dropped=self.dropped, suppressed=dict(self.suppressed))
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("[ERROR] Event log queue stuck, closing without flushing")
+        self._thread.join(timeout)
+        self._thread = None
+
+    def attach(self, engine):
+        """Log every event of ``engine`` and every command of its input dispatcher."""
+        self._engine = engine
+        engine.add_listener(self.on_event)
+        engine.input_dispatcher.add_listener(self.on_input)
+
+    def detach(self):
+        if self._engine is not None:
+            self._engine.remove_listener(self.on_event)
+            self._engine.input_dispatcher.remove_listener(self.on_input)
+            self._engine = None
+
+    def _allowed(self, kind: str) -> bool:
+        bucket = self._buckets.get(kind)
+        if bucket is None or bucket.take():
+            return True
+        self.suppressed[kind] = self.suppressed.get(kind, 0) + 1
+        return False
+
+    def on_event(self, event: dict):
+        """Queue an engine event. Never blocks."""
+        if not self._allowed(event['kind']):
+            return
+        event = dict(event)
+        event['ts'] = time.time()
+        self._put(event)
+
+    def on_input(self, command):
+        """Queue a finished ``InputCommand``. Never blocks."""
+        if not self._allowed('input'):
+            return
+        if command.cancelled:
+            outcome = 'cancelled'
+        elif command.expired:
+            outcome = 'expired'
+        elif command.error is not None:
+            outcome = 'failed'
+        else:
+            outcome = 'executed'
+        self._put({
+            'kind': 'input',
+            'ts': time.time(),
+            't': command.finished_at if command.finished_at is not None else command.created_at,
+            'command': command.kind,
+            'point': command.point,
+            'button': command.button,
+            'backend': command.backend,
+            'outcome': outcome,
+            'queue_delay': command.queue_delay,
+            'execution_time': command.execution_time,
+            'error': str(command.error) if command.error is not None else None,
+        })
+
+    def log(self, kind: str, **fields):
+        """Queue an event that does not come from the engine (e.g. a front-end action)."""
+        if not self._allowed(kind):
+            return
+        event = {'kind': kind, 'ts': time.time()}
+        event.update(fields)
+        self._put(event)
+
+    def _put(self, event: dict):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    # --- Writer thread ---
+
+    def _rotate(self, f):
+        f.close()
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        return open(self.path, 'a', encoding='utf-8')
+
+    def _run(self):
+        f = open(self.path, 'a', encoding='utf-8')
+        try:
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    break
+                try:
+                    line = json.dumps(event, default=str)
+                except (TypeError, ValueError) as e:
+                    line = json.dumps({'kind': 'log_error', 'ts': time.time(), 'error': str(e),
+                                       'event_kind': event.get('kind')})
+                f.write(line + "\n")
+                self.written += 1
+                # Flush when the queue is drained so a crash loses little
+                if self._queue.empty():
+                    f.flush()
+                if f.tell() >= self.max_bytes:
+                    f = self._rotate(f)
+        except OSError as e:
+            print(f"[ERROR] Event log writer failed: {e}")
+        finally:
+            f.close()
+
+    def summary(self) -> str:
+        suppressed = sum(self.suppressed.values())
+        return (f"{self.written} events written to {self.path} ({self.dropped} dropped, {suppressed} rate-limited, "
+                f"{self.rotations} rotations)")
@@ -0,0 +1,372 @@
+"""Asynchronous input dispatching.
+
+Mouse input is queued as ``InputCommand`` objects and executed on a dedicated
+dispatcher thread, so the macro thread can keep capturing and matching while
+a move or click is in flight. Every command is timestamped when it is
+created, started and finished, which gives one place to measure input
+latency for both input backends. A synchronous dispatcher executes commands
+on the submitting thread instead, which simulations on a ``VirtualClock`` use
+to stay deterministic.
+"""
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from graalera_macro.clock import SYSTEM_CLOCK
+from graalera_macro.stats import RunningPercentile
+
+# Longest a submitter waits for one command before treating the backend as hung
+COMMAND_TIMEOUT = 5.0
+
+
+class PyAutoGuiBackend:
+    """Input backend using pyautogui."""
+
+    name = 'pyautogui'
+
+    def __init__(self):
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def move(self, x, y, duration=0.0):
+        self._pyautogui.moveTo(x, y, duration=duration)
+
+    def click(self, x=None, y=None, button='left'):
+        self._pyautogui.click(x, y, button=button)
+
+
+class PyDirectInputBackend:
+    """Input backend using pydirectinput (DirectInput scan codes, needed in-game)."""
+
+    name = 'pydirectinput'
+
+    def __init__(self):
+        import pydirectinput
+        self._pydirectinput = pydirectinput
+
+    def move(self, x, y, duration=0.0):
+        self._pydirectinput.moveTo(x, y, duration=duration)
+
+    def click(self, x=None, y=None, button='left'):
+        self._pydirectinput.click(x, y, button=button)
+
+
+class CapturingBackend:
+    """Input backend that records commands instead of executing them.
+
+    Used for replays and simulations. ``on_event`` is called with every
+    recorded event on the dispatcher thread.
+    """
+
+    def __init__(self, name: str = 'capture', on_event: Optional[Callable[[dict], None]] = None, clock=None):
+        self.name = name
+        self.on_event = on_event
+        self.clock = clock or SYSTEM_CLOCK
+        self.position: Optional[Tuple[int, int]] = None
+        self.events: List[dict] = []
+
+    def move(self, x, y, duration=0.0):
+        self.position = (x, y)
+        self._record('move', None)
+
+    def click(self, x=None, y=None, button='left'):
+        if x is not None and y is not None:
+            self.position = (x, y)
+        self._record('click', button)
+
+    def _record(self, kind: str, button: Optional[str]):
+        event = {'t': self.clock.now(), 'kind': kind, 'point': self.position, 'button': button}
+        self.events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def clicks(self) -> List[dict]:
+        return [event for event in self.events if event['kind'] == 'click']
+
+
+class InputCommand:
+    """A single queued input action.
+
+    Attributes:
+        kind: One of MOVE, CLICK or MOVE_CLICK
+        point: Screen (x, y) target, or None to click at the current position
+        backend: Name of the backend that executes the command
+        created_at / started_at / finished_at: Timestamps of the dispatcher's clock
+        expires_at: Commands still queued after this time are dropped
+        error: Exception raised by the backend, if any
+    """
+
+    MOVE = 'move'
+    CLICK = 'click'
+    MOVE_CLICK = 'move_click'
+
+    def __init__(self, kind: str, point: Optional[Tuple[int, int]] = None, button: str = 'left',
+                 backend: str = 'pyautogui', duration: float = 0.0, settle: float = 0.0,
+                 max_age: Optional[float] = None):
+        self.kind = kind
+        self.point = point
+        self.button = button
+        self.backend = backend
+        self.duration = duration
+        self.settle = settle
+        self.max_age = max_age
+        self.stamp(time.perf_counter())
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancelled = False
+        self.expired = False
+        self.error: Optional[BaseException] = None
+        self._done = threading.Event()
+        # Makes cancel() and the dispatcher's start of execution mutually exclusive
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"InputCommand({self.kind}, {self.point}, backend={self.backend})"
+
+    def stamp(self, now: float):
+        """Set the creation time (and with it the expiry time) to ``now``."""
+        self.created_at = now
+        self.expires_at = now + self.max_age if self.max_age is not None else None
+
+    def cancel(self) -> bool:
+        """Cancel the command if it has not started yet.
+
+        Returns:
+            bool: True if the command will not be executed
+        """
+        with self._lock:
+            if self.started_at is None:
+                self.cancelled = True
+            return self.cancelled
+
+    def begin(self, now: float) -> bool:
+        """Mark the command started at ``now``, unless it was cancelled first.
+
+        Returns:
+            bool: True if the command may be executed
+        """
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.started_at = now
+            return True
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def succeeded(self) -> bool:
+        return self.done and self.finished_at is not None and self.error is None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the command has been executed, cancelled or dropped."""
+        return self._done.wait(timeout)
+
+    @property
+    def queue_delay(self) -> Optional[float]:
+        """Seconds between creation and the start of execution."""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.created_at
+
+    @property
+    def execution_time(self) -> Optional[float]:
+        """Seconds the backend spent executing the command."""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class InputDispatcher:
+    """Execute ``InputCommand`` objects in order on a background thread.
+
+    Listeners registered with ``add_listener`` are called on the dispatcher
+    thread with each command once it is finished, cancelled or expired.
+    """
+
+    def __init__(self, backends: Optional[Dict[str, object]] = None, clock=None, synchronous: bool = False):
+        self.backends: Dict[str, object] = dict(backends or {})
+        self.clock = clock or SYSTEM_CLOCK
+        self.synchronous = synchronous
+        self._queue: "queue.Queue[Optional[InputCommand]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # Held while starting/stopping the thread and queueing, so no command is queued without a thread
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[InputCommand], None]] = []
+        self._stats_lock = threading.Lock()
+        self._queue_delays: Dict[str, RunningPercentile] = {}
+        self._execution_times: Dict[str, RunningPercentile] = {}
+        self._counts: Dict[str, int] = {'executed': 0, 'cancelled': 0, 'expired': 0, 'failed': 0}
+
+    @classmethod
+    def with_default_backends(cls) -> "InputDispatcher":
+        """Create a dispatcher using pyautogui and pydirectinput."""
+        return cls({
+            PyAutoGuiBackend.name: PyAutoGuiBackend(),
+            PyDirectInputBackend.name: PyDirectInputBackend(),
+        })
+
+    @classmethod
+    def capturing(cls, backend: Optional[CapturingBackend] = None, clock=None,
+                  synchronous: bool = False) -> "InputDispatcher":
+        """Create a dispatcher whose backends record commands instead of moving the mouse."""
+        backend = backend or CapturingBackend(clock=clock)
+        return cls({PyAutoGuiBackend.name: backend, PyDirectInputBackend.name: backend},
+                   clock=clock, synchronous=synchronous)
+
+    def add_listener(self, listener: Callable[[InputCommand], None]):
+        """Register a callback for completed commands."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[InputCommand], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the dispatcher thread if it is not already running."""
+        with self._lock:
+            if self.running or self.synchronous:
+                return
+            # Each thread gets its own queue: a thread that outlived stop() (stuck in a backend call)
+            # must neither take the new thread's commands nor leave its stop sentinel to it
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name="InputDispatcher",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self, cancel_pending: bool = True, timeout: Optional[float] = 1.0):
+        """Stop the dispatcher thread, optionally cancelling queued commands."""
+        with self._lock:
+            if cancel_pending:
+                self.cancel_pending()
+            thread = self._thread if self.running else None
+            if thread is not None:
+                self._queue.put(None)
+            self._thread = None
+        if thread is not None:
+            thread.join(timeout)
+
+    def cancel_pending(self) -> int:
+        """Cancel every command still waiting in the queue.
+
+        Returns:
+            int: Number of commands cancelled
+        """
+        cancelled = 0
+        commands = self._queue
+        while True:
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                break
+            if command is None:
+                # Keep the stop sentinel for the dispatcher thread
+                commands.put(None)
+                break
+            command.cancel()
+            self._finish(command)
+            cancelled += 1
+        return cancelled
+
+    def submit(self, command: InputCommand) -> InputCommand:
+        """Queue a command for execution and return it."""
+        if command.backend not in self.backends:
+            raise ValueError(f"Unknown input backend: {command.backend}")
+        command.stamp(self.clock.now())
+        if self.synchronous:
+            self._process(command)
+            return command
+        with self._lock:
+            self.start()
+            self._queue.put(command)
+        return command
+
+    def move(self, point, backend='pyautogui', duration=0.0, **kwargs) -> InputCommand:
+        """Queue a mouse move to ``point``."""
+        return self.submit(InputCommand(InputCommand.MOVE, point, backend=backend, duration=duration, **kwargs))
+
+    def click(self, point=None, backend='pyautogui', button='left', **kwargs) -> InputCommand:
+        """Queue a click at ``point`` (or at the current mouse position)."""
+        return self.submit(InputCommand(InputCommand.CLICK, point, button=button, backend=backend, **kwargs))
+
+    def move_click(self, point, backend='pyautogui', duration=0.1, settle=0.1, button='left',
+                   **kwargs) -> InputCommand:
+        """Queue a move to ``point``, a ``settle`` pause and a click."""
+        return self.submit(InputCommand(InputCommand.MOVE_CLICK, point, button=button, backend=backend,
+                                        duration=duration, settle=settle, **kwargs))
+
+    def _run(self, commands: "queue.Queue[Optional[InputCommand]]"):
+        while True:
+            command = commands.get()
+            if command is None:
+                break
+            self._process(command)
+
+    def _process(self, command: InputCommand):
+        if command.cancelled:
+            self._finish(command)
+            return
+        if command.expires_at is not None and self.clock.now() > command.expires_at:
+            command.expired = True
+            self._finish(command)
+            return
+        if command.begin(self.clock.now()):
+            self._execute(command)
+        self._finish(command)
+
+    def _execute(self, command: InputCommand):
+        backend = self.backends[command.backend]
+        try:
+            if command.kind in (InputCommand.MOVE, InputCommand.MOVE_CLICK):
+                backend.move(command.point[0], command.point[1], duration=command.duration)
+                if command.settle > 0:
+                    self.clock.sleep(command.settle)
+            if command.kind == InputCommand.CLICK:
+                x, y = command.point if command.point is not None else (None, None)
+                backend.click(x, y, button=command.button)
+            elif command.kind == InputCommand.MOVE_CLICK:
+                backend.click(button=command.button)
+        except Exception as e:
+            command.error = e
+            print(f"[ERROR] Input command {command} failed: {e}")
+        command.finished_at = self.clock.now()
+
+    def _finish(self, command: InputCommand):
+        with self._stats_lock:
+            if command.cancelled:
+                self._counts['cancelled'] += 1
+            elif command.expired:
+                self._counts['expired'] += 1
+            elif command.error is not None:
+                self._counts['failed'] += 1
+            else:
+                self._counts['executed'] += 1
+                self._queue_delays.setdefault(command.backend, RunningPercentile()).add(command.queue_delay)
+                self._execution_times.setdefault(command.backend, RunningPercentile()).add(command.execution_time)
+        command._done.set()
+        for listener in list(self._listeners):
+            try:
+                listener(command)
+            except Exception as e:
+                print(f"[ERROR] Input listener failed: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        """Return command counts and per-backend queue delay / execution time percentiles."""
+        with self._stats_lock:
+            latency = {}
+            for backend, executions in self._execution_times.items():
+                delays = self._queue_delays[backend]
+                latency[backend] = {
+                    'count': executions.total_count,
+                    'queue_delay_p50': delays.percentile(50),
+                    'queue_delay_p95': delays.percentile(95),
+                    'execution_p50': executions.percentile(50),
+                    'execution_p95': executions.percentile(95),
+                }
+            return {'counts': dict(self._counts), 'pending': self._queue.qsize(), 'latency': latency}
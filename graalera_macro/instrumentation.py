@@ -0,0 +1,338 @@
+"""Per-stage timing of the engine.
+
+The engine wraps its stages (one run-loop iteration, ``check_for_spiders``,
+``detect_fire``, ``attack_spider``, every capture and match) in
+``StageTimer.span``. Every span feeds a fixed-bucket histogram, so
+recording costs a bisect and two additions no matter how long the session
+runs, and histograms from different sessions can be added up. Timing can
+be switched on and off at runtime; while it is off (and no tracer is
+attached) ``span`` returns a shared no-op context manager. Span durations
+are always measured with ``time.perf_counter``: under a ``VirtualClock``
+capture and matching take no simulated time, but they still cost real time.
+
+``TimeBreakdown`` answers a different question: where did the session's
+time go? It charges every moment of the engine thread to exactly one
+category (capture, match, input, each wait reason, spider combat, errors,
+or plain engine work), so the categories add up to the session length.
+Under a ``VirtualClock`` the waits are charged in simulated time and
+everything else in real time, so a virtual-time session still shows what
+the computation costs.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from graalera_macro.clock import SYSTEM_CLOCK
+
+# Upper bucket bounds in milliseconds; slower spans go to the overflow bucket
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+DEFAULT_TIMING_DIR = "timings"
+
+
+class Histogram:
+    """Counts of observations per fixed bucket, plus count, sum, min and max.
+
+    Args:
+        bounds_ms: Increasing upper bounds of the buckets in milliseconds
+    """
+
+    def __init__(self, bounds_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.bounds_ms = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms: Optional[float] = None
+        self.max_ms: Optional[float] = None
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000.0
+        self.counts[bisect_left(self.bounds_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if self.min_ms is None or ms < self.min_ms:
+            self.min_ms = ms
+        if self.max_ms is None or ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Estimate the ``pct`` percentile in ms by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds_ms[i - 1] if i > 0 else 0.0
+                upper = self.bounds_ms[i] if i < len(self.bounds_ms) else self.max_ms
+                fraction = (rank - seen) / bucket_count
+                return min(self.max_ms, max(self.min_ms, lower + (upper - lower) * fraction))
+            seen += bucket_count
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            'bounds_ms': list(self.bounds_ms),
+            'counts': list(self.counts),
+            'count': self.count,
+            'sum_ms': self.total_ms,
+            'min_ms': self.min_ms,
+            'max_ms': self.max_ms,
+            'mean_ms': self.total_ms / self.count if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+        }
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('timer', 'stage', 'start', 'started')
+
+    def __init__(self, timer: "StageTimer", stage: str):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = self.timer.clock.now()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        tracer = self.timer.tracer
+        if tracer is not None:
+            args = {'error': repr(exc)} if exc is not None else None
+            if self.timer.clock.virtual:
+                # Placed on the simulated timeline, where computing takes no time; keep the real cost
+                args = dict(args or {}, real_ms=seconds * 1000.0)
+            # One complete event per span, so a full trace buffer never keeps half of one
+            tracer.span(self.stage, 'engine', self.start, self.timer.clock.now(), args)
+        if self.timer.enabled:
+            self.timer.record(self.stage, seconds)
+        return False
+
+
+# Categories that take over everything nested inside them: a wait during a
+# spider fight is combat time, the backoff after an exception is error time
+ABSORBING_CATEGORIES = ('spider_combat', 'error')
+
+
+class _BreakdownSpan:
+    __slots__ = ('breakdown', 'entered')
+
+    def __init__(self, breakdown: "TimeBreakdown", category: str):
+        self.breakdown = breakdown
+        self.entered = breakdown.enter(category)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.entered:
+            self.breakdown.exit()
+        return False
+
+
+class TimeBreakdown:
+    """Exclusive accounting of the engine thread's time into categories.
+
+    ``start`` puts the calling thread in the ``engine`` category; ``span``
+    and ``record`` move it into another category for a while. Time is always
+    charged to the innermost category (or to an enclosing absorbing one), so
+    the totals add up to the time since ``start``. Calls from other threads
+    are ignored.
+
+    Args:
+        clock: Time source of the waits passed to ``record``, the same one the
+            engine uses (default: real time); everything else is real time
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or SYSTEM_CLOCK
+        # Spans and the time between waits are charged in real time; on a
+        # virtual clock only the waits themselves are simulated
+        self._work_clock = SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._totals: Dict[str, float] = {}
+        self._stack: List[str] = []
+        self._mark: Optional[float] = None
+        self._owner: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._owner is not None
+
+    def start(self):
+        """Start a new breakdown for the calling thread."""
+        with self._lock:
+            self._totals.clear()
+            self._stack = ['engine']
+            self._mark = self._work_clock.now()
+            self._owner = threading.get_ident()
+
+    def stop(self):
+        """Charge the time up to now and stop accounting."""
+        if threading.get_ident() != self._owner:
+            return
+        with self._lock:
+            self._charge(self._work_clock.now())
+            self._stack = []
+            self._owner = None
+
+    def _charge(self, until: float):
+        if self._mark is not None and self._stack and until > self._mark:
+            top = self._stack[-1]
+            self._totals[top] = self._totals.get(top, 0.0) + until - self._mark
+            self._mark = until
+
+    def _category(self, category: str) -> str:
+        if self._stack and self._stack[-1] in ABSORBING_CATEGORIES:
+            return self._stack[-1]
+        return category
+
+    def enter(self, category: str) -> bool:
+        """Charge time to ``category`` until the matching ``exit``; False if not accounting this thread."""
+        if threading.get_ident() != self._owner:
+            return False
+        with self._lock:
+            self._charge(self._work_clock.now())
+            self._stack.append(self._category(category))
+        return True
+
+    def exit(self):
+        with self._lock:
+            self._charge(self._work_clock.now())
+            if len(self._stack) > 1:
+                self._stack.pop()
+
+    def span(self, category: str) -> _BreakdownSpan:
+        """Context manager charging its duration to ``category``."""
+        return _BreakdownSpan(self, category)
+
+    def record(self, category: str, start: float, end: float):
+        """Charge the already finished interval ``start``..``end`` to ``category`` (e.g. a pacer wait)."""
+        if threading.get_ident() != self._owner:
+            return
+        with self._lock:
+            if self.clock.virtual:
+                # The wait took no real time: charge the work before it, then add the simulated wait
+                self._charge(self._work_clock.now())
+                if end > start:
+                    category = self._category(category)
+                    self._totals[category] = self._totals.get(category, 0.0) + end - start
+                return
+            self._charge(start)
+            start = max(start, self._mark)
+            if end > start:
+                category = self._category(category)
+                self._totals[category] = self._totals.get(category, 0.0) + end - start
+                self._mark = end
+
+    def totals(self) -> Dict[str, float]:
+        """Return seconds per category, including the time since the last change."""
+        with self._lock:
+            totals = dict(self._totals)
+            if self._owner is not None and self._stack:
+                top = self._stack[-1]
+                totals[top] = totals.get(top, 0.0) + max(0.0, self._work_clock.now() - self._mark)
+        return totals
+
+    def summary(self, limit: int = 8) -> str:
+        """Return the largest categories with their share of the session, e.g. ``wait:area_switch 41.0% (82.1s)``."""
+        totals = self.totals()
+        total = sum(totals.values())
+        if total <= 0:
+            return "no time accounted"
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+        parts = [f"{category} {seconds / total * 100:.1f}% ({seconds:.1f}s)" for category, seconds in ranked[:limit]]
+        if len(ranked) > limit:
+            rest = sum(seconds for _, seconds in ranked[limit:])
+            parts.append(f"other {rest / total * 100:.1f}% ({rest:.1f}s)")
+        return ", ".join(parts)
+
+
+class StageTimer:
+    """Histograms of how long each engine stage takes.
+
+    Args:
+        enabled: Start with timing on
+        clock: Time source of the trace timestamps (default: real time); durations are always real time
+        bounds_ms: Bucket bounds for new histograms
+    """
+
+    def __init__(self, enabled: bool = False, clock=None, bounds_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.enabled = enabled
+        self.clock = clock or SYSTEM_CLOCK
+        self.bounds_ms = tuple(bounds_ms)
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        # TraceRecorder receiving a complete event for every span, or None
+        self.tracer = None
+
+    def span(self, stage: str):
+        """Context manager timing one execution of ``stage`` (a no-op while disabled)."""
+        if not self.enabled and self.tracer is None:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def record(self, stage: str, seconds: float):
+        """Add one duration to the histogram of ``stage``."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.bounds_ms)
+            histogram.observe(seconds)
+
+    def stages(self) -> List[str]:
+        with self._lock:
+            return list(self._histograms)
+
+    def stats(self) -> Dict[str, dict]:
+        """Return every stage's histogram with count, mean and p50/p95/p99."""
+        with self._lock:
+            return {stage: histogram.to_dict() for stage, histogram in self._histograms.items()}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+
+    def summary(self) -> str:
+        """Return a one-line p50/p95 summary per stage."""
+        parts = []
+        for stage, values in sorted(self.stats().items()):
+            parts.append(f"{stage}: n={values['count']} p50 {values['p50_ms']:.1f}ms p95 {values['p95_ms']:.1f}ms")
+        return "; ".join(parts) if parts else "no stages timed"
+
+    def export(self, path: Optional[str] = None) -> str:
+        """Write the histograms as JSON and return the path.
+
+        Args:
+            path: Output file (default: ``timings/stages_<time>.json``)
+        """
+        if path is None:
+            os.makedirs(DEFAULT_TIMING_DIR, exist_ok=True)
+            path = os.path.join(DEFAULT_TIMING_DIR, f"stages_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        data = {
+            'started_at': self.started_at,
+            'exported_at': datetime.now().isoformat(timespec='seconds'),
+            'stages': self.stats(),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        return path
@@ -0,0 +1,173 @@
+"""Click-to-effect latency calibration.
+
+After a click the game needs some time before the detection region reflects
+it. Instead of sleeping a hardcoded amount, the calibrator measures that delay
+per click type and derives the post-click wait from a running percentile.
+Clicks whose effect did not show up within the timeout are censored
+samples: they count as the timeout, so a few early changes (e.g. the
+character animating) cannot pull the wait below the real effect.
+"""
+import threading
+from typing import Callable, Dict, Optional
+
+from graalera_macro.clock import SYSTEM_CLOCK
+from graalera_macro.stats import RunningPercentile
+from graalera_macro.timing import jittered
+
+
+def frame_changed(baseline, frame, threshold: float = 2.0) -> bool:
+    """Return True if ``frame`` differs from ``baseline`` by more than ``threshold``.
+
+    The difference is the mean absolute per-pixel difference, so small
+    compression or cursor noise does not count as a change.
+    """
+    import numpy as np
+
+    if baseline is None or frame is None:
+        return False
+    if baseline.shape != frame.shape:
+        return True
+    diff = np.abs(frame.astype(np.int16) - baseline.astype(np.int16))
+    return float(diff.mean()) > threshold
+
+
+class LatencyCalibrator:
+    """Measure click-to-effect latency and turn it into post-click waits.
+
+    While ``calibrating`` is on, ``measure`` polls the detection region after
+    every click until it changes and records how long that took. Outside of
+    calibration mode ``post_click_wait`` returns a wait based on the
+    ``wait_percentile`` of the recorded latencies, falling back to the
+    original hardcoded delays until ``min_samples`` have been collected.
+    """
+
+    # Hardcoded waits used before calibration: (base, jitter)
+    DEFAULT_WAITS = {
+        'mine': (0.5, 0.0),
+        'speculative': (0.5, 0.15),
+    }
+
+    def __init__(self, wait_percentile: float = 95.0, min_samples: int = 10,
+                 safety_factor: float = 1.25, settle_time: float = 0.05,
+                 min_wait: float = 0.05, window: int = 200, clock=None):
+        self.clock = clock or SYSTEM_CLOCK
+        self.calibrating: bool = False
+        self.wait_percentile = wait_percentile
+        self.min_samples = min_samples
+        self.safety_factor = safety_factor
+        self.settle_time = settle_time
+        self.min_wait = min_wait
+        self.window = window
+        self._estimators: Dict[str, RunningPercentile] = {}
+        self._timeouts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _estimator(self, click_type: str) -> RunningPercentile:
+        if click_type not in self._estimators:
+            self._estimators[click_type] = RunningPercentile(self.window)
+            self._timeouts[click_type] = 0
+        return self._estimators[click_type]
+
+    def record(self, click_type: str, latency: Optional[float], timeout: Optional[float] = None):
+        """Record a measured latency, or a timeout if ``latency`` is None.
+
+        A timeout is added to the percentile as a latency of ``timeout``
+        (default: the uncalibrated wait); the effect took at least that long.
+        """
+        with self._lock:
+            estimator = self._estimator(click_type)
+            if latency is None:
+                self._timeouts[click_type] += 1
+                if timeout is None:
+                    timeout = self.DEFAULT_WAITS.get(click_type, (0.5, 0.0))[0]
+                estimator.add(timeout)
+            else:
+                estimator.add(latency)
+
+    def measure(self, click_type: str, capture: Callable[[], object], baseline,
+                click_time: float, timeout: Optional[float] = None,
+                poll_interval: float = 0.01, threshold: float = 2.0) -> Optional[float]:
+        """Poll ``capture`` until the region differs from ``baseline``.
+
+        Args:
+            click_type: Key the latency is recorded under ('mine', 'speculative', ...)
+            capture: Callable returning the current BGR frame of the region
+            baseline: Frame captured before the click
+            click_time: ``clock.now()`` value taken right after the click
+            timeout: Give up after this many seconds (defaults to the uncalibrated wait)
+            poll_interval: Delay between polls
+            threshold: Mean absolute pixel difference that counts as a change
+
+        Returns:
+            float: Seconds from the click to the first changed frame, or None on timeout
+        """
+        if timeout is None:
+            timeout = self.DEFAULT_WAITS.get(click_type, (0.5, 0.0))[0]
+        deadline = click_time + timeout
+        latency = None
+        while self.clock.now() < deadline:
+            frame = capture()
+            now = self.clock.now()
+            if frame_changed(baseline, frame, threshold):
+                latency = now - click_time
+                break
+            self.clock.sleep(poll_interval)
+        self.record(click_type, latency, timeout)
+        return latency
+
+    def is_calibrated(self, click_type: str) -> bool:
+        """Return True once enough samples exist to replace the default wait."""
+        with self._lock:
+            estimator = self._estimators.get(click_type)
+            return estimator is not None and len(estimator) >= self.min_samples
+
+    def _wait_params(self, click_type: str):
+        """Return the (base, jitter) wait for ``click_type``."""
+        default_base, default_jitter = self.DEFAULT_WAITS.get(click_type, (0.5, 0.0))
+        with self._lock:
+            estimator = self._estimators.get(click_type)
+            if estimator is None or len(estimator) < self.min_samples:
+                return default_base, default_jitter
+            latency = estimator.percentile(self.wait_percentile)
+        calibrated = latency * self.safety_factor + self.settle_time
+        base = max(self.min_wait, min(default_base, calibrated))
+        # Keep the humanized spread proportional to the calibrated base
+        return base, default_jitter * (base / default_base)
+
+    def post_click_wait(self, click_type: str) -> float:
+        """Return how long to wait after a click of ``click_type``."""
+        base, jitter = self._wait_params(click_type)
+        return jittered(base, jitter, self.min_wait)
+
+    def reset(self):
+        """Drop all recorded latencies."""
+        with self._lock:
+            self._estimators.clear()
+            self._timeouts.clear()
+
+    def metrics(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Return per click type sample counts, latency percentiles and the current wait."""
+        with self._lock:
+            snapshot = {}
+            for click_type, estimator in self._estimators.items():
+                snapshot[click_type] = {
+                    'samples': estimator.total_count,
+                    'timeouts': self._timeouts.get(click_type, 0),
+                    'p50': estimator.percentile(50),
+                    'p90': estimator.percentile(90),
+                    'p95': estimator.percentile(95),
+                    'p99': estimator.percentile(99),
+                }
+        for click_type, values in snapshot.items():
+            values['wait'] = self._wait_params(click_type)[0]
+        return snapshot
+
+    def summary(self) -> str:
+        """Return a one-line summary suitable for a status label."""
+        parts = []
+        for click_type, values in sorted(self.metrics().items()):
+            if values['p95'] is None:
+                parts.append(f"{click_type}: n/a")
+            else:
+                parts.append(f"{click_type}: p95 {values['p95'] * 1000:.0f}ms (n={values['samples']})")
+        return "Click Latency: " + (", ".join(parts) if parts else "N/A")
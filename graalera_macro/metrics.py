@@ -0,0 +1,288 @@
+"""Prometheus metrics for a running engine.
+
+``MetricsCollector`` listens to the engine's events and captured frames and
+renders the Prometheus text exposition format; ``MetricsServer`` serves it
+on a local port (``http://127.0.0.1:9464/metrics`` by default). Both are
+off unless a front-end turns them on (``--metrics-port``).
+
+Exposed metrics:
+
+* ``graalera_rocks_mined_total`` and ``graalera_rocks_per_hour{window}``
+  over rolling windows
+* ``graalera_detection_confidence{detector}`` histograms (0 means no match
+  above the detector's threshold)
+* ``graalera_stage_duration_seconds{stage}`` histograms from the stage timer
+* ``graalera_capture_fps`` over the last few seconds
+* ``graalera_idle_fraction``: share of the session spent in pacer waits
+* ``graalera_time_seconds_total{category}``: the engine's time breakdown
+  (capture, match, input, ``wait:<reason>``, spider_combat, error, engine)
+* ``graalera_spider_events_total{event}`` and ``graalera_fire_events_total``
+* ``graalera_errors_total{class}``, ``graalera_error_retries_total{class}``,
+  ``graalera_circuit_breaker_trips_total{class}`` and
+  ``graalera_circuit_breaker_open{scope,class}`` from the error handler
+"""
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_METRICS_PORT = 9464
+DEFAULT_WINDOWS = (300, 900, 3600)
+CONFIDENCE_BUCKETS = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+FPS_WINDOW = 5.0
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def _window_name(seconds: float) -> str:
+    if seconds % 3600 == 0:
+        return f"{int(seconds // 3600)}h"
+    if seconds % 60 == 0:
+        return f"{int(seconds // 60)}m"
+    return f"{int(seconds)}s"
+
+
+class _BucketCounts:
+    """Cumulative-ready bucket counts for values with fixed upper bounds."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += value
+
+
+class MetricsCollector:
+    """Aggregate engine events into Prometheus metrics.
+
+    Args:
+        windows: Rolling windows in seconds for the rocks/hour gauges
+    """
+
+    def __init__(self, windows: Sequence[float] = DEFAULT_WINDOWS):
+        self.windows = tuple(windows)
+        self.engine = None
+        self._lock = threading.Lock()
+        self._started_at: Optional[float] = None
+        self._idle_baseline = 0.0
+        self._mined_at = deque()
+        self._frame_times = deque()
+        self._confidence: Dict[str, _BucketCounts] = {}
+        self.rocks_mined = 0
+        self.frames = 0
+        self.spider_events: Dict[str, int] = {'detected': 0}
+        self.fire_events = 0
+        self.errors: Dict[str, int] = {}
+
+    def attach(self, engine):
+        """Start collecting from ``engine``; turns its stage timer on."""
+        self.engine = engine
+        self._started_at = engine.pacer.now()
+        self._idle_baseline = self._idle_seconds()
+        engine.stage_timer.enabled = True
+        engine.add_listener(self.on_event)
+        engine.screen_source.add_listener(self.on_frame)
+
+    def detach(self):
+        if self.engine is None:
+            return
+        self.engine.remove_listener(self.on_event)
+        self.engine.screen_source.remove_listener(self.on_frame)
+
+    def _now(self) -> float:
+        return self.engine.pacer.now()
+
+    def _idle_seconds(self) -> float:
+        return sum(values['actual'] for values in self.engine.pacer.stats().values())
+
+    def on_event(self, event: dict):
+        kind = event['kind']
+        with self._lock:
+            if kind == 'detection':
+                counts = self._confidence.get(event['detector'])
+                if counts is None:
+                    counts = self._confidence[event['detector']] = _BucketCounts(CONFIDENCE_BUCKETS)
+                counts.observe(event['confidence'])
+            elif kind == 'rock_mined':
+                self.rocks_mined += 1
+                self._mined_at.append(event['t'])
+                while self._mined_at and event['t'] - self._mined_at[0] > max(self.windows):
+                    self._mined_at.popleft()
+            elif kind == 'spider_detected' and not event.get('during_attack'):
+                self.spider_events['detected'] += 1
+            elif kind == 'spider_attack':
+                name = f"attack_{event['result']}"
+                self.spider_events[name] = self.spider_events.get(name, 0) + 1
+            elif kind == 'fire_detected':
+                self.fire_events += 1
+            elif kind == 'error':
+                error_class = event.get('error_class', 'unknown')
+                self.errors[error_class] = self.errors.get(error_class, 0) + 1
+
+    def on_frame(self, frame):
+        with self._lock:
+            self.frames += 1
+            self._frame_times.append(frame.timestamp)
+            while self._frame_times and frame.timestamp - self._frame_times[0] > FPS_WINDOW:
+                self._frame_times.popleft()
+
+    def rocks_per_hour(self) -> Dict[str, float]:
+        """Return rocks/hour per rolling window (shorter while the session is younger than the window)."""
+        now = self._now()
+        elapsed = now - self._started_at
+        with self._lock:
+            mined = list(self._mined_at)
+        result = {}
+        for window in self.windows:
+            span = min(window, elapsed)
+            count = sum(1 for t in mined if now - t <= window)
+            result[_window_name(window)] = count / span * 3600 if span > 0 else 0.0
+        return result
+
+    def capture_fps(self) -> float:
+        with self._lock:
+            times = list(self._frame_times)
+        if len(times) < 2:
+            return 0.0
+        span = max(times[-1] - times[0], self._now() - times[0])
+        return (len(times) - 1) / span if span > 0 else 0.0
+
+    def idle_fraction(self) -> float:
+        elapsed = self._now() - self._started_at
+        if elapsed <= 0:
+            return 0.0
+        return min(1.0, max(0.0, (self._idle_seconds() - self._idle_baseline) / elapsed))
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        if self.engine is None:
+            return ""
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, float]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix_labels, value in samples:
+                lines.append(f"{name}{suffix_labels} {value}")
+
+        with self._lock:
+            rocks_mined = self.rocks_mined
+            spider_events = dict(self.spider_events)
+            fire_events, errors, frames = self.fire_events, dict(self.errors), self.frames
+            confidence = {name: (c.bounds, list(c.counts), c.count, c.total) for name, c in self._confidence.items()}
+
+        metric("graalera_rocks_mined_total", "counter", "Rocks mined since the collector was attached",
+               [("", rocks_mined)])
+        metric("graalera_rocks_per_hour", "gauge", "Rocks mined per hour over a rolling window",
+               [(_labels(window=name), round(value, 3)) for name, value in self.rocks_per_hour().items()])
+        metric("graalera_frames_captured_total", "counter", "Frames captured", [("", frames)])
+        metric("graalera_capture_fps", "gauge", f"Captured frames per second over the last {FPS_WINDOW:.0f}s",
+               [("", round(self.capture_fps(), 3))])
+        metric("graalera_idle_fraction", "gauge", "Share of the session spent waiting in the pacer",
+               [("", round(self.idle_fraction(), 4))])
+        metric("graalera_time_seconds_total", "counter", "Seconds of the session charged to each category",
+               [(_labels(category=category), round(seconds, 3))
+                for category, seconds in sorted(self.engine.time_breakdown.totals().items())])
+        metric("graalera_spider_events_total", "counter", "Spiders detected and attack outcomes",
+               [(_labels(event=name), value) for name, value in sorted(spider_events.items())])
+        metric("graalera_fire_events_total", "counter", "Fires detected", [("", fire_events)])
+        metric("graalera_errors_total", "counter", "Errors in the engine by error class",
+               [(_labels(**{'class': name}), value) for name, value in sorted(errors.items())])
+        error_stats = self.engine.errors.stats()
+        metric("graalera_error_retries_total", "counter", "Errors retried after a backoff",
+               [(_labels(**{'class': name}), counts['retries']) for name, counts in error_stats.items()])
+        metric("graalera_circuit_breaker_trips_total", "counter", "Times a circuit breaker opened",
+               [(_labels(**{'class': name}), counts['trips']) for name, counts in error_stats.items()])
+        metric("graalera_circuit_breaker_open", "gauge", "1 while the breaker of an error class is open in a scope",
+               [(_labels(scope=scope, **{'class': name}), int(state == 'open'))
+                for (scope, name), state in sorted(self.engine.errors.breakers().items())])
+
+        samples = []
+        for detector, (bounds, counts, count, total) in sorted(confidence.items()):
+            samples += self._histogram_samples(bounds, counts, count, total, detector=detector)
+        metric("graalera_detection_confidence", "histogram", "Confidence reported by each detector", samples)
+
+        samples = []
+        for stage, values in sorted(self.engine.stage_timer.stats().items()):
+            bounds = [b / 1000.0 for b in values['bounds_ms']]
+            samples += self._histogram_samples(bounds, values['counts'], values['count'],
+                                               values['sum_ms'] / 1000.0, stage=stage)
+        metric("graalera_stage_duration_seconds", "histogram", "Duration of each engine stage", samples)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_samples(bounds, counts, count, total, **labels) -> List[Tuple[str, float]]:
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(bounds, counts):
+            cumulative += bucket_count
+            samples.append((f"_bucket{_labels(**labels, le=f'{bound:g}')}", cumulative))
+        samples.append((f"_bucket{_labels(**labels, le='+Inf')}", count))
+        samples.append((f"_sum{_labels(**labels)}", round(total, 6)))
+        samples.append((f"_count{_labels(**labels)}", count))
+        return samples
+
+
+class MetricsServer:
+    """Serve a collector's metrics over HTTP on a background thread.
+
+    Args:
+        collector: Metrics to serve
+        port: TCP port
+        host: Interface to bind; the default keeps the endpoint local
+    """
+
+    def __init__(self, collector: MetricsCollector, port: int = DEFAULT_METRICS_PORT, host: str = '127.0.0.1'):
+        self.collector = collector
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        collector = self.collector
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = collector.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
@@ -0,0 +1,109 @@
+"""Preview rendering on the Tk side.
+
+The macro thread does not render the preview at all. ``PreviewPipeline``
+polls the capture layer for the latest frame from the Tk event loop, at a
+capped frame rate and only while the preview widget is visible, and draws
+it into a single reused ``PhotoImage``.
+"""
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from graalera_macro.capture import ScreenSource
+
+
+class PreviewPipeline:
+    """Render the latest captured frame into a Tk label.
+
+    Args:
+        source: Capture layer to take frames from
+        label: Tk label showing the preview
+        size: Preview (width, height)
+        max_fps: Upper bound on preview renders per second
+        tag: Only preview frames captured with this region tag
+        enabled: Start with the preview turned on
+    """
+
+    def __init__(self, source: ScreenSource, label, size: Tuple[int, int] = (200, 150),
+                 max_fps: float = 5.0, tag: Optional[str] = 'detection', enabled: bool = True):
+        self.source = source
+        self.label = label
+        self.size = size
+        self.tag = tag
+        self.enabled = enabled
+        self.interval_ms = max(1, int(1000 / max_fps))
+        self._root = None
+        self._after_id = None
+        self._last_frame = None
+        self._photo: Optional[ImageTk.PhotoImage] = None
+        # Reused conversion buffers, (height, width, channels)
+        self._resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self._rgb = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self.render_count = 0
+
+    def attach(self, root):
+        """Start the render loop on ``root``'s event loop."""
+        self.detach()
+        self._root = root
+        self._schedule()
+
+    def detach(self):
+        """Stop the render loop."""
+        if self._root is not None and self._after_id is not None:
+            try:
+                self._root.after_cancel(self._after_id)
+            except Exception:
+                pass
+        self._after_id = None
+        self._root = None
+
+    def set_enabled(self, enabled: bool):
+        """Turn the preview on or off. A disabled preview costs nothing per frame."""
+        self.enabled = enabled
+        if not enabled:
+            self.clear()
+
+    def clear(self):
+        """Blank the preview but keep the PhotoImage buffer for reuse."""
+        self._last_frame = None
+        try:
+            self.label.configure(image='')
+        except Exception:
+            pass
+
+    def _schedule(self):
+        if self._root is not None:
+            self._after_id = self._root.after(self.interval_ms, self._tick)
+
+    def _tick(self):
+        self._after_id = None
+        try:
+            if self.enabled and self.label.winfo_viewable():
+                self.render()
+        except Exception as e:
+            print(f"[ERROR] Preview render failed: {e}")
+        self._schedule()
+
+    def render(self) -> bool:
+        """Draw the latest frame if it changed since the last render (Tk thread only).
+
+        Returns:
+            bool: True if a new frame was drawn
+        """
+        frame = self.source.latest_frame(self.tag)
+        if frame is None or frame is self._last_frame:
+            return False
+        self._last_frame = frame
+
+        cv2.resize(frame.image, self.size, dst=self._resized)
+        cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        image = Image.fromarray(self._rgb)
+        if self._photo is None:
+            self._photo = ImageTk.PhotoImage(image=image)
+        else:
+            self._photo.paste(image)
+        self.label.configure(image=self._photo)
+        self.render_count += 1
+        return True
@@ -0,0 +1,175 @@
+"""Named spot profiles persisted to disk.
+
+A profile stores everything the 8-phase setup overlay produces (regions,
+click/attack/character points and the relative offsets derived from them)
+together with confidences and timeouts, so a known spot can be restored in
+one step instead of being selected again.
+"""
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from graalera_macro.config import MacroConfig
+
+PROFILE_VERSION = 1
+DEFAULT_PROFILE_DIR = "profiles"
+
+REGION_FIELDS = ['detection_region_1', 'detection_region_2', 'spider_detection_region', 'fire_detection_region']
+POINT_FIELDS = ['click_point_1', 'click_point_2', 'spider_attack_point_1', 'spider_attack_point_2', 'character_point']
+OFFSET_POINTS = {
+    'relative_mining_offset_1': 'click_point_1',
+    'relative_mining_offset_2': 'click_point_2',
+    'relative_spider_attack_offset_1': 'spider_attack_point_1',
+    'relative_spider_attack_offset_2': 'spider_attack_point_2',
+}
+
+
+class ProfileError(Exception):
+    """Raised when a profile cannot be loaded or does not fit the current screen."""
+
+
+def relative_offsets(config: MacroConfig) -> Dict[str, Optional[Tuple[int, int]]]:
+    """Return the offsets of the mining and attack points from the character point."""
+    offsets = {}
+    for name, point_field in OFFSET_POINTS.items():
+        point = getattr(config, point_field)
+        if point is None or config.character_point is None:
+            offsets[name] = None
+        else:
+            offsets[name] = (point[0] - config.character_point[0], point[1] - config.character_point[1])
+    return offsets
+
+
+class SpotProfile:
+    """A named, saved spot configuration.
+
+    Args:
+        name: Profile name, also used for the file name
+        config: Regions, points, confidences and timeouts
+        screen_size: (width, height) of the screen the profile was recorded on
+    """
+
+    def __init__(self, name: str, config: MacroConfig, screen_size: Optional[Tuple[int, int]] = None,
+                 saved_at: Optional[str] = None):
+        self.name = name
+        self.config = config
+        self.screen_size = tuple(screen_size) if screen_size else None
+        self.saved_at = saved_at
+
+    @property
+    def relative_offsets(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        return relative_offsets(self.config)
+
+    def to_dict(self) -> dict:
+        return {
+            'version': PROFILE_VERSION,
+            'name': self.name,
+            'saved_at': self.saved_at,
+            'screen_size': list(self.screen_size) if self.screen_size else None,
+            'config': self.config.to_dict(),
+            'relative_offsets': self.relative_offsets,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpotProfile":
+        version = data.get('version', PROFILE_VERSION)
+        if version > PROFILE_VERSION:
+            raise ProfileError(f"Profile version {version} is newer than supported ({PROFILE_VERSION})")
+        if 'config' not in data:
+            raise ProfileError("Profile has no config section")
+        return cls(data.get('name', 'unnamed'), MacroConfig.from_dict(data['config']),
+                   data.get('screen_size'), data.get('saved_at'))
+
+    def validate(self, screen_size: Optional[Tuple[int, int]] = None) -> List[str]:
+        """Return a list of problems that prevent using the profile on this screen.
+
+        Args:
+            screen_size: Current (width, height); skips the on-screen checks if None
+        """
+        problems = [f"missing {name}" for name in self.config.missing_fields()]
+        if screen_size is None:
+            return problems
+
+        width, height = screen_size
+        if self.screen_size and tuple(self.screen_size) != (width, height):
+            problems.append(
+                f"saved for a {self.screen_size[0]}x{self.screen_size[1]} screen, current screen is {width}x{height}")
+        for name in REGION_FIELDS:
+            region = getattr(self.config, name)
+            if region is None:
+                continue
+            x, y, w, h = region
+            if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > width or y + h > height:
+                problems.append(f"{name} {region} is outside the screen")
+        for name in POINT_FIELDS:
+            point = getattr(self.config, name)
+            if point is None:
+                continue
+            if not (0 <= point[0] < width and 0 <= point[1] < height):
+                problems.append(f"{name} {point} is outside the screen")
+        return problems
+
+
+class ProfileStore:
+    """Save and load ``SpotProfile`` JSON files in a directory."""
+
+    def __init__(self, directory: str = DEFAULT_PROFILE_DIR):
+        self.directory = directory
+
+    def path(self, name: str) -> str:
+        """Return the file path for profile ``name``."""
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name.strip()) or 'unnamed'
+        return os.path.join(self.directory, f"{safe_name}.json")
+
+    def list(self) -> List[str]:
+        """Return the names of all saved profiles, sorted."""
+        if not os.path.isdir(self.directory):
+            return []
+        names = []
+        for filename in sorted(os.listdir(self.directory)):
+            if filename.endswith('.json'):
+                names.append(filename[:-len('.json')])
+        return names
+
+    def save(self, profile: SpotProfile) -> str:
+        """Write ``profile`` to disk and return its path."""
+        os.makedirs(self.directory, exist_ok=True)
+        profile.saved_at = datetime.now().isoformat(timespec='seconds')
+        path = self.path(profile.name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profile.to_dict(), f, indent=2)
+        # Replace atomically so a crash never leaves a half-written profile
+        os.replace(tmp_path, path)
+        return path
+
+    def load(self, name: str) -> SpotProfile:
+        """Load profile ``name``; raises ProfileError if missing or invalid."""
+        path = self.path(name)
+        if not os.path.exists(path):
+            raise ProfileError(f"No profile named '{name}' in {self.directory}")
+        return load_profile_file(path)
+
+    def delete(self, name: str):
+        path = self.path(name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def load_profile_file(path: str) -> SpotProfile:
+    """Load a profile file, or wrap a bare ``MacroConfig`` JSON file in a profile."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ProfileError(f"Could not read profile {path}: {e}")
+    # Hand-edited files can have wrong types or miss keys; report them like unreadable files
+    try:
+        if 'config' not in data:
+            name = os.path.splitext(os.path.basename(path))[0]
+            return SpotProfile(name, MacroConfig.from_dict(data))
+        return SpotProfile.from_dict(data)
+    except (TypeError, ValueError, KeyError, AttributeError) as e:
+        raise ProfileError(f"Invalid profile {path}: {e}")
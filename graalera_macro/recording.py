@@ -0,0 +1,411 @@
+"""Session recording.
+
+``SessionRecorder`` streams every captured region frame, together with the
+detector results and clicks of the same tick, into an append-only chunked
+file. The macro thread only enqueues references; encoding and disk writes
+happen on a background writer with a bounded queue, and records are dropped
+(and counted) rather than ever blocking the live loop.
+
+File layout::
+
+    MAGIC (8 bytes) | version (u32) | metadata length (u32) | JSON metadata
+    chunk*
+
+    chunk: b'CHNK' | header length (u32) | payload length (u32) | JSON header | payload
+
+The chunk header lists the frames (with the offset and encoding of their
+pixels inside the payload), detections and input events of the chunk. Frames
+of the pixel-art game usually have few distinct colours, so they are stored
+as a palette plus one index byte per pixel; either way the buffer is
+compressed with zlib at its fastest level. A truncated last chunk (e.g. after
+a crash) is ignored by ``SessionReader``.
+"""
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from graalera_macro.clock import SYSTEM_CLOCK
+
+MAGIC = b'GEREC\0\0\0'
+RECORDING_VERSION = 1
+CHUNK_MAGIC = b'CHNK'
+DEFAULT_RECORDING_DIR = "recordings"
+RECORDING_EXTENSION = ".gerec"
+
+_PREAMBLE = struct.Struct('<8sII')
+_CHUNK = struct.Struct('<4sII')
+
+
+class RecordingError(Exception):
+    """Raised when a recording cannot be read."""
+
+
+class RecordedFrame(NamedTuple):
+    """A frame read back from a recording."""
+    seq: int
+    timestamp: float
+    tag: Optional[str]
+    region: Tuple[int, int, int, int]
+    image: np.ndarray
+    detections: List[dict]
+
+
+def encode_frame(image: np.ndarray, level: int = 1) -> Tuple[str, bytes, Optional[int]]:
+    """Compress a BGR frame.
+
+    Returns:
+        tuple: (encoding, data, palette size); encoding is 'palette' or 'raw'
+    """
+    if image.ndim == 3 and image.shape[2] == 3 and image.dtype == np.uint8:
+        pixels = image.reshape(-1, 3)
+        packed = pixels[:, 0].astype(np.uint32) | (pixels[:, 1].astype(np.uint32) << 8) | (pixels[:, 2].astype(np.uint32) << 16)
+        colors, indices = np.unique(packed, return_inverse=True)
+        if len(colors) <= 256:
+            palette = np.stack([colors & 0xFF, (colors >> 8) & 0xFF, (colors >> 16) & 0xFF], axis=1).astype(np.uint8)
+            data = palette.tobytes() + indices.astype(np.uint8).tobytes()
+            return 'palette', zlib.compress(data, level), len(colors)
+    return 'raw', zlib.compress(np.ascontiguousarray(image).tobytes(), level), None
+
+
+def decode_frame(encoding: str, data: bytes, shape, dtype: str = '|u1', palette_size: Optional[int] = None) -> np.ndarray:
+    """Inverse of ``encode_frame``."""
+    raw = zlib.decompress(data)
+    if encoding == 'palette':
+        palette = np.frombuffer(raw[:palette_size * 3], dtype=np.uint8).reshape(-1, 3)
+        indices = np.frombuffer(raw[palette_size * 3:], dtype=np.uint8)
+        return palette[indices].reshape(shape)
+    return np.frombuffer(raw, dtype=np.dtype(dtype)).reshape(shape).copy()
+
+
+class SessionRecorder:
+    """Record frames, detections and clicks of a session to ``path``.
+
+    Frames are not copied: the engine never modifies a captured frame after
+    ``grab`` returns it, so the writer can encode it later.
+
+    Args:
+        path: Recording file to create
+        metadata: Extra JSON-serializable information stored in the file header
+        queue_size: Maximum number of records waiting for the writer
+        chunk_frames: Frames per chunk
+        chunk_seconds: Close a chunk after this long even if it is not full
+        compression_level: zlib level (1 is fastest)
+    """
+
+    def __init__(self, path: str, metadata: Optional[dict] = None, queue_size: int = 512,
+                 chunk_frames: int = 64, chunk_seconds: float = 2.0, compression_level: int = 1):
+        self.path = path
+        self.metadata = dict(metadata or {})
+        self.chunk_frames = chunk_frames
+        self.chunk_seconds = chunk_seconds
+        self.compression_level = compression_level
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._screen_source = None
+        self._input_dispatcher = None
+        # Detections are stamped on the screen source's clock, like its frames
+        self._clock = SYSTEM_CLOCK
+        self.recorded = {'frames': 0, 'detections': 0, 'inputs': 0}
+        self.dropped = 0
+        self.chunks_written = 0
+        self.bytes_written = 0
+
+    @classmethod
+    def in_directory(cls, directory: str = DEFAULT_RECORDING_DIR, **kwargs) -> "SessionRecorder":
+        """Create a recorder writing a timestamped file in ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        name = datetime.now().strftime("session_%Y%m%d_%H%M%S") + RECORDING_EXTENSION
+        return cls(os.path.join(directory, name), **kwargs)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Open the file and start the writer thread."""
+        if self.running:
+            return
+        metadata = dict(self.metadata)
+        metadata.update({
+            'version': RECORDING_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            # Timestamps are perf_counter values; this pair maps them to wall-clock time
+            'perf_counter_origin': time.perf_counter(),
+            'wall_clock_origin': time.time(),
+        })
+        metadata_bytes = json.dumps(metadata).encode('utf-8')
+        self._file = open(self.path, 'wb')
+        self._file.write(_PREAMBLE.pack(MAGIC, RECORDING_VERSION, len(metadata_bytes)))
+        self._file.write(metadata_bytes)
+        self._file.flush()
+        self.bytes_written = self._file.tell()
+        self._thread = threading.Thread(target=self._run, name="SessionRecorder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Write everything still queued and close the file."""
+        self.detach()
+        if self._thread is None:
+            return
+        # The sentinel must not be dropped, so wait for room if the queue is full
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("[ERROR] Recorder queue stuck, closing without flushing")
+        self._thread.join(timeout)
+        self._thread = None
+
+    def attach(self, screen_source, input_dispatcher=None):
+        """Record every frame grabbed from ``screen_source`` and every finished input command."""
+        self._screen_source = screen_source
+        self._clock = getattr(screen_source, 'clock', SYSTEM_CLOCK)
+        screen_source.add_listener(self.on_frame)
+        if input_dispatcher is not None:
+            self._input_dispatcher = input_dispatcher
+            input_dispatcher.add_listener(self.on_input)
+
+    def detach(self):
+        if self._screen_source is not None:
+            self._screen_source.remove_listener(self.on_frame)
+            self._screen_source = None
+        if self._input_dispatcher is not None:
+            self._input_dispatcher.remove_listener(self.on_input)
+            self._input_dispatcher = None
+
+    def _put(self, record: tuple):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def on_frame(self, frame):
+        """Queue a ``CapturedFrame``. Never blocks."""
+        self._put(('frame', frame))
+
+    def on_detection(self, seq: Optional[int], tag: Optional[str], templates, confidence: float, location, size):
+        """Queue the result of matching ``templates`` against frame ``seq``. Never blocks."""
+        self._put(('detection', {
+            'seq': seq,
+            'tag': tag,
+            'templates': list(templates),
+            'confidence': round(float(confidence), 4),
+            'location': list(location) if location is not None else None,
+            'size': list(size) if size is not None else None,
+            't': self._clock.now(),
+        }))
+
+    def on_input(self, command):
+        """Queue a finished ``InputCommand``. Never blocks."""
+        self._put(('input', {
+            'kind': command.kind,
+            'point': list(command.point) if command.point is not None else None,
+            'button': command.button,
+            'backend': command.backend,
+            'succeeded': command.succeeded,
+            't': command.finished_at,
+        }))
+
+    def _run(self):
+        frames, detections, inputs, payload = [], [], [], []
+        payload_size = 0
+        chunk_started = time.perf_counter()
+        while True:
+            try:
+                record = self._queue.get(timeout=self.chunk_seconds)
+            except queue.Empty:
+                record = ()
+            if record is None:
+                break
+
+            if not record:
+                # Nothing arrived for chunk_seconds: the last frame's detections are in
+                if frames or detections or inputs:
+                    self._write_chunk(frames, detections, inputs, payload)
+                    frames, detections, inputs, payload = [], [], [], []
+                    payload_size = 0
+                chunk_started = time.perf_counter()
+            else:
+                kind, data = record
+                if kind == 'frame':
+                    # Close the chunk before a new frame so detections stay with their frame
+                    if frames and (len(frames) >= self.chunk_frames
+                                   or time.perf_counter() - chunk_started >= self.chunk_seconds):
+                        self._write_chunk(frames, detections, inputs, payload)
+                        frames, detections, inputs, payload = [], [], [], []
+                        payload_size = 0
+                        chunk_started = time.perf_counter()
+                    try:
+                        encoding, encoded, palette_size = encode_frame(data.image, self.compression_level)
+                    except Exception as e:
+                        print(f"[ERROR] Failed to encode recorded frame: {e}")
+                        continue
+                    frames.append({
+                        'seq': getattr(data, 'seq', None),
+                        't': data.timestamp,
+                        'tag': data.tag,
+                        'region': list(data.region),
+                        'shape': list(data.image.shape),
+                        'dtype': data.image.dtype.str,
+                        'encoding': encoding,
+                        'palette_size': palette_size,
+                        'offset': payload_size,
+                        'length': len(encoded),
+                    })
+                    payload.append(encoded)
+                    payload_size += len(encoded)
+                    self.recorded['frames'] += 1
+                elif kind == 'detection':
+                    detections.append(data)
+                    self.recorded['detections'] += 1
+                else:
+                    inputs.append(data)
+                    self.recorded['inputs'] += 1
+
+        if frames or detections or inputs:
+            self._write_chunk(frames, detections, inputs, payload)
+        self._file.close()
+        self._file = None
+
+    def _write_chunk(self, frames, detections, inputs, payload):
+        header = json.dumps({'frames': frames, 'detections': detections, 'inputs': inputs},
+                            separators=(',', ':')).encode('utf-8')
+        data = b''.join(payload)
+        try:
+            self._file.write(_CHUNK.pack(CHUNK_MAGIC, len(header), len(data)))
+            self._file.write(header)
+            self._file.write(data)
+            self._file.flush()
+        except OSError as e:
+            print(f"[ERROR] Failed to write recording chunk: {e}")
+            return
+        self.chunks_written += 1
+        self.bytes_written += _CHUNK.size + len(header) + len(data)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'path': self.path,
+            'recorded': dict(self.recorded),
+            'dropped': self.dropped,
+            'chunks': self.chunks_written,
+            'bytes': self.bytes_written,
+            'pending': self._queue.qsize(),
+        }
+
+    def summary(self) -> str:
+        return (f"Recorded {self.recorded['frames']} frames, {self.recorded['detections']} detections, "
+                f"{self.recorded['inputs']} inputs to {self.path} "
+                f"({self.bytes_written / (1024 * 1024):.1f} MiB, {self.dropped} dropped)")
+
+
+class SessionReader:
+    """Read a recording written by ``SessionRecorder``.
+
+    Args:
+        path: Recording file to open
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, 'rb') as f:
+                magic, version, metadata_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+                self.metadata = json.loads(f.read(metadata_length).decode('utf-8'))
+        except (OSError, struct.error, ValueError) as e:
+            raise RecordingError(f"Could not read recording {path}: {e}")
+        if magic != MAGIC:
+            raise RecordingError(f"{path} is not a session recording")
+        if version > RECORDING_VERSION:
+            raise RecordingError(f"Recording {path} has version {version}, newest supported is {RECORDING_VERSION}")
+        self._data_offset = _PREAMBLE.size + metadata_length
+
+    def _iter_chunks(self, read_payload: bool = True) -> Iterator[Tuple[dict, Optional[bytes], int]]:
+        file_size = os.path.getsize(self.path)
+        with open(self.path, 'rb') as f:
+            f.seek(self._data_offset)
+            while True:
+                preamble = f.read(_CHUNK.size)
+                if len(preamble) < _CHUNK.size:
+                    return
+                magic, header_length, payload_length = _CHUNK.unpack(preamble)
+                if magic != CHUNK_MAGIC:
+                    print(f"[WARN] Corrupt chunk in {self.path}, stopping")
+                    return
+                header_bytes = f.read(header_length)
+                payload_offset = f.tell()
+                if len(header_bytes) < header_length or payload_offset + payload_length > file_size:
+                    return
+                if read_payload:
+                    payload = f.read(payload_length)
+                else:
+                    payload = None
+                    f.seek(payload_length, os.SEEK_CUR)
+                yield json.loads(header_bytes.decode('utf-8')), payload, payload_offset
+
+    def chunks(self) -> Iterator[Tuple[dict, bytes]]:
+        """Yield (chunk header, payload) pairs, stopping at a truncated or corrupt chunk."""
+        for header, payload, _ in self._iter_chunks():
+            yield header, payload
+
+    def frame_index(self) -> List[dict]:
+        """Return the headers of all frames, each with the absolute ``file_offset`` of its pixels.
+
+        Only chunk headers are read, so this is cheap even for long sessions.
+        """
+        index = []
+        for header, _, payload_offset in self._iter_chunks(read_payload=False):
+            for spec in header['frames']:
+                spec = dict(spec)
+                spec['file_offset'] = payload_offset + spec['offset']
+                index.append(spec)
+        return index
+
+    def load_frame(self, spec: dict, f=None) -> np.ndarray:
+        """Decode one frame listed by ``frame_index``.
+
+        Args:
+            f: Open binary file of the recording to read from (opened if None)
+        """
+        if f is None:
+            with open(self.path, 'rb') as f:
+                return self.load_frame(spec, f)
+        f.seek(spec['file_offset'])
+        return decode_frame(spec['encoding'], f.read(spec['length']), spec['shape'], spec['dtype'], spec['palette_size'])
+
+    def frames(self, tag: Optional[str] = None) -> Iterator[RecordedFrame]:
+        """Yield recorded frames in order, each with the detections made on it.
+
+        Detections are matched to frames by ``seq``; those of a chunk's last
+        frames may have been written with the next chunk, so each chunk's
+        frames are held back until the next chunk has been read.
+        """
+        pending: List[RecordedFrame] = []
+        for header, payload in self.chunks():
+            detections_by_seq: Dict[int, List[dict]] = {}
+            for detection in header['detections']:
+                detections_by_seq.setdefault(detection['seq'], []).append(detection)
+            for frame in pending:
+                frame.detections.extend(detections_by_seq.pop(frame.seq, []))
+                yield frame
+            pending = []
+            for spec in header['frames']:
+                if tag is not None and spec['tag'] != tag:
+                    continue
+                data = payload[spec['offset']:spec['offset'] + spec['length']]
+                image = decode_frame(spec['encoding'], data, spec['shape'], spec['dtype'], spec['palette_size'])
+                pending.append(RecordedFrame(spec['seq'], spec['t'], spec['tag'], tuple(spec['region']), image,
+                                             detections_by_seq.get(spec['seq'], [])))
+        yield from pending
+
+    def inputs(self) -> Iterator[dict]:
+        """Yield the recorded input events in order."""
+        for header, _ in self.chunks():
+            yield from header['inputs']
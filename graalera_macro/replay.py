@@ -0,0 +1,267 @@
+"""Replay screen sources.
+
+``ReplaySource`` is a ``ScreenSource`` that plays back frames instead of
+capturing the screen, so the engine can run offline against:
+
+* a session recorded by ``SessionRecorder`` (``*.gerec``),
+* a directory of PNGs such as ``debug_screenshots/``,
+* a video file readable by ``cv2.VideoCapture``.
+
+At ``speed`` 1.0 the source behaves like a live screen: ``grab`` returns the
+frame that was on screen at the current replay time; on a ``VirtualClock``
+that replays as fast as the engine runs. With ``speed=None`` every ``grab``
+advances to the next frame of its stream.
+Pair it with ``InputDispatcher.capturing()`` so the clicks the engine makes
+are recorded instead of executed.
+"""
+import os
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from graalera_macro.capture import ScreenSource
+from graalera_macro.recording import RECORDING_EXTENSION, SessionReader
+
+DEFAULT_SCREEN_SIZE = (1920, 1080)
+
+# Timestamp in debug screenshot names, e.g. template_rock_phase_3_20251112_113255_674115_conf_0.63.png
+_DEBUG_TIMESTAMP = re.compile(r'_(\d{8})_(\d{6})_(\d{6})_')
+
+
+def _crop(image: np.ndarray, region: Tuple[int, int, int, int]) -> np.ndarray:
+    """Crop ``region`` out of a full-screen image; images smaller than the region are returned as-is."""
+    x, y, w, h = region
+    if image.shape[0] >= y + h and image.shape[1] >= x + w:
+        return image[y:y + h, x:x + w]
+    return image
+
+
+class ReplaySource(ScreenSource):
+    """Base class for sources that play back a sequence of frames.
+
+    Args:
+        speed: Playback speed relative to the original timing, or None for as fast as possible
+        loop: Start over at the end instead of repeating the last frame
+        clock: Time source the original timing is replayed against (default: real time)
+    """
+
+    def __init__(self, speed: Optional[float] = 1.0, loop: bool = False, clock=None):
+        super().__init__(clock)
+        self.speed = speed if speed else None
+        self.loop = loop
+        self.finished = False
+        self._started_at: Optional[float] = None
+
+    def replay_time(self) -> float:
+        """Seconds of original time elapsed since the first grab."""
+        if self._started_at is None:
+            self._started_at = self.clock.now()
+        return (self.clock.now() - self._started_at) * self.speed
+
+    def restart(self):
+        self._started_at = None
+        self.finished = False
+
+
+class RecordingSource(ReplaySource):
+    """Play back a session recorded by ``SessionRecorder``.
+
+    Frames are looked up by (tag, region), so the spider, fire and both
+    detection regions each follow their own recorded stream. Only the
+    frame index is held in memory; pixels are decoded on demand.
+    """
+
+    def __init__(self, path: str, speed: Optional[float] = 1.0, loop: bool = False, clock=None):
+        super().__init__(speed, loop, clock)
+        self.reader = SessionReader(path)
+        self.metadata = self.reader.metadata
+        self._streams: Dict[Tuple, List[dict]] = {}
+        for spec in self.reader.frame_index():
+            self._streams.setdefault((spec['tag'], tuple(spec['region'])), []).append(spec)
+            self._streams.setdefault((spec['tag'], None), []).append(spec)
+        self._times = {key: [spec['t'] for spec in specs] for key, specs in self._streams.items()}
+        self._positions: Dict[Tuple, int] = {}
+        # Streams grabbed from, and whether each has run out (speed=None)
+        self._exhausted: Dict[Tuple, bool] = {}
+        self._first_timestamp = min((specs[0]['t'] for specs in self._streams.values()), default=0.0)
+        self._last_timestamp = max((specs[-1]['t'] for specs in self._streams.values()), default=0.0)
+        self._pending_tag: Optional[str] = None
+        self._file = open(path, 'rb')
+
+    def screen_size(self) -> Tuple[int, int]:
+        return tuple(self.metadata.get('screen_size') or DEFAULT_SCREEN_SIZE)
+
+    def restart(self):
+        super().restart()
+        self._positions.clear()
+        self._exhausted.clear()
+
+    def _stream(self, region, tag) -> Tuple[Optional[Tuple], List[dict]]:
+        for key in ((tag, region), (tag, None)):
+            if key in self._streams:
+                return key, self._streams[key]
+        return None, []
+
+    def _grab(self, region):
+        key, specs = self._stream(region, self._pending_tag)
+        if not specs:
+            # Nothing was recorded for this region: show an empty screen
+            return np.zeros((region[3], region[2], 3), dtype=np.uint8)
+
+        if self.speed is None:
+            index = self._positions.get(key, 0)
+            self._positions[key] = index + 1
+            self._exhausted[key] = index >= len(specs)
+            # A stream that ran out repeats its last frame until every stream in use has run out
+            exhausted = all(self._exhausted.values())
+        else:
+            target = self._first_timestamp + self.replay_time()
+            index = max(0, bisect_right(self._times[key], target) - 1)
+            exhausted = target > self._last_timestamp
+        if exhausted:
+            if self.loop:
+                self.restart()
+                return self._grab(region)
+            self.finished = True
+        return self.reader.load_frame(specs[min(index, len(specs) - 1)], self._file)
+
+    def grab(self, region, tag=None):
+        # Remember the tag so _grab can pick the matching recorded stream
+        self._pending_tag = tag
+        return super().grab(region, tag)
+
+    def close(self):
+        self._file.close()
+
+
+class ImageDirectorySource(ReplaySource):
+    """Play back a directory of images in file name order.
+
+    Region captures (like the files in ``debug_screenshots/``) are returned
+    as they are; full-screen images are cropped to the requested region.
+    When every file name carries a timestamp (as debug screenshots do) the
+    images are played in timestamp order with their original spacing;
+    otherwise they are played in name order, ``1 / fps`` apart.
+    """
+
+    def __init__(self, directory: str, speed: Optional[float] = 1.0, loop: bool = False, fps: float = 10.0,
+                 clock=None):
+        super().__init__(speed, loop, clock)
+        self.paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))
+        )
+        if not self.paths:
+            raise ValueError(f"No images in {directory}")
+        self.frame_interval = 1.0 / fps
+        self.timestamps = self._order_by_timestamp()
+        self._position = 0
+        self._cache: Dict[int, np.ndarray] = {}
+
+    def _order_by_timestamp(self) -> List[float]:
+        """Sort ``paths`` by the timestamps in their names and return the offsets."""
+        from datetime import datetime
+
+        parsed = []
+        for path in self.paths:
+            match = _DEBUG_TIMESTAMP.search(os.path.basename(path))
+            if not match:
+                return [i * self.frame_interval for i in range(len(self.paths))]
+            parsed.append((datetime.strptime(''.join(match.groups()), "%Y%m%d%H%M%S%f").timestamp(), path))
+        parsed.sort()
+        self.paths = [path for _, path in parsed]
+        return [t - parsed[0][0] for t, _ in parsed]
+
+    def screen_size(self) -> Tuple[int, int]:
+        height, width = self._image(0).shape[:2]
+        return (width, height) if width >= DEFAULT_SCREEN_SIZE[0] // 2 else DEFAULT_SCREEN_SIZE
+
+    def restart(self):
+        super().restart()
+        self._position = 0
+
+    def _image(self, index: int) -> np.ndarray:
+        if index not in self._cache:
+            image = cv2.imread(self.paths[index])
+            if image is None:
+                raise ValueError(f"Could not read {self.paths[index]}")
+            self._cache[index] = image
+        return self._cache[index]
+
+    def _grab(self, region):
+        if self.speed is None:
+            index = self._position
+            self._position += 1
+            exhausted = index >= len(self.paths)
+        else:
+            replay_time = self.replay_time()
+            index = max(0, bisect_right(self.timestamps, replay_time) - 1)
+            exhausted = replay_time > self.timestamps[-1] + self.frame_interval
+        if exhausted:
+            if self.loop:
+                self.restart()
+                return self._grab(region)
+            self.finished = True
+            index = min(index, len(self.paths) - 1)
+        return _crop(self._image(index), region)
+
+
+class VideoSource(ReplaySource):
+    """Play back a screen recording through ``cv2.VideoCapture``."""
+
+    def __init__(self, path: str, speed: Optional[float] = 1.0, loop: bool = False, clock=None):
+        super().__init__(speed, loop, clock)
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError(f"Could not open video {path}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self._frame: Optional[np.ndarray] = None
+        self._frame_index = -1
+
+    def screen_size(self) -> Tuple[int, int]:
+        width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return (width, height) if width and height else DEFAULT_SCREEN_SIZE
+
+    def restart(self):
+        super().restart()
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self._frame_index = -1
+
+    def _read(self) -> bool:
+        ok, frame = self.capture.read()
+        if not ok:
+            return False
+        self._frame = frame
+        self._frame_index += 1
+        return True
+
+    def _grab(self, region):
+        target = self._frame_index + 1 if self.speed is None else int(self.replay_time() * self.fps)
+        # Decode sequentially up to the frame that is due; seeking is slow and inexact
+        while self._frame_index < target or self._frame is None:
+            if not self._read():
+                if self.loop and self._frame_index > 0:
+                    self.restart()
+                    return self._grab(region)
+                self.finished = True
+                break
+        if self._frame is None:
+            raise ValueError(f"Video {self.path} has no frames")
+        return _crop(self._frame, region)
+
+    def close(self):
+        self.capture.release()
+
+
+def open_replay(path: str, speed: Optional[float] = 1.0, loop: bool = False, clock=None) -> ReplaySource:
+    """Open a recording, image directory or video as a ``ReplaySource``."""
+    if os.path.isdir(path):
+        return ImageDirectorySource(path, speed, loop, clock=clock)
+    if path.endswith(RECORDING_EXTENSION):
+        return RecordingSource(path, speed, loop, clock)
+    return VideoSource(path, speed, loop, clock)
@@ -0,0 +1,19 @@
+"""Locating bundled resources."""
+import os
+import sys
+
+
+def is_frozen() -> bool:
+    """Return whether this is a bundled (PyInstaller) build, whose resources cannot change."""
+    return bool(getattr(sys, 'frozen', False) or hasattr(sys, '_MEIPASS'))
+
+
+def resource_path(relative_path):
+    """ Get absolute path to resource, works for dev and for PyInstaller """
+    try:
+        # PyInstaller creates a temp folder and stores path in _MEIPASS
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
@@ -0,0 +1,397 @@
+"""Local stand-in for the game.
+
+``GameSimulator`` is a ``ScreenSource`` that renders a synthetic screen from
+the real sprites in ``assets/``: two rock spots that go through
+``rock_phase_1..3`` as they are clicked, show ``rock_phase_4`` once mined
+and respawn after a delay; spiders walking through the spider region; and
+occasional fire. It reacts to the clicks of a ``CapturingBackend`` and
+keeps ground truth, so rocks/hour, detection accuracy and the timing of
+each mining cycle can be measured end to end without the live game.
+
+With a ``VirtualClock`` simulated hours run in seconds and a fixed seed
+gives the same result every time.
+
+Example::
+
+    clock = VirtualClock()
+    sim = GameSimulator(GameSimulator.default_config(), clock=clock, seed=1)
+    engine = MacroEngine(sim.config, sim, sim.input_dispatcher(), recorder=sim.scorer, clock=clock)
+"""
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from graalera_macro.capture import ScreenSource
+from graalera_macro.config import MacroConfig
+from graalera_macro.input import CapturingBackend, InputDispatcher
+from graalera_macro.stats import RunningPercentile
+
+BACKGROUND_BGR = (58, 110, 72)
+CLICK_RADIUS = 12
+SPIDER_SPRITES = ['spider1.png', 'spider2.png', 'spider3.png', 'spider4.png']
+
+
+class SimRock:
+    """One rock spot.
+
+    ``phase`` is 1-3 while the rock can be mined, 4 while the mined rock is
+    shown and 0 while the spot is empty waiting to respawn.
+    """
+
+    def __init__(self, spot: int, center: Tuple[int, int], click_point: Tuple[int, int]):
+        self.spot = spot
+        self.center = center
+        self.click_point = click_point
+        self.phase = 1
+        self.hits_left = 0
+        self.phase_until: Optional[float] = None
+        self.spawned_at: Optional[float] = None
+        self.first_hit_at: Optional[float] = None
+
+
+class SimSpider:
+    def __init__(self, position: Tuple[float, float], velocity: Tuple[float, float], hits_left: int, sprite: str):
+        self.position = position
+        self.velocity = velocity
+        self.hits_left = hits_left
+        self.sprite = sprite
+
+
+class DetectionScorer:
+    """Compare the engine's detection results with the simulator's ground truth.
+
+    Pass it to ``MacroEngine`` as ``recorder``; it implements ``on_detection``.
+    """
+
+    def __init__(self, simulator: "GameSimulator"):
+        self.simulator = simulator
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def on_detection(self, seq, tag, templates, confidence, location, size):
+        truth = self.simulator.truth_for_frame(seq)
+        if truth is None:
+            return
+        kind = self.simulator.template_kind(templates)
+        expected = kind in truth
+        detected = confidence > 0
+        outcome = ('tp' if detected else 'fn') if expected else ('fp' if detected else 'tn')
+        counts = self.counts.setdefault(kind, {'tp': 0, 'fp': 0, 'tn': 0, 'fn': 0})
+        counts[outcome] += 1
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for kind, c in self.counts.items():
+            total = sum(c.values())
+            report[kind] = dict(c)
+            report[kind]['accuracy'] = (c['tp'] + c['tn']) / total if total else 0.0
+            report[kind]['precision'] = c['tp'] / (c['tp'] + c['fp']) if c['tp'] + c['fp'] else 1.0
+            report[kind]['recall'] = c['tp'] / (c['tp'] + c['fn']) if c['tp'] + c['fn'] else 1.0
+        return report
+
+
+class GameSimulator(ScreenSource):
+    """Synthetic game screen driven by simulated time.
+
+    Args:
+        config: Spot layout; rocks are drawn centred in the detection regions
+            and mined by clicks near the click points
+        hits_per_phase: Clicks needed to advance each of rock phases 1, 2 and 3
+        respawn_delay: (min, max) seconds an empty spot waits before a new rock appears
+        depleted_duration: Seconds the mined rock (phase 4) stays visible
+        click_latency: Seconds between a click and its effect on the screen
+        spider_rate: Spiders spawned per minute (0 disables spiders)
+        spider_speed: Spider speed in pixels per second
+        spider_hits: Clicks at an attack point needed to kill a spider
+        fire_rate: Fires started per hour (0 disables fire)
+        screen_size: (width, height) of the simulated screen
+        seed: Random seed, for reproducible runs
+        clock: Time source the world advances on (default: real time)
+    """
+
+    def __init__(self, config: MacroConfig, hits_per_phase=(2, 2, 2), respawn_delay=(3.0, 8.0),
+                 depleted_duration: float = 1.5, click_latency: float = 0.15, spider_rate: float = 0.0,
+                 spider_speed: float = 40.0, spider_hits: int = 3, fire_rate: float = 0.0,
+                 screen_size: Tuple[int, int] = (1920, 1080), seed: Optional[int] = None, clock=None):
+        super().__init__(clock)
+        from graalera_macro.detection import TemplateMatcher
+
+        self.config = config
+        self.hits_per_phase = tuple(hits_per_phase)
+        self.respawn_delay = respawn_delay
+        self.depleted_duration = depleted_duration
+        self.click_latency = click_latency
+        self.spider_rate = spider_rate
+        self.spider_speed = spider_speed
+        self.spider_hits = spider_hits
+        self.fire_rate = fire_rate
+        self._screen_size = screen_size
+        self.random = random.Random(seed)
+        self.sprites = TemplateMatcher(use_pack=True)
+        self.scorer = DetectionScorer(self)
+        self._lock = threading.RLock()
+        self._pending_clicks: List[Tuple[float, Tuple[int, int], str]] = []
+        self._truth: Dict[int, set] = {}
+        self._last_truth: set = set()
+        self._started_at: Optional[float] = None
+        self._last_update: Optional[float] = None
+
+        self.rocks = [
+            SimRock(1, self._center(config.detection_region_1), config.click_point_1),
+            SimRock(2, self._center(config.detection_region_2), config.click_point_2),
+        ]
+        self.spider: Optional[SimSpider] = None
+        self.fire = False
+        self.fire_started_at: Optional[float] = None
+
+        # Ground truth counters
+        self.rocks_mined = 0
+        self.clicks = 0
+        self.wasted_clicks = 0
+        self.spiders_spawned = 0
+        self.spiders_killed = 0
+        self.time_to_find = RunningPercentile(1000)
+        self.time_to_deplete = RunningPercentile(1000)
+
+    @staticmethod
+    def default_config() -> MacroConfig:
+        """A layout on a 1920x1080 screen with every region and point set."""
+        return MacroConfig(
+            detection_region_1=(860, 420, 100, 100),
+            detection_region_2=(1060, 420, 100, 100),
+            click_point_1=(910, 470),
+            click_point_2=(1110, 470),
+            spider_detection_region=(760, 320, 500, 400),
+            spider_attack_point_1=(960, 560),
+            spider_attack_point_2=(1060, 560),
+            character_point=(1010, 560),
+            fire_detection_region=(960, 600, 100, 100),
+        )
+
+    @staticmethod
+    def _center(region) -> Tuple[int, int]:
+        x, y, w, h = region
+        return x + w // 2, y + h // 2
+
+    def input_dispatcher(self) -> InputDispatcher:
+        """Return a dispatcher whose clicks go to this simulator instead of the mouse.
+
+        On a virtual clock the dispatcher runs synchronously so clicks land at
+        a deterministic simulated time.
+        """
+        backend = CapturingBackend('simulator', on_event=self.on_input_event, clock=self.clock)
+        return InputDispatcher.capturing(backend, clock=self.clock, synchronous=self.clock.virtual)
+
+    def screen_size(self) -> Tuple[int, int]:
+        return self._screen_size
+
+    # --- Simulation ---
+
+    def _now(self) -> float:
+        return self.clock.now()
+
+    def _start(self, now: float):
+        self._started_at = self._last_update = now
+        for rock in self.rocks:
+            self._spawn_rock(rock, now)
+
+    def _spawn_rock(self, rock: SimRock, now: float):
+        rock.phase = 1
+        rock.hits_left = self.hits_per_phase[0]
+        rock.phase_until = None
+        rock.spawned_at = now
+        rock.first_hit_at = None
+
+    def on_input_event(self, event: dict):
+        """Receive an event from ``CapturingBackend`` (dispatcher thread)."""
+        if event['kind'] != 'click' or event['point'] is None:
+            return
+        with self._lock:
+            self.clicks += 1
+            # The game reacts to the click a little later
+            self._pending_clicks.append((self._now() + self.click_latency, event['point'], event['button']))
+
+    def update(self, now: Optional[float] = None):
+        """Advance the simulation to ``now``."""
+        with self._lock:
+            now = self._now() if now is None else now
+            if self._started_at is None:
+                self._start(now)
+            dt = max(0.0, now - self._last_update)
+            self._last_update = now
+
+            due = [c for c in self._pending_clicks if c[0] <= now]
+            self._pending_clicks = [c for c in self._pending_clicks if c[0] > now]
+            for click_time, point, _ in due:
+                self._apply_click(point, click_time)
+
+            for rock in self.rocks:
+                if rock.phase_until is not None and now >= rock.phase_until:
+                    if rock.phase == 4:
+                        rock.phase = 0
+                        rock.phase_until = now + self.random.uniform(*self.respawn_delay)
+                    else:
+                        self._spawn_rock(rock, now)
+
+            self._update_spider(now, dt)
+            if not self.fire and self.fire_rate > 0 and self.random.random() < dt * self.fire_rate / 3600.0:
+                self.fire = True
+                self.fire_started_at = now
+
+    def _apply_click(self, point, now: float):
+        for rock in self.rocks:
+            if abs(point[0] - rock.click_point[0]) <= CLICK_RADIUS and abs(point[1] - rock.click_point[1]) <= CLICK_RADIUS:
+                if not 1 <= rock.phase <= 3:
+                    self.wasted_clicks += 1
+                    return
+                if rock.first_hit_at is None:
+                    rock.first_hit_at = now
+                    self.time_to_find.add(now - rock.spawned_at)
+                rock.hits_left -= 1
+                if rock.hits_left > 0:
+                    return
+                if rock.phase < 3:
+                    rock.phase += 1
+                    rock.hits_left = self.hits_per_phase[rock.phase - 1]
+                else:
+                    rock.phase = 4
+                    rock.phase_until = now + self.depleted_duration
+                    self.rocks_mined += 1
+                    self.time_to_deplete.add(now - rock.first_hit_at)
+                return
+
+        config = self.config
+        attack_points = [p for p in (config.spider_attack_point_1, config.spider_attack_point_2) if p]
+        if self.spider is not None and any(
+                abs(point[0] - p[0]) <= CLICK_RADIUS and abs(point[1] - p[1]) <= CLICK_RADIUS for p in attack_points):
+            self.spider.hits_left -= 1
+            if self.spider.hits_left <= 0:
+                self.spider = None
+                self.spiders_killed += 1
+            return
+        self.wasted_clicks += 1
+
+    def _update_spider(self, now: float, dt: float):
+        region = self.config.spider_detection_region
+        if region is None:
+            return
+        x, y, w, h = region
+        if self.spider is not None:
+            px, py = self.spider.position
+            vx, vy = self.spider.velocity
+            px, py = px + vx * dt, py + vy * dt
+            if not (x - 80 <= px <= x + w + 80 and y - 80 <= py <= y + h + 80):
+                self.spider = None
+            else:
+                self.spider.position = (px, py)
+        elif self.spider_rate > 0 and self.random.random() < dt * self.spider_rate / 60.0:
+            # Enter from the left or right edge and walk across
+            from_left = self.random.random() < 0.5
+            start = (x - 40 if from_left else x + w + 40, y + self.random.uniform(0.2, 0.8) * h)
+            speed = self.spider_speed if from_left else -self.spider_speed
+            self.spider = SimSpider(start, (speed, self.random.uniform(-0.2, 0.2) * self.spider_speed),
+                                    self.spider_hits, self.random.choice(SPIDER_SPRITES))
+            self.spiders_spawned += 1
+
+    # --- Rendering ---
+
+    def _sprites_in(self, region) -> List[Tuple[str, Tuple[int, int]]]:
+        """Return (template, centre) of everything visible, in drawing order."""
+        sprites = []
+        for rock in self.rocks:
+            if rock.phase == 4:
+                sprites.append(('rock_phase_4.png', rock.center))
+            elif rock.phase:
+                sprites.append((f'rock_phase_{rock.phase}.png', rock.center))
+        if self.fire and self.config.fire_detection_region:
+            sprites.append(('fire.png', self._center(self.config.fire_detection_region)))
+        if self.spider is not None:
+            sprites.append((self.spider.sprite, (int(self.spider.position[0]), int(self.spider.position[1]))))
+        return sprites
+
+    def _grab(self, region):
+        self.update()
+        x, y, w, h = region
+        image = np.empty((h, w, 3), dtype=np.uint8)
+        image[:] = BACKGROUND_BGR
+        truth = set()
+        with self._lock:
+            sprites = self._sprites_in(region)
+        for name, (cx, cy) in sprites:
+            sprite = self.sprites.template(name)
+            if sprite is None:
+                continue
+            sh, sw = sprite.shape[:2]
+            left, top = cx - sw // 2 - x, cy - sh // 2 - y
+            x0, y0 = max(0, left), max(0, top)
+            x1, y1 = min(w, left + sw), min(h, top + sh)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            image[y0:y1, x0:x1] = sprite[y0 - top:y1 - top, x0 - left:x1 - left]
+            # Count a sprite as present when it is fully inside the region
+            if x0 == left and y0 == top and x1 == left + sw and y1 == top + sh:
+                truth.add(self.template_kind([name]))
+        self._last_truth = truth
+        return image
+
+    def grab(self, region, tag=None):
+        image = super().grab(region, tag)
+        with self._lock:
+            self._truth[self.frame_count] = self._last_truth
+            self._truth.pop(self.frame_count - 1000, None)
+        return image
+
+    # --- Ground truth ---
+
+    def template_kind(self, templates) -> str:
+        """Classify a template list as 'rock', 'mined', 'spider' or 'fire'."""
+        name = list(templates)[0] if templates else ''
+        if name in self.config.mined_rock_templates or name.startswith('rock_phase_4'):
+            return 'mined'
+        if name.startswith('rock_phase_'):
+            return 'rock'
+        if name.startswith('spider'):
+            return 'spider'
+        if name.startswith('fire'):
+            return 'fire'
+        return name
+
+    def truth_for_frame(self, seq) -> Optional[set]:
+        """Return the kinds of sprites fully visible in frame ``seq``, if still known."""
+        with self._lock:
+            return self._truth.get(seq)
+
+    def ground_truth(self) -> Dict[str, object]:
+        """Return the current world state."""
+        with self._lock:
+            return {
+                'rocks': {rock.spot: rock.phase for rock in self.rocks},
+                'spider': self.spider.position if self.spider is not None else None,
+                'fire': self.fire,
+            }
+
+    def elapsed(self) -> float:
+        if self._started_at is None:
+            return 0.0
+        return self._now() - self._started_at
+
+    def report(self) -> Dict[str, object]:
+        """Return throughput, click and detection statistics of the run."""
+        elapsed = self.elapsed()
+        with self._lock:
+            return {
+                'elapsed': elapsed,
+                'rocks_mined': self.rocks_mined,
+                'rocks_per_hour': self.rocks_mined / elapsed * 3600 if elapsed > 0 else 0.0,
+                'clicks': self.clicks,
+                'wasted_clicks': self.wasted_clicks,
+                'clicks_per_rock': self.clicks / self.rocks_mined if self.rocks_mined else None,
+                'spiders': {'spawned': self.spiders_spawned, 'killed': self.spiders_killed},
+                'fire': self.fire,
+                'frames': self.frame_count,
+                'time_to_find': {'p50': self.time_to_find.percentile(50), 'p95': self.time_to_find.percentile(95)},
+                'time_to_deplete': {'p50': self.time_to_deplete.percentile(50),
+                                    'p95': self.time_to_deplete.percentile(95)},
+                'detection': self.scorer.report(),
+            }
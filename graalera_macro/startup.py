@@ -0,0 +1,61 @@
+"""Staged startup helpers.
+
+The GUI shows its window before the heavy modules (OpenCV, numpy, the input
+backends, PIL's Tk bridge) and the template bank are loaded, and reports how
+long each startup stage took. This matters most for the PyInstaller build,
+where every import is unpacked from the bundle on a cold start.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# Modules the macro needs but the first window does not
+HEAVY_MODULES = ['numpy', 'cv2', 'PIL.Image', 'PIL.ImageTk', 'pyautogui', 'pydirectinput']
+
+
+class StartupProfiler:
+    """Record the duration of named startup stages.
+
+    Stages may run on different threads; the total is measured from the
+    creation of the profiler, which should happen as early as possible.
+    """
+
+    def __init__(self):
+        self.created_at = time.perf_counter()
+        self.stages: List[Tuple[str, float, str]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as stage ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages.append((name, elapsed, threading.current_thread().name))
+
+    def elapsed(self) -> float:
+        """Seconds since the profiler was created."""
+        return time.perf_counter() - self.created_at
+
+    def report(self) -> str:
+        """Return the per-stage breakdown as printable text."""
+        with self._lock:
+            stages = list(self.stages)
+        lines = ["[STARTUP] Startup time breakdown:"]
+        for name, elapsed, thread_name in stages:
+            lines.append(f"[STARTUP]   {name:<28} {elapsed * 1000:8.1f} ms  ({thread_name})")
+        lines.append(f"[STARTUP]   {'ready after':<28} {self.elapsed() * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+def import_heavy_modules(profiler: StartupProfiler, modules=None):
+    """Import ``modules`` (default ``HEAVY_MODULES``), timing each one as a stage."""
+    import importlib
+
+    for module in modules or HEAVY_MODULES:
+        with profiler.stage(f"import {module}"):
+            importlib.import_module(module)
@@ -0,0 +1,28 @@
+"""Small streaming statistics helpers shared by the macro components."""
+from collections import deque
+from typing import Optional
+
+
+class RunningPercentile:
+    """Percentile estimate over a sliding window of the most recent samples."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.total_count = 0
+
+    def add(self, value: float):
+        """Record one sample."""
+        self.samples.append(value)
+        self.total_count += 1
+
+    def __len__(self):
+        return len(self.samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the ``pct`` percentile (0-100) of the window, or None if empty."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        # Nearest-rank percentile, good enough for a few hundred samples
+        rank = int(round(pct / 100.0 * (len(ordered) - 1)))
+        return ordered[max(0, min(rank, len(ordered) - 1))]
@@ -0,0 +1,139 @@
+"""High-precision pacing for the macro loops.
+
+``time.sleep`` on its own overshoots by an unpredictable amount (often a
+whole scheduler tick on Windows) and the macro used wall-clock ``time.time()``
+to measure its waits. ``Pacer`` works on ``time.perf_counter`` deadlines: it
+sleeps coarsely until shortly before the deadline and then spins for the
+last few milliseconds, recording how far every wait overshot. With a
+``VirtualClock`` the pacer advances simulated time instead of sleeping.
+"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from graalera_macro.clock import SYSTEM_CLOCK
+from graalera_macro.stats import RunningPercentile
+
+
+def jittered(base: float, jitter: float, minimum: float = 0.0) -> float:
+    """Return ``base`` plus a uniform random offset in [-jitter, jitter].
+
+    This is the distribution the humanized delays have always used
+    (e.g. 0.5s ±0.15s), clamped to ``minimum``.
+    """
+    if jitter <= 0:
+        return max(minimum, base)
+    return max(minimum, base + random.uniform(-jitter, jitter))
+
+
+class Pacer:
+    """Sleep until ``perf_counter`` deadlines and keep overshoot statistics.
+
+    Args:
+        spin_threshold: Seconds before the deadline at which coarse sleeping
+            stops and the pacer spins instead
+        clock: Time source (default: real time)
+    """
+
+    def __init__(self, spin_threshold: float = 0.002, clock=None):
+        self.spin_threshold = spin_threshold
+        self.clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._overshoot: Dict[str, RunningPercentile] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+        # TraceRecorder receiving every wait, or None
+        self.tracer = None
+        # TimeBreakdown charging every wait to 'wait:<reason>', or None
+        self.breakdown = None
+
+    def now(self) -> float:
+        """Monotonic time in seconds, used for all pacing deadlines."""
+        return self.clock.now()
+
+    def deadline(self, duration: float) -> float:
+        """Return the deadline ``duration`` seconds from now."""
+        return self.now() + duration
+
+    def sleep_until(self, deadline: float, reason: str = 'wait', precise: bool = True) -> float:
+        """Block until ``deadline`` (a ``now()`` value).
+
+        Args:
+            deadline: Target time
+            reason: Bucket the overshoot is recorded under
+            precise: Spin for the last ``spin_threshold`` seconds. Polling
+                loops that do not care about a few ms can turn this off.
+
+        Returns:
+            float: Overshoot in seconds (0 if the deadline had already passed)
+        """
+        start = self.now()
+        remaining = deadline - start
+        if remaining > 0 and self.clock.virtual:
+            self.clock.sleep(remaining)
+        elif remaining > 0:
+            coarse = remaining - self.spin_threshold if precise else remaining
+            if coarse > 0:
+                time.sleep(coarse)
+            if precise:
+                while self.now() < deadline:
+                    # Yield the GIL while spinning so other threads keep running
+                    time.sleep(0)
+        end = self.now()
+        overshoot = max(0.0, end - deadline)
+        self._record(reason, max(0.0, remaining), end - start, overshoot)
+        if self.tracer is not None:
+            self.tracer.span(f"wait:{reason}", 'wait', start, end)
+        if self.breakdown is not None:
+            self.breakdown.record(f"wait:{reason}", start, end)
+        return overshoot
+
+    def sleep(self, duration: float, reason: str = 'wait', precise: bool = True) -> float:
+        """Sleep for ``duration`` seconds. See ``sleep_until``."""
+        return self.sleep_until(self.now() + duration, reason, precise)
+
+    def sleep_jittered(self, base: float, jitter: float, minimum: float = 0.0,
+                       reason: str = 'wait') -> float:
+        """Sleep for a humanized delay drawn by ``jittered``."""
+        return self.sleep(jittered(base, jitter, minimum), reason)
+
+    def _record(self, reason: str, requested: float, actual: float, overshoot: float):
+        with self._lock:
+            if reason not in self._overshoot:
+                self._overshoot[reason] = RunningPercentile(500)
+                self._totals[reason] = {'count': 0, 'requested': 0.0, 'actual': 0.0, 'max_overshoot': 0.0}
+            self._overshoot[reason].add(overshoot)
+            totals = self._totals[reason]
+            totals['count'] += 1
+            totals['requested'] += requested
+            totals['actual'] += actual
+            totals['max_overshoot'] = max(totals['max_overshoot'], overshoot)
+
+    def stats(self, reason: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """Return per-reason wait counts, requested vs actual totals and overshoot percentiles."""
+        with self._lock:
+            result = {}
+            for name, totals in self._totals.items():
+                if reason is not None and name != reason:
+                    continue
+                overshoot = self._overshoot[name]
+                result[name] = dict(totals)
+                result[name]['overshoot_p50'] = overshoot.percentile(50)
+                result[name]['overshoot_p99'] = overshoot.percentile(99)
+                result[name]['mean_overshoot'] = (
+                    sum(overshoot.samples) / len(overshoot) if len(overshoot) else 0.0
+                )
+            return result
+
+    def reset(self):
+        """Drop all recorded statistics."""
+        with self._lock:
+            self._overshoot.clear()
+            self._totals.clear()
+
+    def summary(self) -> str:
+        """Return a one-line overshoot summary per reason."""
+        parts = []
+        for name, values in sorted(self.stats().items()):
+            parts.append(f"{name}: n={values['count']} p99 +{values['overshoot_p99'] * 1000:.1f}ms")
+        return "; ".join(parts) if parts else "no waits"
@@ -0,0 +1,145 @@
+"""Chrome trace-event export.
+
+``TraceRecorder`` collects a complete (``ph: 'X'``) event for each finished
+engine stage, pacer wait and executed input command, tagged with the thread
+it ran on, and writes them in the Trace Event Format read by
+``chrome://tracing`` and https://ui.perfetto.dev. Events go into a bounded
+buffer (the oldest are dropped once it is full; a span is one event, so
+dropping never breaks the nesting) and are written to disk only by
+``flush``/``stop``, so tracing never does I/O on the engine thread.
+
+Example::
+
+    tracer = TraceRecorder("traces/session.json")
+    tracer.attach(engine)
+    ...
+    tracer.detach(engine)
+    tracer.stop()
+"""
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+from graalera_macro.clock import SYSTEM_CLOCK
+
+DEFAULT_TRACE_DIR = "traces"
+
+
+class TraceRecorder:
+    """Bounded in-memory buffer of trace events.
+
+    Args:
+        path: File written by ``stop`` (default: ``traces/trace_<time>.json``)
+        max_events: Events kept; older events are dropped once the buffer is full
+        clock: Time source, the same one the engine uses (default: real time)
+    """
+
+    def __init__(self, path: Optional[str] = None, max_events: int = 500000, clock=None):
+        self.path = path
+        self.clock = clock or SYSTEM_CLOCK
+        self.pid = os.getpid()
+        self._origin = self.clock.now()
+        self._events = deque(maxlen=max_events)
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.recorded - len(self._events)
+
+    def _ts(self, t: Optional[float]) -> float:
+        """Clock time in seconds -> microseconds since the recorder was created."""
+        return ((self.clock.now() if t is None else t) - self._origin) * 1e6
+
+    def _add(self, event: dict, tid: Optional[int] = None):
+        if tid is None:
+            thread = threading.current_thread()
+            tid = thread.ident
+            if tid not in self._threads:
+                self._threads[tid] = thread.name
+        event['pid'] = self.pid
+        event['tid'] = tid
+        with self._lock:
+            self._events.append(event)
+            self.recorded += 1
+
+    def span(self, name: str, cat: str, start: float, end: float, args: Optional[dict] = None):
+        """Record ``name``, which ran on the calling thread from clock time ``start`` to ``end``."""
+        ts = self._ts(start)
+        event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': ts, 'dur': self._ts(end) - ts}
+        if args:
+            event['args'] = args
+        self._add(event)
+
+    def instant(self, name: str, cat: str = 'engine', args: Optional[dict] = None):
+        event = {'name': name, 'cat': cat, 'ph': 'i', 's': 't', 'ts': self._ts(None)}
+        if args:
+            event['args'] = args
+        self._add(event)
+
+    # --- Engine hooks ---
+
+    def on_input(self, command):
+        """``InputDispatcher`` listener: trace the execution of every command."""
+        if command.started_at is None or command.finished_at is None:
+            self.instant(f"input:{command.kind}", 'input', {
+                'cancelled': command.cancelled, 'expired': command.expired, 'backend': command.backend,
+            })
+            return
+        args = {'backend': command.backend, 'point': command.point,
+                'queue_delay_ms': round(command.queue_delay * 1000, 3)}
+        if command.error is not None:
+            args['error'] = str(command.error)
+        self.span(f"input:{command.kind}", 'input', command.started_at, command.finished_at, args)
+
+    def attach(self, engine):
+        """Trace ``engine``'s stages, waits and input commands."""
+        engine.stage_timer.tracer = self
+        engine.pacer.tracer = self
+        engine.input_dispatcher.add_listener(self.on_input)
+
+    def detach(self, engine):
+        engine.stage_timer.tracer = None
+        engine.pacer.tracer = None
+        engine.input_dispatcher.remove_listener(self.on_input)
+
+    # --- Output ---
+
+    def events(self) -> list:
+        """Return the buffered events preceded by thread-name metadata."""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': {'name': 'graalera_macro'}}]
+        for tid, name in threads.items():
+            metadata.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}})
+        return metadata + events
+
+    def flush(self, path: Optional[str] = None) -> str:
+        """Write the buffered events as a trace file and return its path."""
+        path = path or self.path
+        if not path:
+            os.makedirs(DEFAULT_TRACE_DIR, exist_ok=True)
+            path = os.path.join(DEFAULT_TRACE_DIR, f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        data = {
+            'traceEvents': self.events(),
+            'displayTimeUnit': 'ms',
+            'otherData': {'recorded': self.recorded, 'dropped': self.dropped},
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        self.path = path
+        return path
+
+    def stop(self) -> str:
+        """Flush to ``path`` and return it."""
+        return self.flush()
+
+    def summary(self) -> str:
+        return f"{len(self._events)} events ({self.dropped} dropped) in {self.path}"
@@ -0,0 +1,258 @@
+"""Offline confidence-threshold tuning over a labelled corpus.
+
+The confidences in the UI are typed by hand. ``tune`` picks them from data
+instead: every detector's templates are matched against the corpus once per
+matching method (the expensive part, spread over a process pool), then the
+whole threshold grid is evaluated on the resulting scores. The threshold
+with the lowest expected cost wins, where a false positive is a misclick
+(mining a rock that is not there, attacking nothing) and a false negative
+a resample (another search, another mining click), weighted per detector.
+
+Frames are packed into one memory-mapped file (``FrameStore``) that every
+worker maps read-only, so the pool shares a single copy through the page
+cache instead of pickling images to each process.
+"""
+import json
+import os
+import tempfile
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from graalera_macro.config import MacroConfig
+from graalera_macro.corpus import DETECTORS, SPIDER_TOLERANCE, Corpus, confusion, rates
+
+DEFAULT_GRID = [round(0.30 + 0.01 * i, 2) for i in range(66)]  # 0.30 .. 0.95
+# The UI only accepts confidences in this range
+MIN_CONFIDENCE, MAX_CONFIDENCE = 0.1, 1.0
+
+# Matching methods; the engine uses TM_CCOEFF_NORMED
+METHODS = {
+    'ccoeff_normed': cv2.TM_CCOEFF_NORMED,
+    'ccorr_normed': cv2.TM_CCORR_NORMED,
+    'sqdiff_normed': cv2.TM_SQDIFF_NORMED,
+}
+ENGINE_METHOD = 'ccoeff_normed'
+
+# Detector -> (cost of a false positive, cost of a false negative). A missed
+# fire is a safety problem, a spider attack on nothing costs a combat cycle.
+DETECTOR_COSTS = {
+    'rock': (1.0, 1.0),
+    'depleted': (2.0, 1.0),
+    'spider': (2.0, 1.0),
+    'fire': (1.0, 10.0),
+}
+
+# Detector -> MacroConfig field the recommended threshold is written to
+CONFIDENCE_FIELDS = {
+    'rock': 'detection_confidence',
+    'depleted': 'depleted_confidence',
+    'spider': 'spider_confidence',
+    'fire': 'fire_confidence',
+}
+
+
+class FrameStore:
+    """Frames packed into one read-only memory-mapped file.
+
+    The index (offset and shape of every frame) lives next to the data in
+    ``<path>.json``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path + ".json", 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.data = np.memmap(path, dtype=np.uint8, mode='r') if self.index else None
+
+    @classmethod
+    def build(cls, images, path: str) -> "FrameStore":
+        """Write ``images`` (an iterable of BGR arrays) to ``path`` and open the store."""
+        index = []
+        offset = 0
+        with open(path, 'wb') as f:
+            for image in images:
+                image = np.ascontiguousarray(image, dtype=np.uint8)
+                f.write(image.tobytes())
+                index.append({'offset': offset, 'shape': list(image.shape)})
+                offset += image.nbytes
+        with open(path + ".json", 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        return cls(path)
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self, i: int) -> np.ndarray:
+        spec = self.index[i]
+        size = int(np.prod(spec['shape']))
+        return self.data[spec['offset']:spec['offset'] + size].reshape(spec['shape'])
+
+
+def best_match(matcher, image: np.ndarray, templates: List[str], method: str) -> Tuple[float, Optional[tuple]]:
+    """Return the best score over ``templates`` (higher is better for every method) and its centre."""
+    best_score, best_center = 0.0, None
+    for template_file in templates:
+        template = matcher.template(template_file)
+        if template is None or template.shape[0] > image.shape[0] or template.shape[1] > image.shape[1]:
+            continue
+        result = cv2.matchTemplate(image, template, METHODS[method])
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        if method == 'sqdiff_normed':
+            score, location = 1.0 - min_val, min_loc
+        else:
+            score, location = max_val, max_loc
+        if score > best_score:
+            best_score = score
+            best_center = (location[0] + template.shape[1] / 2, location[1] + template.shape[0] / 2)
+    return best_score, best_center
+
+
+# --- Worker process state ---
+
+_worker_store: Optional[FrameStore] = None
+_worker_matcher = None
+
+
+def _init_worker(store_path: str, asset_dir: str):
+    global _worker_store, _worker_matcher
+    from graalera_macro.detection import TemplateMatcher
+
+    _worker_store = FrameStore(store_path)
+    _worker_matcher = TemplateMatcher(asset_dir)
+
+
+def _score_chunk(task) -> Tuple[str, str, List[Tuple[int, float, Optional[tuple]]]]:
+    detector, method, templates, indices = task
+    scores = []
+    for i in indices:
+        score, center = best_match(_worker_matcher, _worker_store.frame(i), templates, method)
+        scores.append((i, score, center))
+    return detector, method, scores
+
+
+def _choose(detector: str, records: List[dict], grid: List[float], tolerance: float) -> Dict[str, object]:
+    """Return the grid threshold with the lowest cost, centred in the run of equally good ones."""
+    fp_cost, fn_cost = DETECTOR_COSTS[detector]
+    costs = []
+    for threshold in grid:
+        counts = confusion(detector, records, threshold, tolerance)
+        costs.append((fp_cost * counts['fp'] + fn_cost * counts['fn'], threshold, counts))
+    lowest = min(cost for cost, _, _ in costs)
+    # Thresholds in the middle of the best run leave margin on both sides
+    best_run, run = [], []
+    for entry in costs:
+        if entry[0] == lowest:
+            run.append(entry)
+            if len(run) > len(best_run):
+                best_run = list(run)
+        else:
+            run = []
+    cost, threshold, counts = best_run[len(best_run) // 2]
+    threshold = min(MAX_CONFIDENCE, max(MIN_CONFIDENCE, threshold))
+    result = {'threshold': threshold, 'cost': cost, 'margin': (best_run[-1][1] - best_run[0][1]) / 2}
+    result.update(counts)
+    result.update(rates(counts))
+    return result
+
+
+def tune(corpus: Corpus, config: Optional[MacroConfig] = None, methods: Optional[List[str]] = None,
+         grid: Optional[List[float]] = None, workers: Optional[int] = None, chunk_size: int = 16,
+         tolerance: float = SPIDER_TOLERANCE, asset_dir: str = 'assets') -> Dict[str, dict]:
+    """Search thresholds (and optionally matching methods) for every detector.
+
+    Args:
+        corpus: Labelled corpus
+        config: Templates to match and current thresholds to compare with (default: ``MacroConfig()``)
+        methods: Matching methods from ``METHODS`` to try in addition to the engine's
+        grid: Thresholds to evaluate
+        workers: Process pool size (default: CPU count)
+        chunk_size: Frames per pool task
+
+    Returns:
+        dict: Per detector the current and recommended threshold for the
+            engine's method and the best result of every method tried
+    """
+    config = config or MacroConfig()
+    methods = [ENGINE_METHOD] + [m for m in (methods or []) if m != ENGINE_METHOD]
+    grid = grid or DEFAULT_GRID
+
+    entries = []
+    entry_index: Dict[int, int] = {}
+    for detector in DETECTORS:
+        for entry in corpus.labelled(detector):
+            if id(entry) not in entry_index:
+                entry_index[id(entry)] = len(entries)
+                entries.append(entry)
+    if not entries:
+        return {}
+
+    tasks = []
+    labels: Dict[str, Dict[int, object]] = {}
+    for detector, (_, label, templates_attr, _) in DETECTORS.items():
+        indices = [entry_index[id(entry)] for entry in corpus.labelled(detector)]
+        labels[detector] = {i: entries[i]['labels'][label] for i in indices}
+        templates = list(getattr(config, templates_attr))
+        for method in methods:
+            for start in range(0, len(indices), chunk_size):
+                tasks.append((detector, method, templates, indices[start:start + chunk_size]))
+
+    scores: Dict[Tuple[str, str], List[dict]] = {}
+    with tempfile.TemporaryDirectory(prefix="tune_") as tmp:
+        store_path = os.path.join(tmp, "frames.store")
+        FrameStore.build((corpus.image(entry) for entry in entries), store_path)
+        with Pool(workers or os.cpu_count() or 1, initializer=_init_worker, initargs=(store_path, asset_dir)) as pool:
+            for detector, method, chunk in pool.imap_unordered(_score_chunk, tasks):
+                records = scores.setdefault((detector, method), [])
+                for i, score, center in chunk:
+                    records.append({'label': labels[detector][i], 'score': score, 'center': center})
+
+    results = {}
+    for detector, (_, _, _, confidence_attr) in DETECTORS.items():
+        if not labels[detector]:
+            continue
+        current_threshold = getattr(config, confidence_attr)
+        per_method = {method: _choose(detector, scores[(detector, method)], grid, tolerance) for method in methods}
+        current = confusion(detector, scores[(detector, ENGINE_METHOD)], current_threshold, tolerance)
+        fp_cost, fn_cost = DETECTOR_COSTS[detector]
+        results[detector] = {
+            'frames': len(labels[detector]),
+            'current_threshold': current_threshold,
+            'current_cost': fp_cost * current['fp'] + fn_cost * current['fn'],
+            'recommended': per_method[ENGINE_METHOD]['threshold'],
+            'methods': per_method,
+            'best_method': min(per_method, key=lambda m: per_method[m]['cost']),
+        }
+    return results
+
+
+def apply_recommendations(config: MacroConfig, results: Dict[str, dict]) -> Dict[str, float]:
+    """Write the recommended thresholds into ``config`` and return the fields changed."""
+    changed = {}
+    for detector, result in results.items():
+        field_name = CONFIDENCE_FIELDS[detector]
+        setattr(config, field_name, result['recommended'])
+        changed[field_name] = result['recommended']
+    return changed
+
+
+def format_results(results: Dict[str, dict]) -> str:
+    lines = [f"{'detector':<9} {'frames':>6} {'current':>8} {'cost':>6} {'recommended':>12} {'cost':>6} "
+             f"{'margin':>7} {'precision':>9} {'recall':>7}"]
+    for detector, result in results.items():
+        engine = result['methods'][ENGINE_METHOD]
+        lines.append(f"{detector:<9} {result['frames']:6d} {result['current_threshold']:8.2f} "
+                     f"{result['current_cost']:6.0f} {engine['threshold']:12.2f} {engine['cost']:6.0f} "
+                     f"{engine['margin']:7.2f} {_fmt(engine['precision']):>9} {_fmt(engine['recall']):>7}")
+    for detector, result in results.items():
+        if len(result['methods']) > 1:
+            parts = [f"{method} {values['cost']:.0f} @ {values['threshold']:.2f}"
+                     for method, values in result['methods'].items()]
+            lines.append(f"{detector} by method: {', '.join(parts)} (best: {result['best_method']})")
+    return "\n".join(lines)
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.3f}"
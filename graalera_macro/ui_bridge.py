@@ -0,0 +1,116 @@
+"""Thread-safe, throttled bridge between the macro thread and Tkinter.
+
+The macro thread never touches Tk directly. It publishes the fields that
+changed into a snapshot slot; the Tk thread pulls the latest snapshot at a
+capped rate and renders only what changed since the previous frame, so any
+number of intermediate updates between two renders are merged into one.
+"""
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def _same(old, new) -> bool:
+    """Compare two snapshot values without triggering numpy's element-wise ==."""
+    if old is new:
+        return True
+    return isinstance(old, _SCALARS) and isinstance(new, _SCALARS) and old == new
+
+
+class UiBridge:
+    """Latest-value slot written by worker threads and rendered by the Tk thread.
+
+    ``publish`` copies the current snapshot, applies the update and swaps the
+    reference in one assignment, so the Tk side can read ``snapshot`` without
+    taking a lock and never sees a half-applied update. Writers serialize on
+    a small lock so two publishing threads cannot lose each other's fields.
+
+    Args:
+        max_hz: Maximum number of renders per second
+    """
+
+    def __init__(self, max_hz: float = 10.0):
+        self.interval_ms = max(1, int(1000 / max_hz))
+        self._snapshot: Dict[str, Any] = {}
+        self._rendered: Dict[str, Any] = {}
+        self._write_lock = threading.Lock()
+        self._calls = deque()
+        self._root = None
+        self._render: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._after_id = None
+        self.published_count = 0
+        self.render_count = 0
+
+    def publish(self, **fields):
+        """Merge ``fields`` into the snapshot. Safe to call from any thread."""
+        with self._write_lock:
+            snapshot = dict(self._snapshot)
+            snapshot.update(fields)
+            self._snapshot = snapshot
+            self.published_count += 1
+
+    def call_soon(self, callback: Callable[[], None]):
+        """Run ``callback`` on the Tk thread at the next render tick."""
+        self._calls.append(callback)
+
+    @property
+    def snapshot(self) -> Dict[str, Any]:
+        """The latest published state. Treat it as read-only."""
+        return self._snapshot
+
+    def attach(self, root, render: Callable[[Dict[str, Any]], None]):
+        """Start rendering on ``root``'s event loop.
+
+        Args:
+            root: Tk root whose ``after`` loop drives the renders
+            render: Called on the Tk thread with the fields that changed
+        """
+        self.detach()
+        self._root = root
+        self._render = render
+        self._schedule()
+
+    def detach(self):
+        """Stop the render loop."""
+        if self._root is not None and self._after_id is not None:
+            try:
+                self._root.after_cancel(self._after_id)
+            except Exception:
+                pass
+        self._after_id = None
+        self._root = None
+
+    def _schedule(self):
+        if self._root is not None:
+            self._after_id = self._root.after(self.interval_ms, self._tick)
+
+    def _tick(self):
+        self._after_id = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[ERROR] UI render failed: {e}")
+        self._schedule()
+
+    def flush(self):
+        """Run queued callbacks and render pending changes. Tk thread only."""
+        while self._calls:
+            self._calls.popleft()()
+
+        snapshot = self._snapshot
+        if snapshot is self._rendered or self._render is None:
+            return
+        changed = {
+            key: value for key, value in snapshot.items()
+            if key not in self._rendered or not _same(self._rendered[key], value)
+        }
+        self._rendered = snapshot
+        if changed:
+            self._render(changed)
+            self.render_count += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return how many updates were published and how many renders they merged into."""
+        return {'published': self.published_count, 'rendered': self.render_count}
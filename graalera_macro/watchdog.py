@@ -0,0 +1,326 @@
+"""Stall detection and escalating recovery.
+
+``StallWatchdog`` follows progress signals of a running engine and the
+time each was last seen (on the engine's clock):
+
+* ``rock``: a rock was mined
+* ``phase``: the state machine changed phase or area
+* ``detection``: the rock or depleted-rock detector matched above its threshold
+* ``frame``: a frame was captured
+* ``loop``: the engine thread ran ``check`` (or is in a deliberate pause)
+
+The session counts as stalled when a signal misses its deadline or the same
+exception repeats ``repeated_error_limit`` times in a row. The engine calls
+``check`` once per loop iteration, so recovery runs on the engine thread,
+escalating one step per stall until a rock is mined again:
+
+1. ``reanchor``: find the rock of both detection areas near where it was
+   last detected and, if both moved by the same offset, shift every region
+   and point by it
+2. ``reset``: put the state machine back into search with clean counters
+3. ``pause``: wait with exponential backoff (``pause_attempts`` times)
+4. ``stop``: stop the engine and raise the alert
+
+A thread hung inside the loop (a blocked capture or input backend) never
+reaches ``check``, so with a real-time clock a monitor thread watches the
+``loop`` signal and, when it misses its deadline, raises the alert and
+aborts the engine.
+
+Each action is sent as a ``watchdog`` engine event, so it ends up in the
+event log.
+"""
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from graalera_macro.profiles import POINT_FIELDS, REGION_FIELDS
+
+DEFAULT_DEADLINES = {
+    'rock': 900.0,
+    'phase': 300.0,
+    'detection': 300.0,
+    'frame': 60.0,
+    'loop': 300.0,
+}
+ACTIONS = ('reanchor', 'reset', 'pause', 'stop')
+# Pixels searched around each detection area when re-anchoring
+REANCHOR_MARGIN = 80
+# Pixels the offsets of both areas may differ by (and below which nothing moved)
+REANCHOR_TOLERANCE = 6
+# Seconds between two looks of the monitor thread
+MONITOR_INTERVAL = 5.0
+
+
+class StallWatchdog:
+    """Detect stalls of an engine and run escalating recovery actions.
+
+    Args:
+        deadlines: Seconds each signal may stay silent (missing signals use ``DEFAULT_DEADLINES``)
+        repeated_error_limit: Identical consecutive errors that count as a stall
+        pause: (first pause, backoff factor, longest pause) in seconds
+        pause_attempts: Pauses before the watchdog gives up and stops the engine
+        alert: Called with a message when the watchdog stops the engine
+        monitor_interval: Seconds between checks of the ``loop`` signal on the monitor thread
+    """
+
+    def __init__(self, deadlines: Optional[Dict[str, float]] = None, repeated_error_limit: int = 5,
+                 pause: Tuple[float, float, float] = (60.0, 2.0, 900.0), pause_attempts: int = 2,
+                 alert: Optional[Callable[[str], None]] = None, monitor_interval: float = MONITOR_INTERVAL):
+        self.deadlines = dict(DEFAULT_DEADLINES)
+        self.deadlines.update(deadlines or {})
+        self.repeated_error_limit = repeated_error_limit
+        self.pause = pause
+        self.pause_attempts = pause_attempts
+        self.alert = alert
+        self.monitor_interval = monitor_interval
+        self.engine = None
+        self._monitor: Optional[threading.Thread] = None
+        self._monitor_stop = threading.Event()
+        # Screen centre of the rock last detected in each area, the reference for re-anchoring
+        self.anchors: Dict[int, Tuple[int, int]] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._last_error: Optional[tuple] = None
+        self._repeated_errors = 0
+        self._level = 0
+        self._pauses = 0
+        self.actions: Dict[str, int] = {action: 0 for action in ACTIONS}
+
+    def attach(self, engine):
+        """Start following ``engine``'s signals; every deadline starts now."""
+        self.engine = engine
+        now = engine.pacer.now()
+        self._last_seen = {signal: now for signal in self.deadlines}
+        self._last_error = None
+        self._repeated_errors = 0
+        self._level = 0
+        self._pauses = 0
+        self.anchors = {}
+        engine.add_listener(self.on_event)
+        engine.screen_source.add_listener(self.on_frame)
+        # A virtual clock only moves while the engine thread sleeps, so a hang cannot be timed on it
+        if self.deadlines.get('loop', 0) > 0 and not getattr(engine.clock, 'virtual', False):
+            self._monitor_stop.clear()
+            self._monitor = threading.Thread(target=self._run_monitor, args=(engine,), name="StallWatchdog",
+                                             daemon=True)
+            self._monitor.start()
+
+    def detach(self, engine=None):
+        """Stop following the engine (only if it is ``engine``, when given)."""
+        if engine is not None and engine is not self.engine:
+            return
+        if self.engine is not None:
+            self.engine.remove_listener(self.on_event)
+            self.engine.screen_source.remove_listener(self.on_frame)
+            self.engine = None
+        self._monitor_stop.set()
+        if self._monitor is not None and self._monitor is not threading.current_thread():
+            self._monitor.join(1.0)
+        self._monitor = None
+
+    def beat(self):
+        """Mark the engine thread alive (called by ``check`` and during deliberate pauses)."""
+        if self.engine is not None:
+            self._seen('loop', self.engine.pacer.now())
+
+    def _run_monitor(self, engine):
+        while not self._monitor_stop.wait(self.monitor_interval):
+            if engine is not self.engine:
+                return
+            silent = engine.pacer.now() - self._last_seen.get('loop', engine.pacer.now())
+            if silent <= self.deadlines['loop']:
+                continue
+            # The engine thread is stuck inside an iteration; all that can be done from here is to stop it
+            message = f"Watchdog: engine thread unresponsive for {silent:.0f}s, stopping"
+            print(f"[WATCHDOG] Engine thread unresponsive for {silent:.0f}s, stopping")
+            self.actions['stop'] += 1
+            engine.emit('watchdog', action='stop', signal='loop', silent=silent, level=self._level)
+            self._raise_alert(message)
+            engine.abort(message)
+            return
+
+    def _raise_alert(self, message: str):
+        if self.alert is not None:
+            try:
+                self.alert(message)
+            except Exception as e:
+                print(f"[ERROR] Watchdog alert failed: {e}")
+
+    def _seen(self, signal: str, t: float):
+        if signal in self._last_seen:
+            self._last_seen[signal] = t
+
+    def on_event(self, event: dict):
+        kind, t = event['kind'], event['t']
+        if kind == 'rock_mined':
+            self._seen('rock', t)
+            # Real progress: the next stall starts again at the first recovery step
+            self._level = 0
+            self._pauses = 0
+            self._repeated_errors = 0
+        elif kind == 'state':
+            self._seen('phase', t)
+        elif kind == 'detection' and event['confidence'] > 0 and event['detector'] in ('rock', 'depleted'):
+            self._seen('detection', t)
+            self._repeated_errors = 0
+            self._remember_anchor(event)
+        elif kind == 'error':
+            key = (event.get('stage'), event.get('error_type'), event.get('error'))
+            self._repeated_errors = self._repeated_errors + 1 if key == self._last_error else 1
+            self._last_error = key
+
+    def _remember_anchor(self, event: dict):
+        location, size = event.get('location'), event.get('size')
+        area = self.engine.current_strategy
+        region = self.engine.config.detection_region_1 if area == 1 else self.engine.config.detection_region_2
+        if location is None or size is None or region is None:
+            return
+        self.anchors[area] = (region[0] + location[0] + size[0] // 2, region[1] + location[1] + size[1] // 2)
+
+    def on_frame(self, frame):
+        # Replayed frames carry their recorded timestamps; use the engine's clock
+        self._seen('frame', self.engine.pacer.now())
+
+    def stalled(self) -> Optional[Tuple[str, float]]:
+        """Return (signal, seconds silent) of the first stalled signal, or None."""
+        if self._repeated_errors >= self.repeated_error_limit:
+            return 'repeated_error', float(self._repeated_errors)
+        now = self.engine.pacer.now()
+        for signal, deadline in self.deadlines.items():
+            silent = now - self._last_seen.get(signal, now)
+            if deadline > 0 and silent > deadline:
+                return signal, silent
+        return None
+
+    def check(self) -> Optional[str]:
+        """Run the next recovery action if the engine is stalled. Call from the engine thread.
+
+        Returns:
+            str: Status to stop the engine with, or None to keep running
+        """
+        if self.engine is None:
+            return None
+        self.beat()
+        stall = self.stalled()
+        if stall is None:
+            return None
+        signal, silent = stall
+        action = ACTIONS[min(self._level, len(ACTIONS) - 1)]
+        details = {}
+        try:
+            if action == 'reanchor':
+                details['offset'] = reanchor(self.engine, anchors=self.anchors)
+            elif action == 'reset':
+                self.engine.reset_state()
+        except Exception as e:
+            details['error'] = str(e)
+        if action == 'pause':
+            first, factor, longest = self.pause
+            details['seconds'] = min(longest, first * factor ** self._pauses)
+        self.actions[action] += 1
+        if signal == 'repeated_error':
+            print(f"[WATCHDOG] Same error {silent:.0f} times in a row, action: {action} {details or ''}".rstrip())
+        else:
+            print(f"[WATCHDOG] No {signal} progress for {silent:.0f}s, action: {action} {details or ''}".rstrip())
+        self.engine.emit('watchdog', action=action, signal=signal, silent=silent, level=self._level, **details)
+
+        if action == 'pause':
+            self._pauses += 1
+            if self._pauses >= self.pause_attempts:
+                self._level += 1
+            self.engine.publish(status=f"Watchdog: stalled, pausing {details['seconds']:.0f}s")
+            self.engine.pause(details['seconds'], 'watchdog_pause')
+        elif action == 'stop':
+            message = f"Watchdog: no {signal} progress after every recovery step, stopping"
+            self._raise_alert(message)
+            return message
+        else:
+            self._level += 1
+
+        # Give the recovery a full deadline before judging it
+        now = self.engine.pacer.now()
+        self._last_seen = {name: now for name in self._last_seen}
+        self._repeated_errors = 0
+        return None
+
+    def summary(self) -> str:
+        taken = [f"{action} x{count}" for action, count in self.actions.items() if count]
+        return f"watchdog actions: {', '.join(taken)}" if taken else "watchdog: no stalls"
+
+
+def reanchor(engine, margin: int = REANCHOR_MARGIN, anchors: Optional[Dict[int, Tuple[int, int]]] = None,
+             tolerance: int = REANCHOR_TOLERANCE) -> Optional[Tuple[int, int]]:
+    """Find the rocks near the detection areas and move the spot if the view has shifted.
+
+    Each area is searched in a window ``margin`` pixels wider on every side,
+    and the best match is compared with ``anchors``, the screen centre of
+    the rock last detected in that area. The spot is only moved when both
+    areas have an anchor and a match, their offsets agree within
+    ``tolerance`` (a neighbouring rock matched in one area would not) and
+    every shifted region and point stays on screen. Then every region and
+    point of ``engine.config``, and the anchors, are shifted by the offset
+    (the areas of a spot always move together).
+
+    Returns:
+        tuple: (dx, dy) applied, or None if nothing was moved
+    """
+    anchors = anchors if anchors is not None else {}
+    config = engine.config
+    templates = list(config.rock_templates) + list(config.mined_rock_templates)
+    screen_width, screen_height = engine.screen_source.screen_size()
+    offsets = []
+    for area, region in ((1, config.detection_region_1), (2, config.detection_region_2)):
+        anchor = anchors.get(area)
+        if anchor is None:
+            return None
+        x, y, w, h = region
+        left, top = max(0, x - margin), max(0, y - margin)
+        right, bottom = min(screen_width, x + w + margin), min(screen_height, y + h + margin)
+        if right - left <= 0 or bottom - top <= 0:
+            return None
+        image = engine.screen_source.grab((left, top, right - left, bottom - top), 'reanchor')
+        conf, location, size = engine.matcher.detect_any_template(image, templates,
+                                                                  confidence=config.detection_confidence)
+        if conf <= 0:
+            return None
+        offsets.append((left + location[0] + size[0] // 2 - anchor[0], top + location[1] + size[1] // 2 - anchor[1]))
+    (dx1, dy1), (dx2, dy2) = offsets
+    if abs(dx1 - dx2) > tolerance or abs(dy1 - dy2) > tolerance:
+        print(f"[WATCHDOG] Not re-anchoring, the areas moved by different offsets: {offsets}")
+        return None
+    dx, dy = round((dx1 + dx2) / 2), round((dy1 + dy2) / 2)
+    if abs(dx) <= tolerance and abs(dy) <= tolerance:
+        # The rocks are where they were; nothing to re-anchor
+        return None
+    if not fits_screen(config, dx, dy, screen_width, screen_height):
+        print(f"[WATCHDOG] Not re-anchoring, shifting by ({dx}, {dy}) would move the spot off screen")
+        return None
+    shift_config(config, dx, dy)
+    for area, (anchor_x, anchor_y) in list(anchors.items()):
+        anchors[area] = (anchor_x + dx, anchor_y + dy)
+    return dx, dy
+
+
+def fits_screen(config, dx: int, dy: int, screen_width: int, screen_height: int) -> bool:
+    """Return whether every region and point of ``config`` moved by (dx, dy) is on screen."""
+    for name in REGION_FIELDS:
+        region = getattr(config, name)
+        if region is not None:
+            x, y, w, h = region
+            if x + dx < 0 or y + dy < 0 or x + dx + w > screen_width or y + dy + h > screen_height:
+                return False
+    for name in POINT_FIELDS:
+        point = getattr(config, name)
+        if point is not None and not (0 <= point[0] + dx < screen_width and 0 <= point[1] + dy < screen_height):
+            return False
+    return True
+
+
+def shift_config(config, dx: int, dy: int):
+    """Move every region and point of ``config`` by (dx, dy)."""
+    for name in REGION_FIELDS:
+        region = getattr(config, name)
+        if region is not None:
+            setattr(config, name, (region[0] + dx, region[1] + dy, region[2], region[3]))
+    for name in POINT_FIELDS:
+        point = getattr(config, name)
+        if point is not None:
+            setattr(config, name, (point[0] + dx, point[1] + dy))
@@ -1,38 +1,44 @@
+import argparse
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
-import pyautogui
-import pydirectinput
-import cv2
-import numpy as np
-import platform
-import random
 import threading
-import time
 from typing import Optional, Tuple
-import os
-import sys
-from datetime import datetime
 
-def resource_path(relative_path):
-    """ Get absolute path to resource, works for dev and for PyInstaller """
-    try:
-        # PyInstaller creates a temp folder and stores path in _MEIPASS
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-
-    return os.path.join(base_path, relative_path)
+# Only lightweight modules are imported up front; OpenCV, numpy, PIL and the
+# input backends are loaded in the background once the window is up.
+from graalera_macro.analytics import AnalyticsStore, SessionAnalytics
+from graalera_macro.config import FIRE_TEMPLATES, ROCK_TEMPLATES, SPIDER_TEMPLATES, MacroConfig
+from graalera_macro.instrumentation import StageTimer
+from graalera_macro.latency import LatencyCalibrator
+from graalera_macro.profiles import POINT_FIELDS, REGION_FIELDS, ProfileError, ProfileStore, SpotProfile
+from graalera_macro.startup import StartupProfiler, import_heavy_modules
+from graalera_macro.timing import Pacer
+from graalera_macro.ui_bridge import UiBridge
 
 class MiningMacroNoSpiders:
-    def __init__(self, root):
-        """Initialize the mining macro application."""
+    def __init__(self, root, startup: Optional[StartupProfiler] = None, profile: Optional[str] = None,
+                 metrics_port: Optional[int] = None):
+        """Initialize the mining macro application.
+
+        Args:
+            root: Tk root window
+            startup: Profiler timing the startup stages
+            profile: Name of a saved spot profile to restore instead of opening the setup overlay
+            metrics_port: Serve Prometheus metrics on this local port (off when None)
+        """
         self.root = root
+        self.startup = startup or StartupProfiler()
         self.root.title("Mining Macro (No Spiders)")
         
-        # Screenshot preview
+        # Screenshot preview, rendered from the latest captured frame on the Tk side
         self.preview_label = None
         self.preview_size = (200, 150)  # Width, Height
+        self.preview_max_fps = 5.0
+        self.preview = None
+        self.preview_enabled_var = tk.BooleanVar(value=True)
+        
+        # All screenshots go through the capture layer (created once startup finishes loading)
+        self.screen_source = None
         
         # State
         self.detection_region_1: Optional[Tuple[int, int, int, int]] = None
@@ -58,18 +64,10 @@ class MiningMacroNoSpiders:
         self.stopwatch_var = tk.StringVar(value="Stopwatch: 00:00:00")
         self.rock_counter_var = tk.StringVar(value="Rocks Mined: 0")
         
-        # Direction switching state
-        self.last_direction = None
-        self.direction_switches = 0
+        # Direction switching display (tracked by the engine)
         self.direction_switches_var = tk.StringVar(value="Direction Switches: 0")
         
         self.mined_rock_templates = ['rock_phase_4.png', 'rock_phase_4_2.png']
-        # Spider templates including the new leg assets for better detection
-        self.spider_templates = [
-            'spider1.png', 'spider2.png', 'spider3.png', 'spider4.png',
-            'spider1_legs_1.png', 'spider1_legs_2.png',
-            'spider4_legs_1.png', 'spider4_legs_2.png'
-        ]  # Spider templates including leg variations
         
         # Relative offsets from character point
         self.relative_mining_offset_1: Optional[Tuple[int, int]] = None
@@ -92,52 +90,128 @@ class MiningMacroNoSpiders:
         # Spider attack status and confidence
         self.spider_status_var = tk.StringVar(value="Spider: Not Detected")
         self.spider_confidence_display = tk.StringVar(value="Confidence: N/A")
-        self.spider_attack_in_progress = False
-        self.last_spider_confidence = 0.0
         
         # Fire detection status and confidence
         self.fire_status_var = tk.StringVar(value="Fire: Not Detected")
         self.fire_confidence_display = tk.StringVar(value="Confidence: N/A")
-        self.last_fire_confidence = 0.0
+        self.fire_confidence: float = 0.8
         
         # Debug settings
         self.ENABLE_DEBUG = False
-        self.debug_screenshot_count = 0
-        self.max_debug_screenshots = 5
-        self.debug_screenshot_dir = "debug_screenshots"
-        if self.ENABLE_DEBUG:
-            self.setup_debug_dir()
-            
+        self.matcher = None
+        # Recent frames per detector, saved to debug_screenshots/ after anomalies
+        self.debug_frames = None
+        # Stall detection with escalating recovery, attached to each session's engine
+        self.watchdog = None
+        
         # Timeout settings (in seconds)
         self.area_switch_timeout = 5.0  # Time to wait when switching areas
         self.mining_retry_timeout = 2.0  # Time to wait between mining attempts
         
-        self.create_ui()
-        self._check_assets_loaded()
+        # Post-click waits derived from measured click-to-effect latency
+        self.latency_calibrator = LatencyCalibrator()
+        self.calibrate_latency_var = tk.BooleanVar(value=False)
+        self.click_latency_var = tk.StringVar(value="Click Latency: N/A")
+        
+        # Optional recording of every captured frame for offline tuning
+        self.record_session_var = tk.BooleanVar(value=False)
+        self.recorder = None
+        
+        # Per-stage timing histograms, exported to timings/ when a session stops
+        self.stage_timer = StageTimer()
+        self.stage_timing_var = tk.BooleanVar(value=False)
+        self.stage_timing_summary_var = tk.StringVar(value="Stage Timing: off")
+        
+        # Optional Chrome trace of every stage, wait and input command
+        self.trace_var = tk.BooleanVar(value=False)
+        self.tracer = None
+        
+        # Per-rock records and session summaries, kept across app restarts
+        self.analytics_store = AnalyticsStore()
+        self.session_analytics = None
+        
+        # Optional JSONL log of engine events and input commands
+        self.event_log_var = tk.BooleanVar(value=False)
+        self.event_log = None
+        
+        # Optional Prometheus endpoint, attached to each session's engine
+        self.metrics_server = None
+        if metrics_port is not None:
+            from graalera_macro.metrics import MetricsCollector, MetricsServer
+            self.metrics_server = MetricsServer(MetricsCollector(), metrics_port)
+            try:
+                self.metrics_server.start()
+                print(f"[METRICS] Serving {self.metrics_server.url}")
+            except OSError as e:
+                print(f"[ERROR] Could not serve metrics on port {metrics_port}: {e}")
+                self.metrics_server = None
+        
+        # The macro thread publishes UI state here; the Tk thread renders it at 10 Hz
+        self.ui_bridge = UiBridge(max_hz=10)
+        
+        # All macro pacing goes through perf_counter deadlines
+        self.pacer = Pacer()
+        
+        # Mouse input runs on its own thread so clicks never block detection
+        self.input_dispatcher = None
+        
+        # GUI-free engine running the capture/detection/input loop, created on start
+        self.engine = None
+        
+        # Saved spot profiles
+        self.profile_store = ProfileStore()
+        self.initial_profile = profile
+        self.profile_name_var = tk.StringVar(value=profile or "")
+        
+        with self.startup.stage("build window"):
+            self.create_ui()
+            self.ui_bridge.attach(self.root, self._render_ui_state)
         
         self.root.attributes('-topmost', True)
         self.root.resizable(False, False)
-    
-    def setup_debug_dir(self):
-        """Create debug directory if it doesn't exist."""
-        os.makedirs(self.debug_screenshot_dir, exist_ok=True)
         
-    def save_debug_screenshot(self, screenshot, prefix="debug", confidence=0.0):
-        """Save a screenshot with debug information."""
-        if not self.ENABLE_DEBUG or self.debug_screenshot_count >= self.max_debug_screenshots:
-            return
-            
+        # Heavy modules and the template bank load while the window is already visible
+        self.status_var.set("Loading...")
+        threading.Thread(target=self._load_in_background, name="StartupLoader", daemon=True).start()
+    
+    def _load_in_background(self):
+        """Import heavy modules and decode the template bank off the Tk thread."""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = os.path.join(
-                self.debug_screenshot_dir,
-                f"{prefix}_{timestamp}_conf_{confidence:.2f}.png"
-            )
-            cv2.imwrite(filename, screenshot)
-            self.debug_screenshot_count += 1
-            print(f"[DEBUG] Saved debug screenshot: {filename}")
+            import_heavy_modules(self.startup)
+            import_heavy_modules(self.startup, ['graalera_macro.engine', 'graalera_macro.preview'])
+            from graalera_macro.detection import TemplateMatcher
+            with self.startup.stage("load template bank"):
+                matcher = TemplateMatcher(debug=self.ENABLE_DEBUG)
+                matcher.preload(ROCK_TEMPLATES + self.mined_rock_templates + SPIDER_TEMPLATES + FIRE_TEMPLATES)
+            self.matcher = matcher
+            self.ui_bridge.call_soon(self._finish_startup)
         except Exception as e:
-            print(f"[ERROR] Failed to save debug screenshot: {e}")
+            print(f"[ERROR] Startup failed: {e}")
+            self.ui_bridge.call_soon(lambda msg=str(e): self.status_var.set(f"Startup failed: {msg}"))
+    
+    def _finish_startup(self):
+        """Create the Tk-bound components once loading is done, then open the setup overlay."""
+        from graalera_macro.capture import PyAutoGuiSource
+        from graalera_macro.input import InputDispatcher
+        from graalera_macro.preview import PreviewPipeline
+        
+        with self.startup.stage("create capture/input"):
+            self.screen_source = PyAutoGuiSource()
+            self.input_dispatcher = InputDispatcher.with_default_backends()
+        with self.startup.stage("create preview"):
+            self.preview = PreviewPipeline(self.screen_source, self.preview_label, self.preview_size,
+                                           max_fps=self.preview_max_fps, tag='detection')
+            self.preview.attach(self.root)
+            self.preview.set_enabled(bool(self.preview_enabled_var.get()))
+        self.load_profile_btn.config(state=tk.NORMAL)
+        self.save_profile_btn.config(state=tk.NORMAL)
+        self._check_assets_loaded()
+        print(self.startup.report())
+        
+        if self.initial_profile and self.load_profile(self.initial_profile):
+            return
+        with self.startup.stage("open setup overlay"):
+            self.setup_region()
     
     def _check_assets_loaded(self):
         """Verify that all required asset images can be loaded."""
@@ -146,21 +220,8 @@ class MiningMacroNoSpiders:
             'rock_phase_4.png', 'rock_phase_4_2.png'
         ]
         
-        all_loaded = True
-        failed_assets = []
-        
-        for asset_file in required_assets:
-            try:
-                asset_path = resource_path(f'assets/{asset_file}')
-                img = cv2.imread(asset_path)
-                if img is None:
-                    all_loaded = False
-                    failed_assets.append(asset_file)
-                    print(f"ERROR: Could not load asset: {asset_path}")
-            except Exception as e:
-                all_loaded = False
-                failed_assets.append(asset_file)
-                print(f"ERROR: Exception loading asset {asset_path}: {e}")
+        failed_assets = self.matcher.missing_templates(required_assets)
+        all_loaded = not failed_assets
         
         if all_loaded:
             self.asset_status_var.set("Assets Loaded: OK")
@@ -190,6 +251,18 @@ class MiningMacroNoSpiders:
         self.reset_btn = ttk.Button(btn_frame, text="Reset Selection", command=self.setup_region, width=15, state=tk.DISABLED)
         self.reset_btn.pack(side=tk.LEFT, padx=2)
         
+        # Saved spot profiles
+        profile_frame = ttk.Frame(self.frame)
+        profile_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(profile_frame, text="Profile:").pack(side=tk.LEFT)
+        self.profile_combo = ttk.Combobox(profile_frame, textvariable=self.profile_name_var,
+                                          values=self.profile_store.list(), width=15)
+        self.profile_combo.pack(side=tk.LEFT, padx=2)
+        self.load_profile_btn = ttk.Button(profile_frame, text="Load", command=self.load_profile, width=6, state=tk.DISABLED)
+        self.load_profile_btn.pack(side=tk.LEFT, padx=2)
+        self.save_profile_btn = ttk.Button(profile_frame, text="Save", command=self.save_profile, width=6, state=tk.DISABLED)
+        self.save_profile_btn.pack(side=tk.LEFT, padx=2)
+        
         # Confidence controls frame
         confidence_frame = ttk.Frame(self.frame)
         confidence_frame.pack(fill='x', pady=5)
@@ -247,6 +320,20 @@ class MiningMacroNoSpiders:
         self.mining_retry_entry.bind("<FocusOut>", self._validate_timeout_values)
         self.mining_retry_entry.bind("<Return>", self._validate_timeout_values)
         
+        # Click latency calibration
+        calibration_frame = ttk.Frame(self.frame)
+        calibration_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Checkbutton(calibration_frame, text="Calibrate Click Latency", variable=self.calibrate_latency_var,
+                        command=self._toggle_latency_calibration).pack(side=tk.LEFT)
+        ttk.Checkbutton(calibration_frame, text="Record Session",
+                        variable=self.record_session_var).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Checkbutton(calibration_frame, text="Stage Timing", variable=self.stage_timing_var,
+                        command=self._toggle_stage_timing).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Checkbutton(calibration_frame, text="Trace",
+                        variable=self.trace_var).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Checkbutton(calibration_frame, text="Event Log",
+                        variable=self.event_log_var).pack(side=tk.LEFT, padx=(10, 0))
+        
         # Indicators frame
         indicators_frame = ttk.Frame(self.frame)
         indicators_frame.pack(fill=tk.X, pady=(5, 2))
@@ -292,9 +379,18 @@ class MiningMacroNoSpiders:
         ttk.Label(depletion_frame, text="Rock Depletion:", width=12, anchor='w').pack(side=tk.LEFT)
         ttk.Label(depletion_frame, textvariable=self.depletion_confidence_var, width=35, anchor='w').pack(side=tk.LEFT)
         
+        # Measured click-to-effect latency
+        ttk.Label(detection_status_frame, textvariable=self.click_latency_var).pack(anchor='w')
+        
+        # Per-stage timing summary
+        ttk.Label(detection_status_frame, textvariable=self.stage_timing_summary_var,
+                  wraplength=380, justify=tk.LEFT).pack(anchor='w')
+        
         # Preview window
         preview_frame = ttk.LabelFrame(self.frame, text="Preview", padding=5)
         preview_frame.pack(fill='x', pady=5, padx=2)
+        ttk.Checkbutton(preview_frame, text="Show Preview", variable=self.preview_enabled_var,
+                        command=self._toggle_preview).pack(anchor='w')
         self.preview_label = ttk.Label(preview_frame)
         self.preview_label.pack()
         
@@ -307,7 +403,6 @@ class MiningMacroNoSpiders:
         direction_label = ttk.Label(self.frame, textvariable=self.direction_switches_var, font=('TkDefaultFont', 9), foreground='orange')
         direction_label.pack(pady=(0, 5))
         
-        self.setup_region()
         self.start_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.DISABLED)
         self.reset_btn.config(state=tk.DISABLED)
@@ -379,10 +474,24 @@ class MiningMacroNoSpiders:
             self.mining_retry_var.set(f"{self.mining_retry_timeout:.1f}")
             self.status_var.set(f"Invalid timeout: {str(e)}")
 
+    def _toggle_latency_calibration(self):
+        """Turn click latency calibration mode on or off."""
+        calibrating = bool(self.calibrate_latency_var.get())
+        self.latency_calibrator.calibrating = calibrating
+        self.ui_bridge.publish(click_latency=self.latency_calibrator.summary())
+        self.status_var.set("Click latency calibration " + ("enabled" if calibrating else "disabled"))
+
+    def _toggle_stage_timing(self):
+        """Turn per-stage timing on or off; works while the macro runs."""
+        enabled = bool(self.stage_timing_var.get())
+        self.stage_timer.enabled = enabled
+        self.ui_bridge.publish(stage_timing=self.stage_timer.summary() if enabled else "Stage Timing: off")
+        self.status_var.set("Stage timing " + ("enabled" if enabled else "disabled"))
+
     def update_stopwatch(self):
         """Update the stopwatch label every second."""
         if self.running and self.session_start_time is not None:
-            current_elapsed_in_session = time.time() - self.session_start_time
+            current_elapsed_in_session = self.pacer.now() - self.session_start_time
             display_time = self.total_elapsed_time + current_elapsed_in_session
             
             hours, remainder = divmod(int(display_time), 3600)
@@ -892,538 +1001,286 @@ class MiningMacroNoSpiders:
             print(f"[ERROR] Error in cleanup_overlay: {e}")
             self.status_var.set(f"Error cleaning up: {str(e)}")
 
+    def _build_config(self) -> MacroConfig:
+        """Collect the current selections and settings into an engine config."""
+        return MacroConfig(
+            detection_region_1=self.detection_region_1,
+            detection_region_2=self.detection_region_2,
+            click_point_1=self.click_point_1,
+            click_point_2=self.click_point_2,
+            spider_detection_region=self.spider_detection_region,
+            spider_attack_point_1=self.spider_attack_point_1,
+            spider_attack_point_2=self.spider_attack_point_2,
+            character_point=self.character_point,
+            fire_detection_region=self.fire_detection_region,
+            detection_confidence=self.detection_confidence,
+            depleted_confidence=self.depleted_confidence,
+            spider_confidence=self.spider_confidence,
+            fire_confidence=self.fire_confidence,
+            area_switch_timeout=self.area_switch_timeout,
+            mining_retry_timeout=self.mining_retry_timeout,
+            mined_rock_templates=list(self.mined_rock_templates),
+            sample_count=3,
+        )
+
+    def _apply_config(self, config: MacroConfig):
+        """Load regions, points, confidences and timeouts from ``config``."""
+        for name in REGION_FIELDS + POINT_FIELDS:
+            setattr(self, name, getattr(config, name))
+        
+        self.detection_confidence = config.detection_confidence
+        self.detection_confidence_var.set(str(self.detection_confidence))
+        self.depleted_confidence = config.effective_depleted_confidence
+        self.depleted_confidence_var.set(str(self.depleted_confidence))
+        self.spider_confidence = config.spider_confidence
+        self.spider_confidence_var.set(str(self.spider_confidence))
+        self.fire_confidence = config.fire_confidence
+        
+        self.area_switch_timeout = config.area_switch_timeout
+        self.mining_retry_timeout = config.mining_retry_timeout
+        self.area_switch_var.set(f"{self.area_switch_timeout:.1f}")
+        self.mining_retry_var.set(f"{self.mining_retry_timeout:.1f}")
+
+    def _screen_size(self) -> Tuple[int, int]:
+        """Return the size of the screen the setup overlay covers."""
+        return self.root.winfo_screenwidth(), self.root.winfo_screenheight()
+
+    def load_profile(self, name: Optional[str] = None) -> bool:
+        """Restore a saved spot profile instead of running the setup overlay.
+        
+        Returns:
+            bool: True if the profile was loaded and fits the current screen
+        """
+        name = (name or self.profile_name_var.get()).strip()
+        if not name:
+            self.status_var.set("Enter a profile name to load")
+            return False
+        
+        try:
+            profile = self.profile_store.load(name)
+        except (ProfileError, TypeError, ValueError) as e:
+            print(f"[PROFILE] Failed to load profile '{name}': {e}")
+            self.status_var.set(f"Failed to load profile: {e}")
+            return False
+        
+        problems = profile.validate(self._screen_size())
+        if problems:
+            print(f"[PROFILE] Profile '{name}' rejected: {'; '.join(problems)}")
+            self.status_var.set(f"Profile '{name}' not loaded: {problems[0]}")
+            return False
+        
+        self._apply_config(profile.config)
+        for attr, offset in profile.relative_offsets.items():
+            setattr(self, attr, offset)
+        
+        self.profile_name_var.set(profile.name)
+        self.status_var.set(f"Profile '{profile.name}' loaded. Click 'Start' to begin.")
+        self.start_btn.config(state=tk.NORMAL)
+        self.reset_btn.config(state=tk.NORMAL)
+        print(f"[PROFILE] Loaded profile '{profile.name}' (saved {profile.saved_at})")
+        return True
+
+    def save_profile(self):
+        """Save the current selections and settings as a named spot profile."""
+        name = self.profile_name_var.get().strip()
+        if not name:
+            self.status_var.set("Enter a profile name to save")
+            return
+        
+        config = self._build_config()
+        if config.missing_fields():
+            self.status_var.set("Complete the setup before saving a profile")
+            return
+        
+        try:
+            path = self.profile_store.save(SpotProfile(name, config, self._screen_size()))
+        except OSError as e:
+            print(f"[PROFILE] Failed to save profile '{name}': {e}")
+            self.status_var.set(f"Failed to save profile: {e}")
+            return
+        
+        self.profile_combo.config(values=self.profile_store.list())
+        self.status_var.set(f"Profile '{name}' saved")
+        print(f"[PROFILE] Saved profile '{name}' to {path}")
+
     def start_macro(self):
         """Start the mining macro."""
         if not all([self.detection_region_1, self.detection_region_2, self.click_point_1, self.click_point_2, self.character_point]):
             self.status_var.set("Error: All 5 setup phases not complete.")
             return
+        
+        from graalera_macro.engine import MacroEngine
+        
+        if self.debug_frames is None:
+            from graalera_macro.debug_frames import DebugFrameRing
+            self.debug_frames = DebugFrameRing()
+        # One watchdog per session, so an earlier engine still winding down cannot detach it
+        from graalera_macro.watchdog import StallWatchdog
+        self.watchdog = StallWatchdog(alert=lambda message: self.ui_bridge.call_soon(self.root.bell))
+        config = self._build_config()
+        if self.record_session_var.get():
+            from graalera_macro.recording import SessionRecorder
+            self.recorder = SessionRecorder.in_directory(metadata={'profile': self.profile_name_var.get(),
+                                                                   'config': config.to_dict(),
+                                                                   'screen_size': list(self._screen_size())})
+            self.recorder.attach(self.screen_source, self.input_dispatcher)
+            self.recorder.start()
+            print(f"[RECORD] Recording session to {self.recorder.path}")
+        
+        self.engine = engine = MacroEngine(
+            config, self.screen_source, self.input_dispatcher,
+            matcher=self.matcher, pacer=self.pacer, latency_calibrator=self.latency_calibrator,
+            ui=self.ui_bridge,
+            on_stop=lambda status: self.ui_bridge.call_soon(lambda: self._engine_stopped(engine, status)),
+            recorder=self.recorder, stage_timer=self.stage_timer, debug_frames=self.debug_frames,
+            watchdog=self.watchdog,
+        )
+        if self.trace_var.get():
+            from graalera_macro.tracing import TraceRecorder
+            self.tracer = TraceRecorder(clock=self.pacer.clock)
+            self.tracer.attach(self.engine)
+        if self.metrics_server is not None:
+            self.metrics_server.collector.attach(self.engine)
+        self.session_analytics = SessionAnalytics(self.analytics_store, spot=self.profile_name_var.get().strip() or None,
+                                                  source='gui')
+        self.session_analytics.attach(self.engine)
+        if self.event_log_var.get():
+            from graalera_macro.eventlog import EventLog
+            self.event_log = EventLog.in_directory()
+            self.event_log.start()
+            self.event_log.attach(self.engine)
+            self.event_log.log('session_started', profile=self.profile_name_var.get(), config=config.to_dict())
+            print(f"[INFO] Logging events to {self.event_log.path}")
+        # Carry the rock counter over from previous sessions (run() starts in area 1)
+        self.engine.rock_counter = self.rock_counter
             
         self.running = True
         self.start_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
         self.reset_btn.config(state=tk.DISABLED)
-        self.status_var.set("Running...")
+        self.load_profile_btn.config(state=tk.DISABLED)
         
         # Initialize stopwatch and update UI
-        self.session_start_time = time.time()
-        self.rock_counter_var.set(f"Rocks Mined: {self.rock_counter}")
-        self.depletion_confidence_var.set("Depletion: N/A")
+        self.session_start_time = self.pacer.now()
         self.update_stopwatch()
         
-        # Initialize direction tracking
-        self.last_direction = self.current_strategy  # Set to current strategy at start
-        self.direction_switches = 0
-        self.direction_switches_var.set("Direction Switches: 0")
+        self.ui_bridge.publish(
+            status="Running...",
+            rock_counter=f"Rocks Mined: {self.rock_counter}",
+            depletion_confidence="Depletion: N/A",
+            direction_switches="Direction Switches: 0",
+        )
         
-        self.macro_thread = threading.Thread(target=self.run_macro, daemon=True)
-        self.macro_thread.start()
+        self.engine.start()
     
-    def _update_preview(self, photo):
-        """Update the preview window with a new image."""
-        if self.preview_label:
-            self.preview_label.configure(image=photo)
-            self.preview_label.image = photo  # Keep a reference
+    def _render_ui_state(self, changed):
+        """Apply state published by the macro thread to the Tk widgets (Tk thread only)."""
+        variables = {
+            'status': self.status_var,
+            'confidence': self.confidence_var,
+            'depletion_confidence': self.depletion_confidence_var,
+            'rock_counter': self.rock_counter_var,
+            'direction_switches': self.direction_switches_var,
+            'spider_status': self.spider_status_var,
+            'spider_confidence': self.spider_confidence_display,
+            'fire_status': self.fire_status_var,
+            'fire_confidence': self.fire_confidence_display,
+            'click_latency': self.click_latency_var,
+            'stage_timing': self.stage_timing_summary_var,
+        }
+        for key, value in changed.items():
+            if key in variables:
+                variables[key].set(value)
+    
+    def _toggle_preview(self):
+        """Turn the preview on or off."""
+        if self.preview:
+            self.preview.set_enabled(bool(self.preview_enabled_var.get()))
             
-    def stop_macro(self):
+    def _engine_stopped(self, engine, status):
+        """Stop the session when its engine stopped by itself (ignores engines of earlier sessions)."""
+        if engine is self.engine and self.running:
+            self.stop_macro(status)
+
+    def stop_macro(self, status="Stopped"):
         """Stop the mining macro."""
         self.running = False
+        if self.engine is not None:
+            self.engine.stop()
+            self.rock_counter = self.engine.rock_counter
+            self.current_strategy = self.engine.current_strategy
+        if self.recorder is not None:
+            self.recorder.stop()
+            print(f"[RECORD] {self.recorder.summary()}")
+            self.recorder = None
+        if self.debug_frames is not None and self.debug_frames.dumps:
+            print(f"[DEBUG] {self.debug_frames.summary()}")
+        if self.engine is not None and any(counts['errors'] for counts in self.engine.errors.stats().values()):
+            print(f"[ERROR] Errors by class: {self.engine.errors.summary()}")
+        if self.watchdog is not None and any(self.watchdog.actions.values()):
+            print(f"[WATCHDOG] {self.watchdog.summary()}")
+        if self.session_analytics is not None:
+            self.session_analytics.finish()
+            self.analytics_store.flush(timeout=1.0)
+            print(f"[INFO] Analytics {self.session_analytics.summary()} saved to {self.analytics_store.path}")
+            self.session_analytics = None
+        if self.metrics_server is not None:
+            self.metrics_server.collector.detach()
+        if self.event_log is not None:
+            self.event_log.log('session_stopped', status=status, rocks_mined=self.rock_counter)
+            self.event_log.stop()
+            print(f"[INFO] {self.event_log.summary()}")
+            self.event_log = None
+        if self.tracer is not None:
+            self.tracer.detach(self.engine)
+            try:
+                self.tracer.stop()
+                print(f"[TRACE] {self.tracer.summary()}")
+            except OSError as e:
+                print(f"[ERROR] Failed to write trace: {e}")
+            self.tracer = None
+        print(f"[INPUT] {self.input_dispatcher.stats()}")
+        print(f"[TIMING] {self.pacer.summary()}")
+        if self.engine is not None:
+            print(f"[TIMING] Time breakdown: {self.engine.time_breakdown.summary()}")
+        if self.stage_timer.stages():
+            print(f"[TIMING] Stages: {self.stage_timer.summary()}")
+            try:
+                print(f"[TIMING] Stage timings written to {self.stage_timer.export()}")
+            except OSError as e:
+                print(f"[ERROR] Failed to export stage timings: {e}")
+            self.stage_timer.reset()
         self.start_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
         self.reset_btn.config(state=tk.NORMAL)
-        self.status_var.set("Stopped")
+        self.load_profile_btn.config(state=tk.NORMAL)
+        self.ui_bridge.publish(status=status)
         
         # Clear preview when stopping
-        if hasattr(self, 'preview_label') and self.preview_label:
-            self.preview_label.configure(image='')
-            if hasattr(self.preview_label, 'image'):
-                self.preview_label.image = None
+        if self.preview:
+            self.preview.clear()
         
         # Accumulate elapsed time
         if self.session_start_time is not None:
-            self.total_elapsed_time += (time.time() - self.session_start_time)
+            self.total_elapsed_time += (self.pacer.now() - self.session_start_time)
             self.session_start_time = None
         
-        # Reset direction tracking when stopping
-        self.last_direction = None
-        self.direction_switches = 0
-        self.direction_switches_var.set("Direction Switches: 0")
-
-    def detect_fire(self):
-        """Check the fire detection region for fire.png with confidence 0.5.
-        
-        Returns:
-            tuple: (x, y) coordinates of the center of the detected fire, or None if not found
-        """
-        if not hasattr(self, 'fire_detection_region') or not self.fire_detection_region:
-            print("[WARNING] No fire detection region set")
-            return None
-            
-        try:
-            # Take screenshot of the fire detection region
-            x, y, w, h = self.fire_detection_region
-            screenshot = pyautogui.screenshot(region=(x, y, w, h))
-            screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-            
-            # Check for fire with confidence 0.5
-            fire_conf, fire_loc, fire_size = self.detect_any_template(
-                screenshot_cv,
-                ['fire.png'],
-                confidence=0.8
-            )
-            
-            # Update fire confidence display
-            self.last_fire_confidence = fire_conf
-            self.fire_confidence_display.set(f"Confidence: {fire_conf:.2f}")
-            
-            if fire_conf > 0:
-                # Convert local coordinates to screen coordinates
-                fire_x = x + fire_loc[0] + (fire_size[0] // 2) if fire_size else x + fire_loc[0]
-                fire_y = y + fire_loc[1] + (fire_size[1] // 2) if fire_size else y + fire_loc[1]
-                self.fire_status_var.set("Fire: Detected!")
-                return (fire_x, fire_y)
-                
-            self.fire_status_var.set("Fire: Not Detected")
-            return None
-            
-        except Exception as e:
-            print(f"[ERROR] Error detecting fire: {e}")
-            return None
-            
-    def detect_any_template(self, screenshot, templates, confidence=0.7):
-        """Detect if any template matches in the screenshot."""
-        best_match_val = 0.0
-        best_match_loc = None
-        best_match_template_size = None
-        best_template_name = None
-        
-        for template_file in templates:
-            try:
-                template_path = resource_path(f'assets/{template_file}')
-                template = cv2.imread(template_path)
-                if template is None: continue
-                if template.shape[0] > screenshot.shape[0] or template.shape[1] > screenshot.shape[1]: continue
-                
-                result = cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
-                _, max_val, _, max_loc = cv2.minMaxLoc(result)
-                
-                if self.ENABLE_DEBUG and max_val < confidence and self.debug_screenshot_count < self.max_debug_screenshots:
-                    debug_img = screenshot.copy()
-                    h, w = template.shape[:2]
-                    cv2.rectangle(debug_img, max_loc, (max_loc[0] + w, max_loc[1] + h), (0, 0, 255), 2)
-                    self.save_debug_screenshot(debug_img, f"template_{template_file.replace('.png', '')}", max_val)
-                
-                if max_val > best_match_val:
-                    best_match_val = max_val
-                    best_match_loc = max_loc
-                    best_match_template_size = (template.shape[1], template.shape[0])
-                    best_template_name = template_file
-            
-            except Exception as e:
-                print(f"[ERROR] Error processing template {template_file}: {e}")
-        
-        if self.ENABLE_DEBUG:
-            if best_match_val > 0: print(f"[DEBUG] Best match: {best_template_name} with confidence: {best_match_val:.2f}")
-            else:
-                print("[DEBUG] No template matched.")
-                if self.debug_screenshot_count < self.max_debug_screenshots: self.save_debug_screenshot(screenshot, "no_match", 0.0)
-        
-        return (best_match_val, best_match_loc, best_match_template_size) if best_match_val > confidence else (0.0, None, None)
-
-    def check_for_spiders(self):
-        """Check the spider detection region for spiders.
-        
-        Returns:
-            tuple: (x, y) coordinates of the detected spider center, or None if no spider found
-        """
-        if not hasattr(self, 'spider_detection_enabled') or not self.spider_detection_enabled:
-            return None
-            
-        if not self.spider_detection_region:
-            if self.ENABLE_DEBUG:
-                print("[DEBUG] No spider detection region set")
-            return None
-            
-        # Take a screenshot of the spider detection region
-        try:
-            # Add some padding to the region to avoid edge effects
-            padding = 20
-            x, y, w, h = self.spider_detection_region
-            x = max(0, x - padding)
-            y = max(0, y - padding)
-            w = min(pyautogui.size().width - x, w + 2 * padding)
-            h = min(pyautogui.size().height - y, h + 2 * padding)
-            
-            if w <= 0 or h <= 0:
-                print(f"[WARN] Invalid spider detection region after padding: {self.spider_detection_region}")
-                return None
-                
-            screenshot = pyautogui.screenshot(region=(x, y, w, h))
-            screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-            
-            if screenshot_cv is None or screenshot_cv.size == 0:
-                print("[WARN] Failed to capture screenshot for spider detection")
-                return None
-            
-            # Look for spiders in the detection region
-            spider_conf, spider_loc, spider_size = self.detect_any_template(
-                screenshot_cv, 
-                self.spider_templates, 
-                confidence=self.spider_confidence
-            )
-            
-            if self.ENABLE_DEBUG:
-                print(f"[DEBUG] Spider detection - Confidence: {spider_conf:.2f}, Location: {spider_loc}, Size: {spider_size}")
-            
-            # Update confidence display whether spider is detected or not
-            self.last_spider_confidence = spider_conf
-            self.spider_confidence_display.set(f"Confidence: {spider_conf:.2f}")
-            
-            if spider_conf > 0 and spider_loc is not None and spider_size is not None:
-                # Convert local coordinates to screen coordinates
-                spider_x = x + spider_loc[0] + (spider_size[0] // 2)
-                spider_y = y + spider_loc[1] + (spider_size[1] // 2)
-                
-                if self.ENABLE_DEBUG:
-                    print(f"[DEBUG] Spider detected at screen coordinates: ({spider_x}, {spider_y})")
-                    
-                self.spider_status_var.set(f"Spider Detected! (Confidence: {spider_conf:.2f})")
-                return (spider_x, spider_y)
-            else:
-                self.spider_status_var.set("Spider: Not Detected")
-                
-        except Exception as e:
-            error_msg = f"Error checking for spiders: {str(e)}"
-            print(f"[ERROR] {error_msg}")
-            # If we get an error, disable spider detection for this session
-            self.spider_detection_enabled = False
-            self.status_var.set("Spider detection disabled due to error")
-            
-        return None
-
-    def get_best_attack_point(self, spider_pos):
-        """Determine the best attack point based on spider position.
-        
-        Args:
-            spider_pos: (x, y) coordinates of the spider
-            
-        Returns:
-            tuple: (x, y) coordinates of the best attack point, or None if not available
-        """
-        if not all([self.character_point, self.spider_attack_point_1, self.spider_attack_point_2]):
-            return None
-            
-        # Calculate vectors from character to spider and attack points
-        char_x, char_y = self.character_point
-        spider_x, spider_y = spider_pos
-        
-        # Calculate vector from character to spider
-        dx = spider_x - char_x
-        dy = spider_y - char_y
-        
-        # Calculate distances to each attack point
-        def distance_sq(p1, p2):
-            return (p1[0] - p2[0])**2 + (p1[1] - p2[1])**2
-            
-        # Get the attack point that's in the opposite direction from the spider
-        attack_point_1 = self.spider_attack_point_1
-        attack_point_2 = self.spider_attack_point_2
-        
-        # Calculate dot products to find which attack point is more opposite to the spider
-        def dot_product(a, b):
-            return a[0]*b[0] + a[1]*b[1]
-            
-        # Vectors from character to attack points
-        vec1 = (attack_point_1[0] - char_x, attack_point_1[1] - char_y)
-        vec2 = (attack_point_2[0] - char_x, attack_point_2[1] - char_y)
-        spider_vec = (dx, dy)
-        
-        # The attack point with the most negative dot product is more opposite to the spider
-        dot1 = dot_product(spider_vec, vec1)
-        dot2 = dot_product(spider_vec, vec2)
-        
-        return attack_point_1 if dot1 < dot2 else attack_point_2
-        
-    def attack_spider(self, initial_spider_pos):
-        """Execute the spider attack sequence with continuous attacks.
-        
-        Args:
-            initial_spider_pos: (x, y) coordinates of the spider when first detected
-            
-        Returns:
-            bool: True if attack sequence was completed, False if aborted due to error
-        """
-        print(f"[SPIDER] Starting attack sequence at {initial_spider_pos}")
-        self.spider_attack_in_progress = True
-        self.spider_status_var.set("Spider: Attacking...")
-        
-        # Get the best attack point based on spider position
-        attack_point = self.get_best_attack_point(initial_spider_pos)
-        if not attack_point:
-            print("[SPIDER] No valid attack point found")
-            self.spider_status_var.set("Spider: No attack point")
-            self.spider_attack_in_progress = False
-            return False
-            
-        print(f"[SPIDER] Attacking from point {attack_point}")
-        
-        try:
-            # Move to attack point and attack
-            pydirectinput.moveTo(attack_point[0], attack_point[1], duration=0.1)
-            time.sleep(0.1)
-            pydirectinput.click(button='left')
-            
-            # Keep attacking while spider is still in the detection region
-            start_time = time.time()
-            max_attack_time = 10.0  # Maximum time to spend attacking a single spider
-            last_attack_time = time.time()
-            
-            while time.time() - start_time < max_attack_time:
-                # Update status with time remaining
-                time_left = max(0, max_attack_time - (time.time() - start_time))
-                self.spider_status_var.set(f"Spider: Attacking... ({time_left:.1f}s left)")
-                
-                # Check if spider is still there
-                current_spider = self.check_for_spiders()
-                if not current_spider:
-                    print("[SPIDER] Spider no longer detected, attack complete")
-                    self.spider_status_var.set("Spider: Defeated!")
-                    time.sleep(0.5)  # Small delay to show defeated status
-                    self.spider_attack_in_progress = False
-                    return True
-                    
-                # Continue attacking (about 2 attacks per second)
-                current_time = time.time()
-                if current_time - last_attack_time >= 0.5:  # Attack twice per second
-                    pydirectinput.click(button='left')
-                    last_attack_time = current_time
-                
-                # Small sleep to prevent CPU overload
-                time.sleep(0.05)
-                
-                # Check if we should abort
-                if not self.running:
-                    print("[SPIDER] Attack sequence aborted")
-                    self.spider_status_var.set("Spider: Attack Aborted")
-                    self.spider_attack_in_progress = False
-                    return False
-                    
-            print("[SPIDER] Max attack time reached")
-            self.spider_status_var.set("Spider: Attack Timeout")
-            time.sleep(0.5)  # Small delay to show timeout status
-            self.spider_attack_in_progress = False
-            
-            return True
-            
-        except Exception as e:
-            print(f"[ERROR] Error during spider attack: {e}")
-            try:
-                # Try to return to character position even if there was an error
-                pyautogui.moveTo(self.character_point[0], self.character_point[1], duration=0.2)
-            except:
-                pass
-            return False
-
-    def run_macro(self):
-        """Main macro loop based on the new flow.md logic."""
-        rock_phases = ['rock_phase_1.png', 'rock_phase_2.png', 'rock_phase_3.png']
-        
-        self.current_strategy = 1
-        phase = 'search' # Can be 'search' or 'mining'
-
-        while self.running:
-            try:
-                # 1. Determine current strategy
-                if self.current_strategy == 1:
-                    active_detection_region, active_click_point, strategy_name = \
-                        self.detection_region_1, self.click_point_1, "Area 1"
-                else: # Strategy 2
-                    active_detection_region, active_click_point, strategy_name = \
-                        self.detection_region_2, self.click_point_2, "Area 2"
-
-                # Take a screenshot of the active area
-                screenshot = pyautogui.screenshot(region=active_detection_region)
-                screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-
-                # === SEARCH PHASE (1st phase) ===
-                if phase == 'search':
-                    self.root.after(0, lambda s=strategy_name: self.status_var.set(f"{s}: Searching for rock..."))
-                    
-                    rock_found_conf, _, _ = self.detect_any_template(screenshot_cv, rock_phases, confidence=self.detection_confidence)
-                    
-                    if rock_found_conf > 0:
-                        # Rock found, switch to mining phase
-                        phase = 'mining'
-                        self.root.after(0, lambda s=strategy_name: self.status_var.set(f"{s}: Rock found. Starting to mine."))
-                        self.root.after(0, lambda conf=rock_found_conf: self.confidence_var.set(f"Minable Rock Confidence: {conf:.2f}"))
-                        continue
-                    else:
-                        # No rock found, perform one click as per instructions
-                        self.root.after(0, lambda s=strategy_name: self.status_var.set(f"{s}: No rock. Performing speculative click."))
-                        pyautogui.click(active_click_point)
-                        # Add random variation of ±0.15s to the 0.5s pause (0.35s to 0.65s range)
-                        random_delay = 0.5 + random.uniform(-0.15, 0.15)
-                        time.sleep(max(0.1, random_delay))  # Ensure minimum 0.1s delay
-
-                        # Search again
-                        screenshot = pyautogui.screenshot(region=active_detection_region)
-                        screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-                        rock_found_conf, _, _ = self.detect_any_template(screenshot_cv, rock_phases, confidence=self.detection_confidence)
-
-                        if rock_found_conf > 0:
-                            # Rock appeared after the click, switch to mining
-                            phase = 'mining'
-                            self.root.after(0, lambda s=strategy_name: self.status_var.set(f"{s}: Rock appeared. Mining."))
-                            continue
-                        else:
-                            # Still no rock, switch to the next area
-                            self.root.after(0, lambda s=strategy_name: self.status_var.set(f"{s}: Still no rock. Switching area."))
-                            
-                            # Calculate new direction (1 or 2)
-                            new_direction = 2 if self.current_strategy == 1 else 1
-                            
-                            print(f"Current: {self.current_strategy}, New: {new_direction}, Last: {self.last_direction}, Count: {self.direction_switches}")
-                            
-                            # Check if this is a direction switch (not the first time)
-                            if self.last_direction is not None and self.last_direction != new_direction:
-                                print(f"Direction switch detected! Last: {self.last_direction}, New: {new_direction}")
-                                self.direction_switches += 1
-                                
-                                # Update the UI with the new count
-                                self.direction_switches_var.set(f"Direction Switches: {self.direction_switches}")
-                                self.root.update_idletasks()  # Force UI update
-                                
-                                # If we've switched directions twice, wait for the mining delay
-                                if self.direction_switches >= 2:
-                                    self.status_var.set("Waiting mining delay before continuing...")
-                                    self.root.update_idletasks()  # Force UI update
-                                    time.sleep(self.mining_retry_timeout)
-                                    self.direction_switches = 0  # Reset counter after delay
-                                    self.direction_switches_var.set("Direction Switches: 0")
-                                    self.root.update_idletasks()  # Force UI update
-                                    
-                                    # After delay, keep the current direction instead of switching
-                                    print(f"After delay, keeping direction: {self.current_strategy}")
-                                    self.last_direction = self.current_strategy
-                                    phase = 'search'
-                                    continue
-                            
-                            # Update direction tracking for next iteration
-                            self.last_direction = new_direction  # Track the direction we're switching to
-                            self.current_strategy = new_direction
-                            phase = 'search' # Stay in search phase for the new area
-                            time.sleep(self.area_switch_timeout)
-                            continue
-
-                # === MINING PHASE (2nd phase) ===
-                elif phase == 'mining':
-                    # Check for minable rocks with 3 samples for better accuracy
-                    rock_confidences = []
-                    for _ in range(3):
-                        screenshot = pyautogui.screenshot(region=active_detection_region)
-                        screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-                        conf, _, _ = self.detect_any_template(screenshot_cv, rock_phases, confidence=self.detection_confidence)
-                        rock_confidences.append(conf)
-                        if conf == 0:  # If any check fails, immediately consider it gone
-                            break
-                        time.sleep(0.1)  # Small delay between samples
-                    
-                    # Use minimum confidence (most conservative approach)
-                    rock_found_conf = min(rock_confidences) if rock_confidences else 0
-                    
-                    if rock_found_conf == 0:
-                        # Rock disappeared, go back to search phase
-                        self.root.after(0, lambda s=strategy_name: self.status_var.set(
-                            f"{s}: Rock gone. Checks: {', '.join(f'{c:.2f}' for c in rock_confidences)}"))
-                        phase = 'search'
-                        continue
-                        
-                    self.root.after(0, lambda conf=rock_found_conf: self.confidence_var.set(
-                        f"Rock Checks: {', '.join(f'{c:.2f}' for c in rock_confidences)} (min: {rock_found_conf:.2f})"))
-
-                    # Perform mining action
-                    self.root.after(0, lambda s=strategy_name: self.status_var.set(f"Mining at {s}..."))
-                    pyautogui.click(active_click_point)
-                    
-                    # Short pause to let game state update before checking for depletion
-                    time.sleep(0.5) 
-                    if not self.running: break
-
-                    # Check if rock is depleted with 3 samples for better accuracy
-                    self.root.after(0, lambda: self.depletion_confidence_var.set("Depletion: Checking..."))
-                    
-                    # Take 3 samples and average the confidence values
-                    confidences = []
-                    for _ in range(3):
-                        screenshot = pyautogui.screenshot(region=active_detection_region)
-                        screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-                        conf, _, _ = self.detect_any_template(screenshot_cv, self.mined_rock_templates, confidence=self.depleted_confidence)
-                        confidences.append(conf)
-                        time.sleep(0.1)  # Small delay between samples
-                    
-                    # Calculate average confidence
-                    depleted_conf = sum(confidences) / len(confidences)
-                    
-                    # Update debug info
-                    self.root.after(0, lambda: self.status_var.set(
-                        f"Depletion checks: {', '.join(f'{c:.2f}' for c in confidences)} (avg: {depleted_conf:.2f})"))
-                    
-                    # Update preview window
-                    preview_img = cv2.resize(screenshot_cv, self.preview_size)
-                    preview_img = cv2.cvtColor(preview_img, cv2.COLOR_BGR2RGB)
-                    preview_img = Image.fromarray(preview_img)
-                    preview_photo = ImageTk.PhotoImage(image=preview_img)
-                    self.root.after(0, self._update_preview, preview_photo)
-                    
-                    self.root.after(0, lambda conf=depleted_conf: self.depletion_confidence_var.set(f"Depletion: {conf:.2f}"))
-
-                    if depleted_conf > 0:
-                        # Rock is mined, increment counter
-                        self.rock_counter += 1
-                        self.root.after(0, lambda: self.rock_counter_var.set(f"Rocks Mined: {self.rock_counter}"))
-                        
-                        # Check for spiders before switching areas
-                        self.root.after(0, lambda s=strategy_name: self.status_var.set(f"{s}: Area depleted. Checking for spiders..."))
-                        
-                        # Check for spiders and attack if found
-                        spider_pos = self.check_for_spiders()
-                        if spider_pos and self.spider_attack_point_1 and self.spider_attack_point_2:
-                            self.attack_spider(spider_pos)
-                            # After handling spider, give a moment before continuing
-                            time.sleep(0.5)
-                        
-                        # Check for fire with confidence > 0.5
-                        fire_pos = self.detect_fire()
-                        if fire_pos is not None:
-                            self.root.after(0, lambda: self.status_var.set("Fire detected! Stopping macro for safety."))
-                            print(f"[SAFETY] Fire detected with confidence {self.last_fire_confidence:.2f}, stopping macro")
-                            self.stop_macro()
-                            return
-                        
-                        # Now switch to next detection region
-                        self.root.after(0, lambda s=strategy_name: self.status_var.set(f"{s}: Switching to next area."))
-                        self.current_strategy = 2 if self.current_strategy == 1 else 1
-                        phase = 'search' # Go back to searching in the new area
-                        time.sleep(self.area_switch_timeout)
-                        continue
-                    else:
-                        # Rock not depleted, wait and repeat mining phase
-                        self.root.after(0, lambda s=strategy_name: self.status_var.set(f"{s}: Not depleted. Waiting to mine again."))
-                        time.sleep(self.mining_retry_timeout)
-                        # The loop will continue, and since phase is still 'mining', it will re-run this block.
-                        continue
-
-            except Exception as e:
-                print(f"Error in macro: {e}")
-                self.root.after(0, lambda: self.status_var.set(f"Error: {e}"))
-                time.sleep(1)
-
-        self.root.after(0, self.stop_macro)
+        # Direction tracking is reset by the engine when stopping
+        self.ui_bridge.publish(direction_switches="Direction Switches: 0")
 
 def main():
     """Main entry point for the application."""
+    parser = argparse.ArgumentParser(description="GraalEra mining macro")
+    parser.add_argument('--profile', help="Restore a saved spot profile instead of opening the setup overlay")
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+    
     try:
-        root = tk.Tk()
-        app = MiningMacroNoSpiders(root)
+        startup = StartupProfiler()
+        with startup.stage("create Tk root"):
+            root = tk.Tk()
+        app = MiningMacroNoSpiders(root, startup, profile=args.profile, metrics_port=args.metrics_port)
         
         root.update_idletasks()
         width, height = root.winfo_width(), root.winfo_height()